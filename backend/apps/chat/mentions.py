@@ -0,0 +1,51 @@
+"""
+@mentions in chat messages.
+
+parse() picks the @username tokens out of a message and resolve() matches
+them against the trip's members in one query, case-insensitively through
+DirectoryEntry like every other username lookup. The message stores the
+ids in ChatMessage.mentions, and @all as ChatMessage.mentions_all.
+
+Only mentioned members (everyone on @all) get a Notification row
+(apps/trips/signals.py); the rest just have their unread count bumped.
+"""
+import re
+
+from apps.trips.services import trip_members
+from apps.users import directory
+
+EVERYONE = 'all'
+MAX_MENTIONS = 50
+
+# Usernames are letters, digits and @.+-_; an @ inside a word (an email
+# address) is not a mention
+MENTION_RE = re.compile(r'(?<![\w.@+-])@([\w.@+-]+)')
+
+
+def parse(text):
+    """The normalized names mentioned in text, at most MAX_MENTIONS."""
+    names = set()
+    for match in MENTION_RE.finditer(text or ''):
+        name = directory.normalize(match.group(1))
+        # "Thanks @ana." most likely ends a sentence, but "ana." is a
+        # valid username too, so both are looked up
+        names.update({name, name.rstrip('.-')} - {''})
+        if len(names) >= MAX_MENTIONS:
+            break
+    return names
+
+
+def resolve(trip, names):
+    """
+    (ids of the members of trip named in names, whether @all is among
+    them). Names that are not members are ignored.
+    """
+    everyone = EVERYONE in names
+    names = set(names) - {EVERYONE}
+    if not names:
+        return [], everyone
+    ids = (
+        trip_members(trip).filter(directory_entry__username__in=names)
+        .order_by('pk').values_list('pk', flat=True)
+    )
+    return list(ids), everyone
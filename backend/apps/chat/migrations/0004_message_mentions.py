@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-19 04:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0003_remove_chatmessage_image_remove_chatmessage_video"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chatmessage",
+            name="mentions",
+            field=models.JSONField(
+                blank=True,
+                default=list,
+                help_text="Ids of the members mentioned with @username (see mentions.py)",
+            ),
+        ),
+        migrations.AddField(
+            model_name="chatmessage",
+            name="mentions_all",
+            field=models.BooleanField(
+                default=False, help_text="Whether the message mentions @all"
+            ),
+        ),
+    ]
@@ -48,6 +48,17 @@ class ChatMessage(models.Model):
         blank=True  # Allow blank if image/video is sent
     )
 
+    mentions = models.JSONField(
+        default=list,
+        blank=True,
+        help_text="Ids of the members mentioned with @username (see mentions.py)"
+    )
+    
+    mentions_all = models.BooleanField(
+        default=False,
+        help_text="Whether the message mentions @all"
+    )
+
 
 
     
@@ -0,0 +1,31 @@
+"""
+Fast read path for chat history.
+
+Mirrors ChatMessageSerializer field for field from .values() rows; see
+apps/trips/utils/fastread.py. Used when settings.FAST_READ_SERIALIZERS is on.
+"""
+from apps.trips.utils import fastread
+from apps.trips.utils.fastread import ValuesReader
+from apps.trips.utils.sparse import FULL
+
+
+def _sender(row, ctx):
+    return {
+        'id': row['sender__id'],
+        'username': row['sender__username'],
+        'email': row['sender__email'],
+    }
+
+
+message_reader = ValuesReader([
+    ('id', fastread.value('id')),
+    ('trip', fastread.value('trip_id')),
+    ('sender', fastread.computed(('sender__id', 'sender__username', 'sender__email'), _sender)),
+    ('message', fastread.value('message')),
+    ('mentions', fastread.value('mentions')),
+    ('created_at', fastread.datetime('created_at')),
+])
+
+
+def message_reader_for(fieldset=FULL):
+    return message_reader.sparse(fieldset, {'sender': fastread.value('sender_id')}, {'sender': 'sender_id'})
@@ -6,7 +6,10 @@ REST-based chat using polling. No real-time features.
 """
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from apps.trips.utils.sparse import SparseFieldsMixin, pk_field
 from .models import ChatMessage
+from . import mentions
 
 User = get_user_model()
 
@@ -20,12 +23,12 @@ class UserBasicSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'username', 'email']
 
 
-class ChatMessageSerializer(serializers.ModelSerializer):
+class ChatMessageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for chat messages.
     
     Handles:
-    - Sending messages (auto-assigns sender and trip)
+    - Sending messages (auto-assigns sender and trip, resolves @mentions)
     - Displaying messages with sender info
     """
     
@@ -38,9 +41,13 @@ class ChatMessageSerializer(serializers.ModelSerializer):
             'trip',
             'sender',
             'message',
+            'mentions',
             'created_at'
         ]
-        read_only_fields = ['id', 'trip', 'sender', 'created_at']
+        read_only_fields = ['id', 'trip', 'sender', 'mentions', 'created_at']
+    
+    collapsed_fields = {'sender': pk_field()}
+    sideloaded_fields = {'sender': 'sender_id'}
     
     def validate(self, data):
         """
@@ -63,10 +70,17 @@ class ChatMessageSerializer(serializers.ModelSerializer):
         if not trip:
             raise serializers.ValidationError("Trip context is required.")
         
-        message = ChatMessage.objects.create(
-            trip=trip,
-            sender=user,
-            **validated_data
-        )
+        # @mentions are resolved against the members once, here
+        mentioned, everyone = mentions.resolve(trip, mentions.parse(validated_data['message']))
+        
+        # Change feed entry is written in the same transaction
+        with transaction.atomic():
+            message = ChatMessage.objects.create(
+                trip=trip,
+                sender=user,
+                mentions=mentioned,
+                mentions_all=everyone,
+                **validated_data
+            )
         
         return message
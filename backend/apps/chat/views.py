@@ -8,15 +8,23 @@ This is a simplified REST-based chat implementation.
 - Suitable for evaluation and prototyping
 - Real-time features are future scope
 """
+from django.conf import settings
+from django.contrib.auth import get_user_model
 from rest_framework import viewsets, status, permissions
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
-from apps.trips.models import Trip
+from apps.trips import access
+from apps.trips.idempotency import idempotent
+from apps.trips.response_cache import CachedResponseMixin
 from apps.trips.permissions import IsOwnerOrCollaborator
 from apps.trips.services import increment_notification_count
+from apps.trips.utils.sparse import SparseFieldsetViewMixin
 from .models import ChatMessage
-from .serializers import ChatMessageSerializer
+from .readers import message_reader_for
+from .serializers import ChatMessageSerializer, UserBasicSerializer
+
+User = get_user_model()
 
 
 class ChatMessagePagination(PageNumberPagination):
@@ -29,7 +37,7 @@ class ChatMessagePagination(PageNumberPagination):
     max_page_size = 100
 
 
-class ChatMessageViewSet(viewsets.ModelViewSet):
+class ChatMessageViewSet(CachedResponseMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     ViewSet for Chat Message management.
     
@@ -44,12 +52,28 @@ class ChatMessageViewSet(viewsets.ModelViewSet):
     - list: Get all messages for a trip (paginated, chronological)
     - create: Send a new message
     
+    Reads accept ?fields= and ?expand=sender, and the list ?sideload=users.
+    The list supports If-None-Match and is served from the response cache,
+    shared by the trip's members.
+    
     Access: Owner or Collaborator of the trip
     """
     
     serializer_class = ChatMessageSerializer
+    throttle_scope = 'chat_send'
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrCollaborator]
     pagination_class = ChatMessagePagination
+    sideloaded_user_keys = ('sender_id',)
+    cached_actions = ('list',)
+    shared_actions = ('list',)
+    
+    def get_etag_versions(self):
+        if self.action != 'list':
+            return None
+        trip = self.get_trip()
+        if trip is None or not access.is_member(self.request, trip):
+            return None
+        return (trip.change_version,)
     
     def get_queryset(self):
         """
@@ -60,22 +84,20 @@ class ChatMessageViewSet(viewsets.ModelViewSet):
         if not trip:
              return ChatMessage.objects.none()
              
-        if not trip.has_access(self.request.user):
+        if not access.is_member(self.request, trip):
             return ChatMessage.objects.none()
             
-        return ChatMessage.objects.filter(trip=trip).select_related(
-            'sender', 'trip'
-        ).order_by('created_at')
+        queryset = ChatMessage.objects.filter(trip=trip).order_by('created_at')
+        if self.get_fieldset().nests_user('sender'):
+            queryset = queryset.select_related('sender')
+        return queryset
     
     def get_trip(self):
         """
         Get the trip object from URL parameter.
+        Memoized per request together with the user's membership.
         """
-        trip_pk = self.kwargs.get('trip_pk')
-        try:
-            return Trip.objects.get(pk=trip_pk)
-        except Trip.DoesNotExist:
-            return None
+        return access.get_trip(self.request, self.kwargs.get('trip_pk'))
     
     def list(self, request, *args, **kwargs):
         """
@@ -92,26 +114,44 @@ class ChatMessageViewSet(viewsets.ModelViewSet):
             )
         
         # Check permission explicitly again if needed, though get_queryset handles it
-        if not trip.has_access(request.user):
+        if not access.is_member(request, trip):
              return Response(
                 {'detail': 'Access denied.'},
                 status=status.HTTP_403_FORBIDDEN
             )
         
         queryset = self.get_queryset()
+        if settings.FAST_READ_SERIALIZERS:
+            reader = message_reader_for(self.get_fieldset())
+            queryset = queryset.values(*reader.fields)
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                return self.attach_sideloaded_users(self.get_paginated_response(reader.render(page)))
+            return self.attach_sideloaded_users(Response(reader.render(queryset)))
+
         page = self.paginate_queryset(queryset)
         
         if page is not None:
             serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+            return self.attach_sideloaded_users(self.get_paginated_response(serializer.data))
         
         serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return self.attach_sideloaded_users(Response(serializer.data))
+    
+    def get_sideloaded_users(self, user_ids):
+        """Sender cards for a page, each user loaded once."""
+        users = User.objects.filter(id__in=user_ids).order_by('id')
+        if settings.FAST_READ_SERIALIZERS:
+            # Same keys and order as UserBasicSerializer
+            return list(users.values('id', 'username', 'email'))
+        return UserBasicSerializer(users, many=True).data
     
+    @idempotent('chat.send', trip_id='trip_pk')
     def create(self, request, *args, **kwargs):
         """
         Send a new message to the trip chat.
-        Auto-assigns trip and sender.
+        Auto-assigns trip and sender. Retries with the same Idempotency-Key
+        replay the first response.
         """
         trip = self.get_trip()
         if not trip:
@@ -120,7 +160,7 @@ class ChatMessageViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
             
-        if not trip.has_access(request.user):
+        if not access.is_member(request, trip):
              return Response(
                 {'detail': 'Access denied.'},
                 status=status.HTTP_403_FORBIDDEN
@@ -4,6 +4,10 @@ Serializers for Poll management.
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.db import transaction, IntegrityError
+from django.db.models import Count, Prefetch
+from apps.trips import changelog
+from utils.loaders import BatchLoader, BatchLoadingMixin, BatchLoadingListSerializer
+from apps.trips.utils.sparse import SparseFieldsMixin, pk_field
 from .models import Poll, PollOption, Vote
 
 User = get_user_model()
@@ -17,6 +21,79 @@ class UserBasicSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'username', 'email']
 
 
+def with_results(queryset, creator=True, options=True):
+    """
+    Eager-load everything PollSerializer renders, so listing polls costs a
+    fixed number of queries: creators are joined and option vote counts are
+    prefetched in a single annotated query. Either can be left out when the
+    response does not include it.
+    """
+    if creator:
+        queryset = queryset.select_related('created_by')
+    if options:
+        queryset = queryset.prefetch_related(
+            Prefetch(
+                'options',
+                queryset=PollOption.objects.annotate(vote_count=Count('votes')).order_by('id')
+            )
+        )
+    return queryset
+
+
+def voted_poll_ids(user, poll_ids):
+    """
+    Return the ids of the given polls the user has voted in (one query).
+    Pass as context['voted_poll_ids'] to skip the per-poll has_voted query.
+    """
+    poll_ids = list(poll_ids)
+    if not poll_ids or not user.is_authenticated:
+        return set()
+    return set(
+        Vote.objects.filter(user=user, poll_id__in=poll_ids).values_list('poll_id', flat=True)
+    )
+
+
+class PollResultsLoader(BatchLoader):
+    """Options with vote counts keyed by poll id, one query per batch."""
+    default = []
+    # Votes cast later in the same request must show up
+    request_scoped = False
+    
+    def fetch(self, poll_ids):
+        results = {}
+        rows = PollOption.objects.filter(poll_id__in=poll_ids).annotate(
+            vote_count=Count('votes')
+        ).order_by('id').values('poll_id', 'id', 'text', 'vote_count')
+        for row in rows:
+            poll_id = row.pop('poll_id')
+            results.setdefault(poll_id, []).append(row)
+        return results
+
+
+class PollVotedLoader(BatchLoader):
+    """Whether the requesting user voted, keyed by poll id."""
+    default = False
+    request_scoped = False
+    
+    def fetch(self, poll_ids):
+        if not self.request or not self.request.user.is_authenticated:
+            return {}
+        voted = Vote.objects.filter(
+            user=self.request.user, poll_id__in=poll_ids
+        ).values_list('poll_id', flat=True)
+        return {poll_id: True for poll_id in voted}
+
+
+class PollOptionListSerializer(serializers.ListSerializer):
+    """
+    Renders a poll's options with vote counts taken from the parent
+    serializer (prefetch or results loader) instead of instance.options.
+    """
+    
+    def get_attribute(self, instance):
+        return self.parent.get_option_results(instance)
+
+
 class PollOptionSerializer(serializers.ModelSerializer):
     """
     Serializer for poll options.
@@ -28,9 +105,10 @@ class PollOptionSerializer(serializers.ModelSerializer):
         model = PollOption
         fields = ['id', 'text', 'vote_count']
         read_only_fields = ['id', 'vote_count']
+        list_serializer_class = PollOptionListSerializer
 
 
-class PollSerializer(serializers.ModelSerializer):
+class PollSerializer(SparseFieldsMixin, BatchLoadingMixin, serializers.ModelSerializer):
     """
     Serializer for Poll model.
     
@@ -56,13 +134,37 @@ class PollSerializer(serializers.ModelSerializer):
             'created_at'
         ]
         read_only_fields = ['id', 'trip', 'created_by', 'created_at', 'has_voted']
+        list_serializer_class = BatchLoadingListSerializer
+    
+    batch_relations = ('created_by',)
+    collapsed_fields = {'created_by': pk_field()}
+    
+    def get_loader_keys(self, obj):
+        if self.includes('options') and self._prefetched_results(obj) is None:
+            yield PollResultsLoader, obj.id
+        if self.includes('has_voted') and 'voted_poll_ids' not in self.context:
+            yield PollVotedLoader, obj.id
+    
+    def _prefetched_results(self, obj):
+        """Options prefetched by with_results() already carry vote counts."""
+        prefetched = getattr(obj, '_prefetched_objects_cache', {}).get('options')
+        if prefetched is not None and all(hasattr(option, 'vote_count') for option in prefetched):
+            return prefetched
+        return None
+    
+    def get_option_results(self, obj):
+        prefetched = self._prefetched_results(obj)
+        if prefetched is not None:
+            return prefetched
+        return self.loader(PollResultsLoader).load(obj.id)
     
     def get_has_voted(self, obj):
         """Check if the requesting user has voted in this poll."""
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.has_user_voted(request.user)
-        return False
+        # Use precomputed ids if the view provided them
+        voted = self.context.get('voted_poll_ids')
+        if voted is not None:
+            return obj.id in voted
+        return self.loader(PollVotedLoader).load(obj.id)
     
     def validate_options(self, value):
         """Validate that at least 2 options are provided."""
@@ -107,20 +209,11 @@ class PollSerializer(serializers.ModelSerializer):
                     poll=poll,
                     **option_data
                 )
+            
+            # Recorded here rather than in post_save so the options are included
+            changelog.record_change(trip.id, 'poll', poll.id, data=changelog.poll_payload(poll))
         
         return poll
-    
-    def to_representation(self, instance):
-        """
-        Customize representation to include vote counts.
-        """
-        representation = super().to_representation(instance)
-        
-        # Get options with vote counts
-        options_with_counts = instance.get_results()
-        representation['options'] = options_with_counts
-        
-        return representation
 
 
 class VoteSerializer(serializers.Serializer):
@@ -5,39 +5,59 @@ from rest_framework import viewsets, status, views
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from apps.trips.models import Trip
+from apps.trips import access
+from apps.trips.idempotency import idempotent
+from apps.trips.response_cache import CachedResponseMixin
 from apps.trips.services import increment_notification_count
 from apps.trips.permissions import IsOwnerOrCollaborator
+from apps.trips.utils.sparse import SparseFieldsetViewMixin
 from .models import Poll, Vote
-from .serializers import PollSerializer, VoteSerializer
+from .serializers import PollSerializer, VoteSerializer, with_results, voted_poll_ids
 
 
-class PollViewSet(viewsets.ModelViewSet):
+class PollViewSet(CachedResponseMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     ViewSet for Poll management.
+    Reads accept ?fields= and ?expand=created_by; the list supports
+    If-None-Match and is served from the response cache, shared by the
+    trip's members with has_voted applied per user.
     """
     
     serializer_class = PollSerializer
     permission_classes = [IsAuthenticated, IsOwnerOrCollaborator]
+    cached_actions = ('list',)
+    shared_actions = ('list',)
+    
+    def get_etag_versions(self):
+        # Votes bump the trip version, so has_voted is covered too
+        if self.action != 'list':
+            return None
+        trip = self.get_trip()
+        return None if trip is None else (trip.change_version,)
+    
+    def shares_response(self):
+        # has_voted is re-applied per user by poll id
+        fieldset = self.get_fieldset()
+        return super().shares_response() and (fieldset.includes('id') or not fieldset.includes('has_voted'))
+    
+    def personalize_response(self, data):
+        if not self.get_fieldset().includes('has_voted'):
+            return data
+        voted = voted_poll_ids(self.request.user, [poll['id'] for poll in data])
+        return [{**poll, 'has_voted': poll['id'] in voted} for poll in data]
     
     def get_queryset(self):
         trip_pk = self.kwargs.get('trip_pk')
-        return Poll.objects.filter(trip_id=trip_pk).prefetch_related(
-            'options', 'votes', 'created_by'
+        fieldset = self.get_fieldset()
+        return with_results(
+            Poll.objects.filter(trip_id=trip_pk),
+            creator=fieldset.expands('created_by'),
+            options=fieldset.includes('options'),
         )
     
     def get_trip(self):
-        trip_pk = self.kwargs.get('trip_pk')
-        try:
-            trip = Trip.objects.get(pk=trip_pk)
-        except Trip.DoesNotExist:
-            return None
-        
-        # Check if user has access to this trip
-        if not trip.has_access(self.request.user):
-            return None
-        
-        return trip
+        # Cached per request and shared with IsOwnerOrCollaborator
+        return access.get_accessible_trip(self.request, self.kwargs.get('trip_pk'))
     
     def list(self, request, *args, **kwargs):
         trip = self.get_trip()
@@ -47,10 +67,14 @@ class PollViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
+        polls = list(self.get_queryset())
+        context = self.get_serializer_context()
+        if context['fieldset'].includes('has_voted'):
+            context['voted_poll_ids'] = voted_poll_ids(request.user, [poll.id for poll in polls])
+        serializer = self.get_serializer(polls, many=True, context=context)
         return Response(serializer.data)
     
+    @idempotent('poll.create', trip_id='trip_pk')
     def create(self, request, *args, **kwargs):
         trip = self.get_trip()
         if not trip:
@@ -81,8 +105,8 @@ class PollViewSet(viewsets.ModelViewSet):
             user = request.user
             
             # Check permissions: Creator OR Owner
-            is_creator = instance.created_by == user
-            is_trip_owner = instance.trip.owner == user
+            is_creator = instance.created_by_id == user.id
+            is_trip_owner = access.get_trip(request, instance.trip_id).owner_id == user.id
             
             if not (is_creator or is_trip_owner):
                  return Response(
@@ -109,7 +133,9 @@ class VoteView(views.APIView):
     """
     
     permission_classes = [IsAuthenticated]
+    throttle_scope = 'vote'
     
+    @idempotent('poll.vote', trip_id=lambda view, kwargs: Poll.objects.get(id=kwargs['poll_id']).trip_id)
     def post(self, request, poll_id):
         # Get the poll
         try:
@@ -121,7 +147,7 @@ class VoteView(views.APIView):
             )
         
         # Check if user has access to the trip
-        if not poll.trip.has_access(request.user):
+        if not access.is_member(request, poll.trip):
             return Response(
                 {'detail': 'You do not have access to this poll.'},
                 status=status.HTTP_403_FORBIDDEN
@@ -0,0 +1,77 @@
+"""
+Request-scoped trip membership resolver.
+
+Answers "can this request's user access trip X" with at most one query per
+trip per request. The trip is loaded together with an is-collaborator flag
+for the user and memoized in the request cache, so permission classes,
+get_trip() helpers and view code can all ask again for free.
+"""
+from django.db.models import Exists, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from middleware.request_cache import get_request_cache
+from .models import Trip, TripChangeState, TripNotificationState
+
+
+def _cache_key(trip_id, user):
+    return ('trip_access', str(trip_id), user.id)
+
+
+def get_trip(request, trip_id):
+    """
+    Return the trip (owner joined) or None if it does not exist.
+    One query on first call, zero afterwards within the request. The trip's
+    cache version comes along as `change_version`, and the last change to
+    the user's unread counts in it as `unread_updated_at`.
+    """
+    user = request.user
+    cache = get_request_cache(request)
+    key = _cache_key(trip_id, user)
+    if key in cache:
+        return cache[key]
+
+    membership = Trip.collaborators.through.objects.filter(trip_id=OuterRef('pk'), user_id=user.id)
+    version = TripChangeState.objects.filter(trip_id=OuterRef('pk')).values('version')[:1]
+    unread = TripNotificationState.objects.filter(trip_id=OuterRef('pk'), user_id=user.id).values('updated_at')[:1]
+    try:
+        trip = Trip.objects.select_related('owner').annotate(
+            user_is_collaborator=Exists(membership),
+            change_version=Coalesce(Subquery(version), Value(0)),
+            unread_updated_at=Subquery(unread),
+        ).get(pk=trip_id)
+    except (Trip.DoesNotExist, ValueError):
+        trip = None
+
+    cache[key] = trip
+    return trip
+
+
+def is_member(request, trip):
+    """
+    True if the request's user owns or collaborates on the trip.
+    Accepts a Trip or a trip id; uses prefetched collaborators when present.
+    """
+    user = request.user
+    if not user or not user.is_authenticated:
+        return False
+
+    if isinstance(trip, Trip):
+        if trip.owner_id == user.id:
+            return True
+        prefetched = getattr(trip, '_prefetched_objects_cache', {}).get('collaborators')
+        if prefetched is not None:
+            return any(c.id == user.id for c in prefetched)
+        trip = trip.pk
+
+    loaded = get_trip(request, trip)
+    if loaded is None:
+        return False
+    return loaded.owner_id == user.id or loaded.user_is_collaborator
+
+
+def get_accessible_trip(request, trip_id):
+    """Return the trip if it exists and the user is a member, else None."""
+    trip = get_trip(request, trip_id)
+    if trip is None or not is_member(request, trip):
+        return None
+    return trip
@@ -0,0 +1,217 @@
+"""
+Trip change feed for delta sync.
+
+Every mutation of a trip-scoped resource appends a TripChange row with the
+next per-trip sequence number. Clients call
+GET /api/trips/{id}/changes/?since=<seq> and receive only the upserts and
+tombstones recorded after the sequence they last saw.
+"""
+from django.db import transaction
+from django.db.models import Count, Exists, Max, OuterRef
+
+from . import versions
+from .models import TripChange, TripChangeState
+
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 1000
+
+
+def record_changes(trip_id, changes):
+    """
+    Append a batch of changes for one trip.
+
+    `changes` is a list of (resource, object_id, op, data) tuples. The state
+    row is locked while the sequence is bumped so concurrent writers to the
+    same trip commit in sequence order. Callers that also write the changed
+    objects should do so inside the same transaction.
+
+    The trip's version is bumped too, and changes to the trip itself or its
+    membership bump the members' user versions (their trip lists change).
+    """
+    if not changes:
+        return []
+
+    with transaction.atomic():
+        TripChangeState.objects.get_or_create(trip_id=trip_id)
+        state = TripChangeState.objects.select_for_update().get(trip_id=trip_id)
+        first_seq = state.last_seq + 1
+        state.last_seq += len(changes)
+        state.version += 1
+        state.save(update_fields=['last_seq', 'version'])
+
+        if any(resource in ('trip', 'member') for resource, _, _, _ in changes):
+            # Removed members are no longer in the trip but their list changed
+            removed = [object_id for resource, object_id, _, _ in changes if resource == 'member']
+            versions.bump_trip_members([trip_id], extra_user_ids=removed)
+
+        return TripChange.objects.bulk_create([
+            TripChange(
+                trip_id=trip_id,
+                seq=first_seq + offset,
+                resource=resource,
+                object_id=str(object_id),
+                op=op,
+                data=data if op == TripChange.OP_UPSERT else None,
+            )
+            for offset, (resource, object_id, op, data) in enumerate(changes)
+        ])
+
+
+def record_change(trip_id, resource, object_id, op=TripChange.OP_UPSERT, data=None):
+    """Append a single change for the trip."""
+    return record_changes(trip_id, [(resource, object_id, op, data)])[0]
+
+
+def record_delete(trip_id, resource, object_id):
+    """Append a tombstone for a deleted object."""
+    return record_change(trip_id, resource, object_id, op=TripChange.OP_DELETE)
+
+
+# --- Compact payloads -------------------------------------------------------
+
+def trip_payload(trip):
+    return {
+        'id': str(trip.id),
+        'title': trip.title,
+        'description': trip.description,
+        'owner': trip.owner_id,
+        'updated_at': trip.updated_at,
+    }
+
+
+def member_payload(user):
+    return {
+        'id': user.id,
+        'username': user.username,
+    }
+
+
+def itinerary_payload(item):
+    return {
+        'id': item.id,
+        'title': item.title,
+        'description': item.description,
+        'order': item.order,
+        'created_by': item.created_by_id,
+        'updated_at': item.updated_at,
+    }
+
+
+def chat_payload(message):
+    return {
+        'id': message.id,
+        'sender': message.sender_id,
+        'message': message.message,
+        'mentions': message.mentions,
+        'created_at': message.created_at,
+    }
+
+
+def poll_payload(poll):
+    return {
+        'id': poll.id,
+        'question': poll.question,
+        'created_by': poll.created_by_id,
+        'created_at': poll.created_at,
+        'options': list(
+            poll.options.annotate(vote_count=Count('votes'))
+            .order_by('id')
+            .values('id', 'text', 'vote_count')
+        ),
+    }
+
+
+# --- Reading ----------------------------------------------------------------
+
+def get_changes(trip_id, since, limit=DEFAULT_PAGE_SIZE):
+    """
+    Return the delta for a trip after `since`.
+
+    Multiple entries for the same object within the page are collapsed to the
+    latest one. If `since` predates the compaction floor the client is told to
+    reset instead of receiving a partial delta.
+    """
+    state = TripChangeState.objects.filter(trip_id=trip_id).first()
+    last_seq = state.last_seq if state else 0
+    floor_seq = state.floor_seq if state else 0
+
+    if since < floor_seq:
+        return {
+            'since': since,
+            'cursor': last_seq,
+            'has_more': False,
+            'reset': True,
+            'changes': [],
+        }
+
+    entries = list(
+        TripChange.objects.filter(trip_id=trip_id, seq__gt=since)
+        .order_by('seq')
+        .values('seq', 'resource', 'object_id', 'op', 'data')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    latest = {}
+    for entry in entries:
+        latest[(entry['resource'], entry['object_id'])] = entry
+
+    changes = []
+    for entry in sorted(latest.values(), key=lambda e: e['seq']):
+        change = {
+            'seq': entry['seq'],
+            'resource': entry['resource'],
+            'id': entry['object_id'],
+            'op': entry['op'],
+        }
+        if entry['op'] == TripChange.OP_UPSERT:
+            change['data'] = entry['data']
+        changes.append(change)
+
+    return {
+        'since': since,
+        'cursor': entries[-1]['seq'] if entries else max(since, last_seq),
+        'has_more': has_more,
+        'reset': False,
+        'changes': changes,
+    }
+
+
+# --- Compaction -------------------------------------------------------------
+
+def compact_changes(tombstone_cutoff=None):
+    """
+    Compact the change log.
+
+    1. Drop every entry superseded by a newer entry for the same object.
+       This never changes what a resuming client ends up with.
+    2. Drop tombstones created before `tombstone_cutoff` and raise each
+       affected trip's floor so older cursors are told to reset.
+
+    Returns a tuple of (superseded_deleted, tombstones_deleted).
+    """
+    newer = TripChange.objects.filter(
+        trip_id=OuterRef('trip_id'),
+        resource=OuterRef('resource'),
+        object_id=OuterRef('object_id'),
+        seq__gt=OuterRef('seq'),
+    )
+    superseded_deleted, _ = TripChange.objects.filter(Exists(newer)).delete()
+
+    tombstones_deleted = 0
+    if tombstone_cutoff is not None:
+        expired = TripChange.objects.filter(
+            op=TripChange.OP_DELETE,
+            created_at__lt=tombstone_cutoff,
+        )
+        floors = expired.values('trip_id').annotate(max_seq=Max('seq'))
+        with transaction.atomic():
+            for row in floors:
+                TripChangeState.objects.filter(
+                    trip_id=row['trip_id'],
+                    floor_seq__lt=row['max_seq'],
+                ).update(floor_seq=row['max_seq'])
+            tombstones_deleted, _ = expired.delete()
+
+    return superseded_deleted, tombstones_deleted
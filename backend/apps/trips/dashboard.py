@@ -0,0 +1,78 @@
+"""
+Trip dashboard aggregate.
+
+GET /api/trips/{id}/dashboard/ returns everything the trip screen needs in
+one response: trip detail, itinerary, polls with results, the latest chat
+messages and unread counts.
+
+The response is built from a fixed number of queries, independent of how
+many items, polls, options, votes or members the trip has:
+  1. trip + owner + owner profile (membership enforced in the WHERE clause)
+  2. collaborators + profiles
+  3. the user's notification state
+  4. itinerary items
+  5. polls + creators
+  6. poll options with vote counts
+  7. the user's votes on those polls
+  8. latest chat messages + senders
+
+The view's conditional GET check adds one query for the trip and user
+versions; a matching If-None-Match is answered with a 304 after it.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Prefetch, Q
+from django.shortcuts import get_object_or_404
+
+from apps.chat.models import ChatMessage
+from apps.chat.serializers import ChatMessageSerializer
+from apps.polls.models import Poll
+from apps.polls.serializers import PollSerializer, with_results, voted_poll_ids
+from .models import Trip, ItineraryItem, TripNotificationState
+from .serializers import TripSerializer, ItineraryItemSerializer
+
+User = get_user_model()
+
+DEFAULT_CHAT_LIMIT = 20
+MAX_CHAT_LIMIT = 100
+
+
+def get_dashboard_trip(user, pk):
+    """Load the trip with everything TripSerializer touches, or 404."""
+    queryset = Trip.objects.filter(
+        Q(owner=user) | Q(collaborators=user)
+    ).select_related('owner__profile').prefetch_related(
+        Prefetch('collaborators', queryset=User.objects.select_related('profile').order_by('id')),
+        Prefetch('notification_states', queryset=TripNotificationState.objects.filter(user=user)),
+    ).distinct()
+    return get_object_or_404(queryset, pk=pk)
+
+
+def build_dashboard(trip, request, chat_limit=DEFAULT_CHAT_LIMIT):
+    """Assemble the dashboard payload for a trip loaded by get_dashboard_trip()."""
+    context = {'request': request}
+
+    items = ItineraryItem.objects.filter(trip=trip).order_by('order')
+
+    polls = list(with_results(Poll.objects.filter(trip=trip)))
+    poll_context = {**context, 'voted_poll_ids': voted_poll_ids(request.user, [poll.id for poll in polls])}
+
+    # Latest N messages, returned oldest first like the chat endpoint
+    messages = list(
+        ChatMessage.objects.filter(trip=trip).select_related('sender').order_by('-created_at')[:chat_limit]
+    )
+    messages.reverse()
+
+    state = next(iter(trip.notification_states.all()), None)
+    unread = {
+        'chat': state.unread_chat_count if state else 0,
+        'poll': state.unread_poll_count if state else 0,
+        'itinerary': state.unread_itinerary_count if state else 0,
+    }
+
+    return {
+        'trip': TripSerializer(trip, context=context).data,
+        'itinerary': ItineraryItemSerializer(items, many=True, context=context).data,
+        'polls': PollSerializer(polls, many=True, context=poll_context).data,
+        'chat': ChatMessageSerializer(messages, many=True, context=context).data,
+        'unread': unread,
+    }
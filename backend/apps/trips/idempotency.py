@@ -0,0 +1,121 @@
+"""
+Idempotency-Key support for single writes.
+
+    POST /api/chat/trips/{id}/chat/
+    Idempotency-Key: 6f1c0e3a-...
+
+The first request with a key runs as usual and its response is recorded in
+AppliedMutation. A retry with the same key gets the recorded response back
+with `Idempotent-Replayed: true`, after one lookup: no domain writes, no
+signals, no notification fan-out. Reusing a key for a different request is
+a 422. Keys share their namespace with the mutation batch's client ids, so
+an operation is never applied twice through either path. Batch ids are
+scoped to the trip; a key is looked up across the user's trips, so reusing
+one on another trip is a 422 too (the path differs).
+
+Only successful responses are recorded; a failed request can be retried
+with the same key. Keys expire after settings.IDEMPOTENCY_KEY_TTL; run
+`manage.py prune_idempotency_keys` to delete expired ones.
+"""
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import AppliedMutation
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 64
+
+
+def _fingerprint(request, type):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    raw = '|'.join([type, request.path, body])
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _lookup(user, key):
+    """The live record for key, deleting it if it has expired."""
+    record = AppliedMutation.objects.filter(user=user, client_id=key).first()
+    if record is not None and record.expires_at is not None and record.expires_at <= timezone.now():
+        record.delete()
+        return None
+    return record
+
+
+def _replay(record, type, fingerprint):
+    # Batch entries carry no fingerprint and a batch-shaped result
+    if record.type != type or record.fingerprint != fingerprint:
+        return Response(
+            {'detail': 'Idempotency-Key was already used for a different request.'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    return Response(record.result, status=record.status_code, headers={REPLAYED_HEADER: 'true'})
+
+
+def idempotent(type, trip_id):
+    """
+    Decorator for a write handler (view, request, *args, **kwargs).
+
+    type names the operation, as in the mutation batch ('chat.send').
+    trip_id is the URL kwarg holding the trip id, or a callable
+    (view, kwargs) returning it; it is only used once the write succeeded.
+    """
+    if isinstance(trip_id, str):
+        trip_id = lambda view, kwargs, name=trip_id: kwargs[name]
+
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(view, request, *args, **kwargs):
+            key = request.META.get(HEADER)
+            if key is None:
+                return handler(view, request, *args, **kwargs)
+            if not key or len(key) > MAX_KEY_LENGTH:
+                return Response(
+                    {'detail': f'Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters.'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            fingerprint = _fingerprint(request, type)
+            record = _lookup(request.user, key)
+            if record is not None:
+                return _replay(record, type, fingerprint)
+
+            try:
+                # The write and its record commit together
+                with transaction.atomic():
+                    response = handler(view, request, *args, **kwargs)
+                    if not status.is_success(response.status_code):
+                        return response
+                    AppliedMutation.objects.create(
+                        user=request.user,
+                        trip_id=trip_id(view, kwargs),
+                        client_id=key,
+                        type=type,
+                        status_code=response.status_code,
+                        result=response.data,
+                        fingerprint=fingerprint,
+                        expires_at=timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+                    )
+            except IntegrityError:
+                # A concurrent request with the same key won; ours rolled back
+                record = _lookup(request.user, key)
+                if record is None:
+                    raise
+                return _replay(record, type, fingerprint)
+            return response
+        return wrapper
+    return decorator
+
+
+def prune(now=None):
+    """Delete expired keys. Returns the number deleted."""
+    deleted, _ = AppliedMutation.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
@@ -0,0 +1,150 @@
+"""
+Bulk trip invites.
+
+    POST /api/trips/{id}/invite/bulk/
+    {"identifiers": ["bob", "carol@example.com", ...]}
+
+Resolves every identifier the way TripInviteSerializer does one (usernames
+must exist; emails invite the matching user, or the address when none or
+several match) but with set-based queries: one for the directory entries,
+one for memberships, one for pending invites, then a bulk_create of the
+invites, their notifications and their outbox emails. Each identifier gets an outcome instead of
+failing the request:
+
+    invited          an invite was created
+    not_found        no user has that username
+    member           already the owner or a collaborator
+    already_invited  a pending invite exists
+    duplicate        an earlier identifier in the request named the same person
+    invalid          blank or not a valid email
+
+bulk_create skips post_save, so the invitee notifications and version
+bumps the TripInvite receivers in signals.py make are done here.
+"""
+from django.conf import settings
+from django.core import mail
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import Q
+
+from apps.users import directory
+from apps.users.models import DirectoryEntry
+from . import outbox, versions
+from .models import Notification, Trip, TripInvite
+
+MAX_IDENTIFIERS = 100
+
+
+def invite_email(invite, inviter, trip):
+    """The invitation mail for one invite."""
+    invite_link = f"http://localhost:8000/api/invites/accept/{invite.token}/"
+    message = (
+        f"User {inviter.username} has invited you to join the trip '{trip.title}'.\n\n"
+        f"Click the link below to join:\n{invite_link}"
+    )
+    return mail.EmailMessage(
+        "You're invited to join a trip",
+        message,
+        settings.DEFAULT_FROM_EMAIL or 'noreply@smarttripplanner.com',
+        [invite.invited_email],
+    )
+
+
+def _parse(identifier):
+    """(kind, normalized value), kind being 'username', 'email' or None."""
+    value = directory.normalize(identifier)
+    if not value:
+        return None, value
+    if '@' not in value:
+        return 'username', value
+    try:
+        validate_email(value)
+    except ValidationError:
+        return None, value
+    return 'email', value
+
+
+def bulk_invite(trip, inviter, identifiers):
+    """Invite everyone in `identifiers`; returns one outcome dict per identifier."""
+    parsed = [_parse(identifier) for identifier in identifiers]
+    usernames = {value for kind, value in parsed if kind == 'username'}
+    emails = {value for kind, value in parsed if kind == 'email'}
+
+    by_username, by_email = {}, {}
+    entries = DirectoryEntry.objects.filter(Q(username__in=usernames) | Q(email__in=emails))
+    for user_id, username, email in entries.values_list('user_id', 'username', 'email'):
+        if username in usernames:
+            by_username[username] = (user_id, email)
+        if email in emails:
+            by_email.setdefault(email, []).append(user_id)
+
+    members = set(Trip.collaborators.through.objects.filter(trip=trip).values_list('user_id', flat=True))
+    members.add(trip.owner_id)
+
+    # Resolve each identifier to (user id or None, email to store)
+    targets = []
+    for kind, value in parsed:
+        if kind == 'username':
+            user_id, email = by_username.get(value, (None, None))
+            targets.append((user_id, email) if user_id else None)
+        elif kind == 'email':
+            matches = by_email.get(value, [])
+            targets.append((matches[0] if len(matches) == 1 else None, value))
+        else:
+            targets.append(None)
+
+    user_ids = {target[0] for target in targets if target and target[0]}
+    target_emails = {target[1] for target in targets if target and target[1]}
+    pending_users, pending_emails = set(), set()
+    pending = TripInvite.objects.filter(trip=trip, status='PENDING').filter(
+        Q(invited_user_id__in=user_ids) | Q(invited_email__in=target_emails)
+    )
+    for user_id, email in pending.values_list('invited_user_id', 'invited_email'):
+        if user_id:
+            pending_users.add(user_id)
+        if email:
+            pending_emails.add(email)
+
+    outcomes, invites, seen = [], [], set()
+    for identifier, (kind, value), target in zip(identifiers, parsed, targets):
+        if target is None:
+            outcomes.append({'identifier': identifier, 'status': 'not_found' if kind == 'username' else 'invalid'})
+            continue
+        user_id, email = target
+        # An email several users share counts as a member if any of them is one
+        if user_id in members or (not user_id and members & set(by_email.get(email, []))):
+            result = 'member'
+        elif user_id in pending_users or email in pending_emails:
+            result = 'already_invited'
+        elif (user_id or email) in seen:
+            result = 'duplicate'
+        else:
+            seen.add(user_id or email)
+            invites.append(TripInvite(
+                trip=trip, invited_by=inviter, invited_user_id=user_id, invited_email=email or None,
+            ))
+            result = 'invited'
+        outcomes.append({'identifier': identifier, 'status': result})
+
+    if invites:
+        with transaction.atomic():
+            TripInvite.objects.bulk_create(invites)
+            Notification.objects.bulk_create(
+                Notification(
+                    recipient_id=invite.invited_user_id,
+                    actor=inviter,
+                    trip=trip,
+                    verb=f"invited you to {trip.title}",
+                    target_type='invite',
+                )
+                for invite in invites if invite.invited_user_id
+            )
+            # Pending invites are counted by email, by everyone sharing it
+            invitees = {invite.invited_user_id for invite in invites if invite.invited_user_id}
+            invitees.update(
+                user_id for invite in invites for user_id in by_email.get(invite.invited_email, [])
+            )
+            versions.bump_users(invitees)
+            outbox.enqueue(invite_email(invite, inviter, trip) for invite in invites if invite.invited_email)
+    return outcomes
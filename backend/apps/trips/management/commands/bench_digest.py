@@ -0,0 +1,80 @@
+"""
+Benchmark the notification digest job.
+
+Seeds --users users with --per-user unread notifications each, spread over
+a few trips and types, inside a transaction that is rolled back afterwards.
+Then runs the digest inline and reports users per second, queries per
+chunk and peak Python memory. The pooled run (--workers) needs committed
+data, so it is not measured here.
+
+Usage:
+    python manage.py bench_digest --users 100000 --per-user 3 --chunk-size 1000
+"""
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.trips import digest
+from apps.trips.models import Notification, OutboxEmail, Trip
+
+User = get_user_model()
+
+CHUNK = 5000
+TYPES = ['chat', 'chat', 'poll', 'itinerary']
+
+
+class Command(BaseCommand):
+    help = "Time the notification digest job over seeded users."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--per-user', type=int, default=3, help="Unread notifications per user.")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if min(options['users'], options['per_user'], options['chunk_size']) < 1:
+            raise CommandError("--users, --per-user and --chunk-size must be positive.")
+
+        with transaction.atomic():
+            started = time.perf_counter()
+            self.seed(options['users'], options['per_user'])
+            self.stdout.write(f"Seeded {options['users']} users in {time.perf_counter() - started:.1f}s")
+
+            tracemalloc.start()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                queued = digest.run(chunk_size=options['chunk_size'], now=timezone.now() + timedelta(days=1))
+                elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            emails = OutboxEmail.objects.count()
+            transaction.set_rollback(True)
+
+        chunks = -(-options['users'] // options['chunk_size'])
+        self.stdout.write(f"Queued {queued} digests ({emails} outbox rows) in {elapsed:.1f}s")
+        self.stdout.write(f"{options['users'] / elapsed:.0f} users/s, {len(queries) / chunks:.1f} queries/chunk")
+        self.stdout.write(f"Peak traced memory {peak / 1024 / 1024:.1f} MiB")
+
+    def seed(self, count, per_user):
+        first_id = (User.objects.order_by('-pk').values_list('pk', flat=True).first() or 0) + 1
+        actor = User.objects.create(username=f'bench-digest-actor-{first_id}', password='!')
+        trips = [Trip.objects.create(owner=actor, title=f'Bench trip {i}') for i in range(3)]
+        for start in range(0, count, CHUNK):
+            ids = range(first_id + start + 1, first_id + 1 + min(start + CHUNK, count))
+            User.objects.bulk_create(
+                User(pk=pk, username=f'bench-digest-{pk}', email=f'bench-digest-{pk}@example.com', password='!')
+                for pk in ids
+            )
+            Notification.objects.bulk_create(
+                Notification(
+                    recipient_id=pk, actor=actor, trip=trips[(pk + i) % len(trips)], verb='did something',
+                    target_type=TYPES[(pk + i) % len(TYPES)],
+                )
+                for pk in ids for i in range(per_user)
+            )
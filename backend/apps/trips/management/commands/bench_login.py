@@ -0,0 +1,111 @@
+"""
+Benchmark login throughput.
+
+Creates users (deleted again afterwards), then logs them in three ways and
+reports logins per second and queries per login:
+
+    baseline  the previous LoginAPIView steps: OR lookup on username/email,
+              authenticate(), profile get_or_create, a RefreshToken that
+              writes its OutstandingToken row, and update_last_login
+    sync      apps.users.login as LoginAPIView runs it
+    async     apps.users.login as AsyncLoginView runs it, --concurrency
+              logins at a time on one event loop
+
+Usage:
+    python manage.py bench_login --logins 40 --concurrency 8
+"""
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.models import update_last_login
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.http import HttpRequest
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.users import login
+from apps.users.models import Profile
+from apps.users.write_behind import writes
+
+User = get_user_model()
+
+PASSWORD = 'bench-password'
+
+
+def baseline_login(identifier):
+    user = User.objects.filter(Q(username__iexact=identifier) | Q(email__iexact=identifier)).first()
+    user = authenticate(username=user.username, password=PASSWORD)
+    refresh = RefreshToken.for_user(user)
+    profile, _ = Profile.objects.get_or_create(user=user)
+    update_last_login(None, user)
+    return str(refresh.access_token), profile.avatar_icon
+
+
+def sync_login(identifier):
+    return login.login_payload(login.authenticate(HttpRequest(), identifier, PASSWORD))
+
+
+async def async_logins(identifiers, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(identifier):
+        async with semaphore:
+            user = await login.aauthenticate(HttpRequest(), identifier, PASSWORD)
+            return await sync_to_async(login.login_payload)(user)
+
+    await asyncio.gather(*(one(identifier) for identifier in identifiers))
+
+
+class Command(BaseCommand):
+    help = "Compare login throughput of the previous, sync and async login paths."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=40, help="Logins per run.")
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--concurrency', type=int, default=8, help="Concurrent logins in the async run.")
+
+    def handle(self, *args, **options):
+        if min(options['logins'], options['users'], options['concurrency']) < 1:
+            raise CommandError("--logins, --users and --concurrency must be positive.")
+
+        users = [
+            User.objects.create_user(username=f'bench-login-{i}', email=f'Bench-{i}@example.com', password=PASSWORD)
+            for i in range(options['users'])
+        ]
+        identifiers = [
+            users[i % len(users)].email.lower() if i % 2 else users[i % len(users)].username.upper()
+            for i in range(options['logins'])
+        ]
+        rows = []
+        try:
+            for name, run in (('baseline', baseline_login), ('sync', sync_login)):
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    for identifier in identifiers:
+                        run(identifier)
+                    elapsed = time.perf_counter() - started
+                    writes.flush()
+                rows.append((name, len(identifiers) / elapsed, len(queries) / len(identifiers)))
+
+            started = time.perf_counter()
+            asyncio.run(async_logins(identifiers, options['concurrency']))
+            elapsed = time.perf_counter() - started
+            writes.flush()
+            rows.append((f"async x{options['concurrency']}", len(identifiers) / elapsed, None))
+        finally:
+            writes.clear()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+        self.stdout.write(
+            f"{len(identifiers)} logins, {settings.LOGIN_HASH_WORKERS} hash workers "
+            f"(queries include the flushed write-behind batches)"
+        )
+        self.stdout.write(f"{'path':<12} {'logins/s':>9} {'queries/login':>14}")
+        for name, rate, queries in rows:
+            per_login = '-' if queries is None else f'{queries:.2f}'
+            self.stdout.write(f"{name:<12} {rate:>9.1f} {per_login:>14}")
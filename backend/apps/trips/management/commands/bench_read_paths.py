@@ -0,0 +1,131 @@
+"""
+Benchmark the serializer and values-based read paths.
+
+Seeds synthetic trips, chat messages and notifications inside a transaction
+that is rolled back afterwards, checks both paths render identical JSON, and
+reports rows per second for each.
+
+Usage:
+    python manage.py bench_read_paths --rows 500 --repeat 20
+"""
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Prefetch
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from apps.chat.models import ChatMessage
+from apps.chat.readers import message_reader
+from apps.chat.serializers import ChatMessageSerializer
+from apps.trips import readers
+from apps.trips.models import Trip, Notification, TripNotificationState
+from apps.trips.serializers import TripSerializer, NotificationSerializer
+
+User = get_user_model()
+
+MEMBERS = 10
+
+
+class Command(BaseCommand):
+    help = "Compare rows per second of the serializer and values-based read paths."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500, help="Rows per endpoint.")
+        parser.add_argument('--repeat', type=int, default=20, help="Timed renders per path.")
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        if rows < 1 or repeat < 1:
+            raise CommandError("--rows and --repeat must be positive.")
+
+        with transaction.atomic():
+            user, trip = self.seed(rows)
+            for name, slow, fast in self.cases(user, trip):
+                renderer = JSONRenderer()
+                if renderer.render(slow(self.request(user))) != renderer.render(fast(self.request(user))):
+                    raise CommandError(f"{name}: read paths disagree.")
+
+                before = self.rate(slow, user, rows, repeat)
+                after = self.rate(fast, user, rows, repeat)
+                self.stdout.write(
+                    f"{name:<22} serializer {before:>10,.0f} rows/s   "
+                    f"values {after:>10,.0f} rows/s   x{after / before:.1f}"
+                )
+            transaction.set_rollback(True)
+
+    def request(self, user):
+        # A fresh request per render so request-scoped loaders start cold
+        request = RequestFactory().get('/')
+        request.user = user
+        return request
+
+    def rate(self, render, user, rows, repeat):
+        renderer = JSONRenderer()
+        elapsed = 0.0
+        for _ in range(repeat):
+            request = self.request(user)
+            start = time.perf_counter()
+            renderer.render(render(request))
+            elapsed += time.perf_counter() - start
+        return rows * repeat / elapsed
+
+    def seed(self, rows):
+        user = User.objects.create(username='bench-owner', first_name='Bench')
+        members = [User.objects.create(username=f'bench-member-{i}') for i in range(MEMBERS)]
+
+        trips = Trip.objects.bulk_create(
+            Trip(owner=user, title=f'Trip {i}', description='Benchmark trip') for i in range(rows)
+        )
+        Trip.collaborators.through.objects.bulk_create(
+            Trip.collaborators.through(trip_id=t.id, user_id=members[(i + k) % MEMBERS].id)
+            for i, t in enumerate(trips) for k in range(2)
+        )
+        TripNotificationState.objects.bulk_create(
+            TripNotificationState(user=user, trip=t, unread_chat_count=i % 5) for i, t in enumerate(trips)
+        )
+
+        trip = trips[0]
+        ChatMessage.objects.bulk_create(
+            ChatMessage(trip=trip, sender=members[i % MEMBERS], message=f'Message {i}') for i in range(rows)
+        )
+        Notification.objects.bulk_create(
+            Notification(recipient=user, actor=members[i % MEMBERS], trip=trips[i % len(trips)],
+                         verb='sent a message', target_type='chat')
+            for i in range(rows)
+        )
+        return user, trip
+
+    def cases(self, user, trip):
+        trips = Trip.objects.filter(owner=user)
+        messages = ChatMessage.objects.filter(trip=trip)
+        notifications = Notification.objects.filter(recipient=user)
+
+        def slow_trips(request):
+            queryset = trips.select_related('owner__profile').prefetch_related(
+                Prefetch('collaborators', queryset=User.objects.select_related('profile').order_by('id'))
+            )
+            return TripSerializer(queryset, many=True, context={'request': request}).data
+
+        def fast_trips(request):
+            return readers.render_trips(trips.values(*readers.trip_reader.fields), request)
+
+        def slow_chat(request):
+            return ChatMessageSerializer(messages.select_related('sender'), many=True).data
+
+        def fast_chat(request):
+            return message_reader.render(messages.values(*message_reader.fields))
+
+        def slow_notifications(request):
+            return NotificationSerializer(notifications, many=True, context={'request': request}).data
+
+        def fast_notifications(request):
+            return readers.render_notifications(notifications.values(*readers.notification_reader.fields))
+
+        return [
+            ('trips', slow_trips, fast_trips),
+            ('chat', slow_chat, fast_chat),
+            ('notification history', slow_notifications, fast_notifications),
+        ]
@@ -0,0 +1,127 @@
+"""
+Benchmark the response cache on a read-heavy request mix.
+
+Seeds trips shared by a handful of members inside a transaction that is
+rolled back afterwards, then replays the same random sequence of requests
+(trip list, detail, dashboard, itinerary, polls; writes add itinerary items
+or rename trips) with the cache off and on, and reports requests per second
+and the hit ratio. Throttling is disabled so only the views are measured.
+
+Usage:
+    python manage.py bench_response_cache --requests 2000 --read-ratio 0.9
+    python manage.py bench_response_cache --backend file
+"""
+import random
+import tempfile
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import override_settings
+from django.urls import resolve
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.polls.models import Poll, PollOption
+from apps.trips import response_cache
+from apps.trips.models import Trip, ItineraryItem
+
+User = get_user_model()
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+}
+
+
+class Command(BaseCommand):
+    help = "Compare requests per second with the response cache off and on."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help="Requests per run.")
+        parser.add_argument('--read-ratio', type=float, default=0.9, help="Share of GETs in the mix.")
+        parser.add_argument('--trips', type=int, default=10)
+        parser.add_argument('--members', type=int, default=5)
+        parser.add_argument('--backend', choices=sorted(BACKENDS), default='locmem')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or not 0 <= options['read_ratio'] <= 1:
+            raise CommandError("--requests must be positive and --read-ratio within [0, 1].")
+
+        with tempfile.TemporaryDirectory() as location:
+            caches = {
+                'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                'responses': {'BACKEND': BACKENDS[options['backend']], 'LOCATION': location},
+            }
+            with override_settings(CACHES=caches):
+                results = {}
+                for enabled in (False, True):
+                    with override_settings(RESPONSE_CACHE_ENABLED=enabled):
+                        response_cache.get_cache().clear()
+                        response_cache.reset_metrics()
+                        results[enabled] = self.run(options)
+
+        (off, _), (on, metrics) = results[False], results[True]
+        self.stdout.write(
+            f"{options['requests']} requests, {options['read_ratio']:.0%} reads, backend {options['backend']}\n"
+            f"cache off {off:>10,.0f} req/s\n"
+            f"cache on  {on:>10,.0f} req/s   x{on / off:.1f}   "
+            f"hit ratio {metrics['hit_ratio']:.0%} ({metrics['hits']} hits, {metrics['misses']} misses)"
+        )
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        factory = APIRequestFactory()
+        with transaction.atomic():
+            members, trips = self.seed(options['trips'], options['members'])
+            elapsed = 0.0
+            for i in range(options['requests']):
+                user, trip = rng.choice(members), rng.choice(trips)
+                if rng.random() < options['read_ratio']:
+                    request = factory.get(rng.choice(self.read_paths(trip)))
+                elif i % 2:
+                    request = factory.post(f'/api/trips/{trip.id}/itinerary/', {'title': f'Stop {i}'}, format='json')
+                else:
+                    # Only the owner may rename
+                    user = members[0]
+                    request = factory.patch(f'/api/trips/{trip.id}/', {'title': f'Trip {i}'}, format='json')
+                force_authenticate(request, user=user)
+
+                start = time.perf_counter()
+                response = self.view_for(request.path)(request, **resolve(request.path).kwargs)
+                response.render()
+                elapsed += time.perf_counter() - start
+                if response.status_code >= 400:
+                    raise CommandError(f"{request.method} {request.path}: {response.status_code}")
+            transaction.set_rollback(True)
+        return options['requests'] / elapsed, response_cache.metrics()
+
+    def view_for(self, path):
+        func = resolve(path).func
+        return func.cls.as_view(func.actions, **{**func.initkwargs, 'throttle_classes': ()})
+
+    def read_paths(self, trip):
+        return [
+            '/api/trips/',
+            f'/api/trips/{trip.id}/',
+            f'/api/trips/{trip.id}/dashboard/',
+            f'/api/trips/{trip.id}/itinerary/',
+            f'/api/polls/trips/{trip.id}/polls/',
+        ]
+
+    def seed(self, trip_count, member_count):
+        owner = User.objects.create(username='bench-owner')
+        members = [owner] + [User.objects.create(username=f'bench-member-{i}') for i in range(member_count - 1)]
+        trips = []
+        for t in range(trip_count):
+            trip = Trip.objects.create(owner=owner, title=f'Trip {t}', description='Benchmark trip')
+            trip.collaborators.add(*members[1:])
+            ItineraryItem.objects.bulk_create(
+                ItineraryItem(trip=trip, title=f'Item {i}', order=i + 1, created_by=owner) for i in range(10)
+            )
+            for p in range(3):
+                poll = Poll.objects.create(trip=trip, question=f'Q{p}', created_by=owner)
+                PollOption.objects.bulk_create(PollOption(poll=poll, text=text) for text in 'AB')
+            trips.append(trip)
+        return members, trips
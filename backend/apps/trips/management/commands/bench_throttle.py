@@ -0,0 +1,75 @@
+"""
+Benchmark the per-request cost and state size of the throttles.
+
+Runs the same sequence of checks, spread over a number of users, through
+DRF's stock UserRateThrottle (a list of request timestamps per key in the
+default cache) and through the GCRA throttle on the memory and SQLite
+stores (one number per key), and reports microseconds per check and the
+state stored for a key that has used its whole rate.
+
+Usage:
+    python manage.py bench_throttle --checks 20000 --users 50 --rate 1000/minute
+"""
+import os
+import pickle
+import tempfile
+import time
+from types import SimpleNamespace
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from rest_framework import throttling as drf_throttling
+
+from middleware import throttling
+
+
+def _throttle(base, rate):
+    return type('BenchThrottle', (base,), {'rate': rate})()
+
+
+class Command(BaseCommand):
+    help = "Compare DRF's stock user throttle with the GCRA throttle."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checks', type=int, default=20000, help="Throttle checks per run.")
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--rate', default='1000/minute', help="Rate under test, as in DEFAULT_THROTTLE_RATES.")
+
+    def handle(self, *args, **options):
+        if options['checks'] < 1 or options['users'] < 1:
+            raise CommandError("--checks and --users must be positive.")
+        requests = [
+            SimpleNamespace(user=SimpleNamespace(pk=i, is_authenticated=True), META={})
+            for i in range(options['users'])
+        ]
+
+        rows = []
+        cache.clear()
+        stock = _throttle(drf_throttling.UserRateThrottle, options['rate'])
+        rows.append(('drf (locmem cache)',) + self.run(stock, requests, options['checks']))
+        key = stock.get_cache_key(requests[0], None)
+        rows[-1] += (len(pickle.dumps(cache.get(key, []))),)
+        cache.clear()
+
+        with tempfile.TemporaryDirectory() as directory:
+            location = os.path.join(directory, 'throttle.sqlite3')
+            for kind in ('memory', 'sqlite'):
+                with override_settings(THROTTLE_STORE=kind, THROTTLE_STORE_LOCATION=location):
+                    gcra = _throttle(throttling.UserRateThrottle, options['rate'])
+                    rows.append((f'gcra ({kind})',) + self.run(gcra, requests, options['checks']))
+                    rows[-1] += (len(pickle.dumps(0.0)),)
+                    throttling.get_store().clear()
+
+        self.stdout.write(f"{options['checks']} checks over {options['users']} users at {options['rate']}")
+        self.stdout.write(f"{'throttle':<20} {'us/check':>9} {'allowed':>8} {'bytes/key':>10}")
+        for name, per_check, allowed, size in rows:
+            self.stdout.write(f"{name:<20} {per_check:>9.1f} {allowed:>8} {size:>10}")
+
+    def run(self, throttle, requests, checks):
+        allowed = 0
+        started = time.perf_counter()
+        for i in range(checks):
+            allowed += throttle.allow_request(requests[i % len(requests)], None)
+        elapsed = time.perf_counter() - started
+        return elapsed / checks * 1e6, allowed
@@ -0,0 +1,86 @@
+"""
+Benchmark case-insensitive user lookups and prefix search at scale.
+
+Seeds --users users with directory entries inside a transaction that is
+rolled back afterwards, then times the same random lookups as an iexact
+filter on auth_user (what login and invites did before) and through the
+directory, plus autocomplete searches of 2-4 character prefixes.
+
+Usage:
+    python manage.py bench_user_directory --users 1000000 --lookups 200
+"""
+import random
+import string
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.users import directory
+from apps.users.models import DirectoryEntry
+
+User = get_user_model()
+
+CHUNK = 5000
+
+
+class Command(BaseCommand):
+    help = "Compare iexact lookups on auth_user with the user directory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000000)
+        parser.add_argument('--lookups', type=int, default=200, help="Lookups and searches per run.")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['lookups'] < 1:
+            raise CommandError("--users and --lookups must be positive.")
+        rng = random.Random(options['seed'])
+
+        with transaction.atomic():
+            started = time.perf_counter()
+            names = self.seed(rng, options['users'])
+            self.stdout.write(f"Seeded {options['users']} users in {time.perf_counter() - started:.1f}s")
+
+            sample = [rng.choice(names) for _ in range(options['lookups'])]
+            rows = [
+                ('username iexact', self.time(sample, lambda n: User.objects.filter(username__iexact=n.upper()).first())),
+                ('username directory', self.time(sample, lambda n: directory.users_by_username(n.upper()).first())),
+                ('email iexact', self.time(sample, lambda n: User.objects.filter(email__iexact=f'{n}@Example.com').first())),
+                ('email directory', self.time(sample, lambda n: directory.users_by_email(f'{n}@Example.com').first())),
+                ('search prefix', self.time(
+                    [n[:rng.randint(2, 4)] for n in sample], lambda q: directory.search(q, limit=10)
+                )),
+            ]
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"{'lookup':<20} {'ms/lookup':>10}")
+        for name, per_lookup in rows:
+            self.stdout.write(f"{name:<20} {per_lookup * 1000:>10.3f}")
+
+    def seed(self, rng, count):
+        names = []
+        first_id = (User.objects.order_by('-pk').values_list('pk', flat=True).first() or 0) + 1
+        for start in range(0, count, CHUNK):
+            chunk = [
+                ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 12))) + str(start + i)
+                for i in range(min(CHUNK, count - start))
+            ]
+            User.objects.bulk_create(
+                User(pk=first_id + start + i, username=name.capitalize(), email=f'{name.capitalize()}@example.com',
+                     password='!')
+                for i, name in enumerate(chunk)
+            )
+            DirectoryEntry.objects.bulk_create(
+                DirectoryEntry(user_id=first_id + start + i, username=name, email=f'{name}@example.com')
+                for i, name in enumerate(chunk)
+            )
+            names.extend(chunk)
+        return names
+
+    def time(self, values, lookup):
+        started = time.perf_counter()
+        for value in values:
+            lookup(value)
+        return (time.perf_counter() - started) / len(values)
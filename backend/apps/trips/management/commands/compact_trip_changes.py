@@ -0,0 +1,33 @@
+"""
+Compact the trip change feed.
+
+Usage:
+    python manage.py compact_trip_changes --tombstone-days 30
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.trips.changelog import compact_changes
+
+
+class Command(BaseCommand):
+    help = "Drop superseded change feed entries and expire old tombstones."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tombstone-days',
+            type=int,
+            default=30,
+            help="Expire tombstones older than this many days (0 keeps them all).",
+        )
+
+    def handle(self, *args, **options):
+        days = options['tombstone_days']
+        cutoff = timezone.now() - timedelta(days=days) if days > 0 else None
+
+        superseded, tombstones = compact_changes(tombstone_cutoff=cutoff)
+        self.stdout.write(self.style.SUCCESS(
+            f"Removed {superseded} superseded entries and {tombstones} expired tombstones."
+        ))
@@ -0,0 +1,37 @@
+"""
+Deliver queued emails from the outbox.
+
+Usage:
+    python manage.py deliver_outbox            # drain what is due, then exit
+    python manage.py deliver_outbox --loop     # keep polling (the worker)
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.trips.outbox import deliver
+
+
+class Command(BaseCommand):
+    help = "Send due outbox emails over pooled SMTP connections, retrying failures."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep polling instead of exiting when drained.")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds between polls with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            totals = [0, 0, 0]
+            while True:
+                counts = deliver()
+                totals = [total + count for total, count in zip(totals, counts)]
+                # Drained, or nothing got through (the server may be down):
+                # wait for the next poll rather than claim the next batch
+                if not counts[0]:
+                    break
+            if any(totals):
+                sent, retried, dead = totals
+                self.stdout.write(self.style.SUCCESS(f"Sent {sent} emails, {retried} to retry, {dead} dead."))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
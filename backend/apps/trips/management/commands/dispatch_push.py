@@ -0,0 +1,33 @@
+"""
+Send push notifications for new notifications.
+
+Usage:
+    python manage.py dispatch_push            # push what is new, then exit
+    python manage.py dispatch_push --loop     # keep following (the worker)
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.trips.push import dispatch
+
+
+class Command(BaseCommand):
+    help = "Push new notifications to their recipients' registered devices."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep polling instead of exiting when caught up.")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds between polls with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            while True:
+                notifications, pushes, invalidated = dispatch()
+                if not notifications:
+                    break
+                self.stdout.write(
+                    f"{notifications} notifications: {pushes} pushes, {invalidated} tokens invalidated."
+                )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
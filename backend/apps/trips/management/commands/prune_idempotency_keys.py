@@ -0,0 +1,17 @@
+"""
+Delete expired Idempotency-Key records.
+
+Usage:
+    python manage.py prune_idempotency_keys
+"""
+from django.core.management.base import BaseCommand
+
+from apps.trips.idempotency import prune
+
+
+class Command(BaseCommand):
+    help = "Delete Idempotency-Key records past settings.IDEMPOTENCY_KEY_TTL."
+
+    def handle(self, *args, **options):
+        deleted = prune()
+        self.stdout.write(self.style.SUCCESS(f"Removed {deleted} expired idempotency keys."))
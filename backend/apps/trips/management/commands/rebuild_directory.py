@@ -0,0 +1,24 @@
+"""
+Repair the user directory (apps/users/directory.py).
+
+Usage:
+    python manage.py rebuild_directory
+
+DirectoryEntry rows follow User.save(); users written by queryset update(),
+bulk_create()/bulk_update() or raw SQL need this to be found by login,
+invites and search again. Safe to run at any time.
+"""
+from django.core.management.base import BaseCommand
+
+from apps.users.directory import rebuild
+
+
+class Command(BaseCommand):
+    help = "Create missing and correct stale user directory entries."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Users read per query.")
+
+    def handle(self, *args, **options):
+        created, updated = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Created {created} and updated {updated} directory entries."))
@@ -0,0 +1,23 @@
+"""
+Queue notification digest emails (delivered by deliver_outbox).
+
+Usage:
+    python manage.py send_digests --chunk-size 1000 --workers 4
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.trips.digest import run
+
+
+class Command(BaseCommand):
+    help = "Email each user a digest of the unread notifications they have not been sent yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Users per query and per worker task.")
+        parser.add_argument('--workers', type=int, default=1, help="Processes rendering chunks (1 runs inline).")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1 or options['workers'] < 1:
+            raise CommandError("--chunk-size and --workers must be positive.")
+        queued = run(chunk_size=options['chunk_size'], workers=options['workers'])
+        self.stdout.write(self.style.SUCCESS(f"Queued {queued} digests."))
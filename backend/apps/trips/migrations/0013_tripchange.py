@@ -0,0 +1,107 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:22
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trips", "0012_tripinvite_invited_by"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TripChangeState",
+            fields=[
+                (
+                    "trip",
+                    models.OneToOneField(
+                        help_text="Trip this counter belongs to",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="change_state",
+                        serialize=False,
+                        to="trips.trip",
+                    ),
+                ),
+                ("last_seq", models.PositiveBigIntegerField(default=0)),
+                ("floor_seq", models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="TripChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "seq",
+                    models.PositiveBigIntegerField(
+                        help_text="Per-trip sequence number"
+                    ),
+                ),
+                (
+                    "resource",
+                    models.CharField(
+                        choices=[
+                            ("trip", "Trip"),
+                            ("member", "Member"),
+                            ("itinerary", "Itinerary"),
+                            ("poll", "Poll"),
+                            ("chat", "Chat"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "object_id",
+                    models.CharField(
+                        help_text="Primary key of the changed object", max_length=64
+                    ),
+                ),
+                (
+                    "op",
+                    models.CharField(
+                        choices=[("upsert", "Upsert"), ("delete", "Delete")],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "data",
+                    models.JSONField(
+                        blank=True,
+                        encoder=django.core.serializers.json.DjangoJSONEncoder,
+                        null=True,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+                (
+                    "trip",
+                    models.ForeignKey(
+                        help_text="Trip the change belongs to",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="changes",
+                        to="trips.trip",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["trip", "seq"],
+                "indexes": [
+                    models.Index(
+                        fields=["trip", "resource", "object_id"],
+                        name="trips_tripc_trip_id_53d7f1_idx",
+                    )
+                ],
+                "unique_together": {("trip", "seq")},
+            },
+        ),
+    ]
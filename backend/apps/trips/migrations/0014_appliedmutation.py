@@ -0,0 +1,69 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:24
+
+from django.conf import settings
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("trips", "0013_tripchange"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AppliedMutation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "client_id",
+                    models.CharField(
+                        help_text="Client-supplied idempotency id", max_length=64
+                    ),
+                ),
+                ("type", models.CharField(max_length=30)),
+                ("status_code", models.PositiveSmallIntegerField()),
+                (
+                    "result",
+                    models.JSONField(
+                        blank=True,
+                        encoder=django.core.serializers.json.DjangoJSONEncoder,
+                        null=True,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+                (
+                    "trip",
+                    models.ForeignKey(
+                        help_text="Trip the operation was applied to",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="applied_mutations",
+                        to="trips.trip",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        help_text="User who submitted the operation",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="applied_mutations",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("user", "client_id")},
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("trips", "0014_appliedmutation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserChangeState",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        help_text="User this counter belongs to",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="change_state",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("version", models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="tripchangestate",
+            name="version",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
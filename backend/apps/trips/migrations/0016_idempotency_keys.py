@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trips", "0015_user_change_state"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="appliedmutation",
+            name="expires_at",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="appliedmutation",
+            name="fingerprint",
+            field=models.CharField(
+                blank=True,
+                help_text="Hash of the request an Idempotency-Key was first used with",
+                max_length=40,
+            ),
+        ),
+    ]
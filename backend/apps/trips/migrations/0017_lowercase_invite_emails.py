@@ -0,0 +1,18 @@
+from django.db import migrations
+from django.db.models.functions import Lower
+
+
+def lowercase_invite_emails(apps, schema_editor):
+    TripInvite = apps.get_model("trips", "TripInvite")
+    TripInvite.objects.exclude(invited_email=None).update(invited_email=Lower("invited_email"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trips", "0016_idempotency_keys"),
+    ]
+
+    operations = [
+        migrations.RunPython(lowercase_invite_emails, migrations.RunPython.noop),
+    ]
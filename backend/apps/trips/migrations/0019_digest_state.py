@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("trips", "0018_outbox_email"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DigestState",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="digest_state",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("last_notification_id", models.BigIntegerField(default=0)),
+                ("sent_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-19 04:28
+
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("trips", "0021_notification_preference"),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name="appliedmutation",
+            unique_together={("user", "trip", "client_id")},
+        ),
+    ]
@@ -4,6 +4,7 @@ Trip models for Smart Trip Planner.
 import uuid
 from django.db import models
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -79,7 +80,7 @@ class Trip(models.Model):
     
     def is_owner(self, user):
         """Check if user is the owner of this trip."""
-        return self.owner == user
+        return self.owner_id == user.id
     
     def is_collaborator(self, user):
         """Check if user is a collaborator on this trip."""
@@ -239,6 +240,12 @@ class TripInvite(models.Model):
             return f"Invite: {self.invited_user.username} ({self.trip.title})"
         return f"Invite: {self.invited_email} ({self.trip.title})"
 
+    def save(self, *args, **kwargs):
+        # Lowercased so lookups can match it exactly, on the index
+        if self.invited_email:
+            self.invited_email = self.invited_email.strip().lower()
+        super().save(*args, **kwargs)
+
     def clean(self):
         from django.core.exceptions import ValidationError
         if not self.invited_email and not self.invited_user:
@@ -274,7 +281,39 @@ class TripNotificationState(models.Model):
         indexes = [
             models.Index(fields=['user', 'trip']),
         ]
-        
+
+
+class TripNotificationPreference(models.Model):
+    """
+    How much a user hears about one type of activity in a trip.
+
+    No row means ALL: an unread count bump and a notification (for chat,
+    only when mentioned). MENTIONS keeps the unread count but is only
+    notified when mentioned; MUTED skips the user entirely, mentions
+    included (see services.notification_levels).
+    """
+    ALL = 'all'
+    MENTIONS = 'mentions'
+    MUTED = 'muted'
+    LEVEL_CHOICES = [
+        (ALL, 'All'),
+        (MENTIONS, 'Mentions only'),
+        (MUTED, 'Muted'),
+    ]
+    TYPE_CHOICES = [('chat', 'Chat'), ('poll', 'Poll'), ('itinerary', 'Itinerary')]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='trip_notification_preferences')
+    trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name='notification_preferences')
+    target_type = models.CharField(max_length=20, choices=TYPE_CHOICES)
+    level = models.CharField(max_length=10, choices=LEVEL_CHOICES, default=ALL)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [['user', 'trip', 'target_type']]
+
+    def __str__(self):
+        return f"{self.user_id} on {self.trip_id} {self.target_type}: {self.level}"
+
 
 class Notification(models.Model):
     """
@@ -296,3 +335,200 @@ class Notification(models.Model):
     def __str__(self):
         return f"Notification for {self.recipient}: {self.verb}"
 
+
+
+class TripChangeState(models.Model):
+    """
+    Per-trip sequence counter for the change feed.
+
+    last_seq is bumped under a row lock for every recorded change, so
+    sequence numbers within a trip are handed out in commit order.
+    floor_seq is raised by compaction when old entries are pruned;
+    clients resuming from below it must do a full resync.
+
+    version is the trip's cache validator: bumped with every recorded change
+    and also by writes that change rendered trip data without a feed entry
+    (e.g. a member's avatar). ETags for trip-scoped GETs derive from it.
+    """
+    trip = models.OneToOneField(
+        Trip,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='change_state',
+        help_text="Trip this counter belongs to"
+    )
+
+    last_seq = models.PositiveBigIntegerField(default=0)
+    floor_seq = models.PositiveBigIntegerField(default=0)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Changes for {self.trip_id}: {self.last_seq}"
+
+
+class UserChangeState(models.Model):
+    """
+    Per-user version counter for user-scoped reads: the trip list and
+    notifications. Bumped whenever anything those responses render changes
+    for the user (membership, trip details, unread counts, notifications,
+    invites, co-member profiles).
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='change_state',
+        help_text="User this counter belongs to"
+    )
+
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Version for user {self.user_id}: {self.version}"
+
+
+class TripChange(models.Model):
+    """
+    Append-only change log entry for delta sync.
+
+    Each entry is either an upsert carrying a compact payload of the
+    resource, or a tombstone (op='delete') with no payload.
+    """
+    OP_UPSERT = 'upsert'
+    OP_DELETE = 'delete'
+
+    OP_CHOICES = [
+        (OP_UPSERT, 'Upsert'),
+        (OP_DELETE, 'Delete'),
+    ]
+
+    RESOURCE_CHOICES = [
+        ('trip', 'Trip'),
+        ('member', 'Member'),
+        ('itinerary', 'Itinerary'),
+        ('poll', 'Poll'),
+        ('chat', 'Chat'),
+    ]
+
+    trip = models.ForeignKey(
+        Trip,
+        on_delete=models.CASCADE,
+        related_name='changes',
+        help_text="Trip the change belongs to"
+    )
+
+    seq = models.PositiveBigIntegerField(help_text="Per-trip sequence number")
+    resource = models.CharField(max_length=20, choices=RESOURCE_CHOICES)
+    object_id = models.CharField(max_length=64, help_text="Primary key of the changed object")
+    op = models.CharField(max_length=10, choices=OP_CHOICES)
+    data = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['trip', 'seq']
+        unique_together = [['trip', 'seq']]
+        indexes = [
+            models.Index(fields=['trip', 'resource', 'object_id']),
+        ]
+
+    def __str__(self):
+        return f"#{self.seq} {self.op} {self.resource}:{self.object_id}"
+
+
+class AppliedMutation(models.Model):
+    """
+    Result of an operation applied through the mutation batch endpoint or
+    a single write sent with an Idempotency-Key header (see idempotency.py).
+
+    Keyed by the client-supplied id so that replaying a queue whose
+    response was lost returns the original result instead of applying
+    the operation twice. Header keys expire; batch entries do not, since an
+    offline queue can be replayed days later.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='applied_mutations',
+        help_text="User who submitted the operation"
+    )
+
+    trip = models.ForeignKey(
+        Trip,
+        on_delete=models.CASCADE,
+        related_name='applied_mutations',
+        help_text="Trip the operation was applied to"
+    )
+
+    client_id = models.CharField(max_length=64, help_text="Client-supplied idempotency id")
+    type = models.CharField(max_length=30)
+    status_code = models.PositiveSmallIntegerField()
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    fingerprint = models.CharField(
+        max_length=40, blank=True,
+        help_text="Hash of the request an Idempotency-Key was first used with"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        unique_together = [['user', 'trip', 'client_id']]
+
+    def __str__(self):
+        return f"{self.type} {self.client_id} by {self.user_id}"
+
+
+class OutboxEmail(models.Model):
+    """
+    An email waiting to be delivered (see outbox.py).
+
+    Written in the transaction of the request that sends it, so it exists
+    exactly when that request's writes do; the deliver_outbox worker sends
+    it. Failed deliveries are retried with backoff until they become DEAD.
+    """
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('SENT', 'Sent'),
+        ('DEAD', 'Dead'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    to = models.JSONField(help_text="Recipient addresses")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(help_text="When a pending email is next due")
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.to)} ({self.status})"
+
+
+class DigestState(models.Model):
+    """
+    Where a user's notification digest left off (see digest.py): the next
+    digest covers unread notifications with a higher id.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='digest_state')
+    last_notification_id = models.BigIntegerField(default=0)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Digest for {self.user_id} up to #{self.last_notification_id}"
+
+
+class PushCursor(models.Model):
+    """
+    The last notification the push dispatcher has handled (see push.py).
+    A single row.
+    """
+    last_notification_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Pushed up to #{self.last_notification_id}"
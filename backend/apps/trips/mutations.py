@@ -0,0 +1,208 @@
+"""
+Offline mutation batch for a trip.
+
+Mobile clients queue edits while offline and replay them on reconnect.
+POST /api/trips/{id}/mutations/ applies the whole queue in one request:
+trip access is resolved once by the view, every operation runs through the
+existing serializers inside a single transaction (each in its own savepoint,
+so one stale edit does not sink the rest), and notification fan-out is
+coalesced to one per type.
+
+Operations reference objects created earlier in the same batch with
+"$<client_id>" in place of a server id. Client ids are scoped to the user
+and trip: an id seen before on this trip is replayed, not applied again.
+"""
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import IntegrityError, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound, PermissionDenied, ValidationError
+
+from apps.chat.serializers import ChatMessageSerializer
+from apps.polls.models import Poll
+from apps.polls.serializers import PollSerializer, VoteSerializer
+from .models import AppliedMutation, ItineraryItem
+from .serializers import ItineraryItemSerializer, ReorderItinerarySerializer
+from .services import coalesce_notifications, increment_notification_count
+
+
+class MutationBatch:
+    """Applies an ordered list of operations against one trip."""
+
+    def __init__(self, trip, request):
+        self.trip = trip
+        self.request = request
+        self.user = request.user
+        self.created_ids = {}
+
+    # --- helpers ------------------------------------------------------------
+
+    def resolve_id(self, value):
+        """Map "$<client_id>" to the id created earlier in this batch."""
+        if isinstance(value, str) and value.startswith('$'):
+            try:
+                return self.created_ids[value[1:]]
+            except KeyError:
+                raise ValidationError({'id': f"Unknown reference {value}."})
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise ValidationError({'id': "A valid id is required."})
+
+    def get_item(self, data):
+        return ItineraryItem.objects.get(trip=self.trip, id=self.resolve_id(data.get('id')))
+
+    def serializer_context(self):
+        return {'request': self.request, 'trip': self.trip}
+
+    # --- operations ---------------------------------------------------------
+
+    def itinerary_create(self, data):
+        serializer = ItineraryItemSerializer(data=data, context=self.serializer_context())
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        increment_notification_count(self.trip, self.user, 'itinerary')
+        return status.HTTP_201_CREATED, serializer.data
+
+    def itinerary_update(self, data):
+        item = self.get_item(data)
+        payload = {k: v for k, v in data.items() if k != 'id'}
+        serializer = ItineraryItemSerializer(item, data=payload, partial=True, context=self.serializer_context())
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        increment_notification_count(self.trip, self.user, 'itinerary')
+        return status.HTTP_200_OK, serializer.data
+
+    def itinerary_delete(self, data):
+        item = self.get_item(data)
+        # Same rule as ItineraryItemViewSet.destroy
+        if not (item.created_by_id == self.user.id or self.trip.owner_id == self.user.id):
+            raise PermissionDenied('Permission denied.')
+        item.delete()
+        increment_notification_count(self.trip, self.user, 'itinerary')
+        return status.HTTP_204_NO_CONTENT, None
+
+    def itinerary_reorder(self, data):
+        item_ids = [self.resolve_id(i) for i in data.get('item_ids') or []]
+        serializer = ReorderItinerarySerializer(data={'item_ids': item_ids}, context=self.serializer_context())
+        serializer.is_valid(raise_exception=True)
+        items = serializer.save()
+        increment_notification_count(self.trip, self.user, 'itinerary')
+        return status.HTTP_200_OK, ItineraryItemSerializer(items, many=True, context=self.serializer_context()).data
+
+    def chat_send(self, data):
+        serializer = ChatMessageSerializer(data=data, context=self.serializer_context())
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        increment_notification_count(self.trip, self.user, 'chat')
+        return status.HTTP_201_CREATED, serializer.data
+
+    def poll_create(self, data):
+        serializer = PollSerializer(data=data, context=self.serializer_context())
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        increment_notification_count(self.trip, self.user, 'poll')
+        return status.HTTP_201_CREATED, serializer.data
+
+    def poll_vote(self, data):
+        try:
+            poll = Poll.objects.get(trip=self.trip, id=self.resolve_id(data.get('poll_id')))
+        except Poll.DoesNotExist:
+            raise NotFound('Poll not found.')
+        serializer = VoteSerializer(data=data, context={'request': self.request, 'poll': poll})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        increment_notification_count(self.trip, self.user, 'poll')
+        return status.HTTP_200_OK, PollSerializer(poll, context={'request': self.request}).data
+
+    HANDLERS = {
+        'itinerary.create': itinerary_create,
+        'itinerary.update': itinerary_update,
+        'itinerary.delete': itinerary_delete,
+        'itinerary.reorder': itinerary_reorder,
+        'chat.send': chat_send,
+        'poll.create': poll_create,
+        'poll.vote': poll_vote,
+    }
+
+    # --- driver -------------------------------------------------------------
+
+    def apply(self, operations):
+        """
+        Apply operations in order and return one result per operation.
+
+        Operations whose client_id was applied before are not re-run; their
+        stored result is returned with replayed=True.
+        """
+        applied = self._applied([op['client_id'] for op in operations])
+
+        results = []
+        with transaction.atomic(), coalesce_notifications():
+            for op in operations:
+                previous = applied.get(op['client_id'])
+                if previous is not None:
+                    results.append(self._replay(op, previous))
+                    continue
+
+                results.append(self._apply_one(op))
+
+        return results
+
+    def _applied(self, client_ids):
+        """{client_id: AppliedMutation} for the ids already applied to this trip."""
+        return {
+            m.client_id: m
+            for m in AppliedMutation.objects.filter(user=self.user, trip=self.trip, client_id__in=client_ids)
+        }
+
+    def _replay(self, op, previous):
+        if isinstance(previous.result, dict) and 'id' in previous.result:
+            self.created_ids[op['client_id']] = previous.result['id']
+        return self._result(op, previous.status_code, previous.result, replayed=True)
+
+    def _apply_one(self, op):
+        handler = self.HANDLERS[op['type']]
+        try:
+            with transaction.atomic():
+                status_code, data = handler(self, op.get('data') or {})
+                AppliedMutation.objects.create(
+                    user=self.user,
+                    trip=self.trip,
+                    client_id=op['client_id'],
+                    type=op['type'],
+                    status_code=status_code,
+                    result=data,
+                )
+        except IntegrityError:
+            # A concurrent replay of the same queue applied it first; ours rolled back
+            previous = AppliedMutation.objects.filter(
+                user=self.user, trip=self.trip, client_id=op['client_id']
+            ).first()
+            if previous is None:
+                raise
+            return self._replay(op, previous)
+        except APIException as exc:
+            return self._error(op, exc.status_code, exc.detail)
+        except ObjectDoesNotExist:
+            return self._error(op, status.HTTP_404_NOT_FOUND, 'Not found.')
+
+        if isinstance(data, dict) and 'id' in data:
+            self.created_ids[op['client_id']] = data['id']
+        return self._result(op, status_code, data)
+
+    def _result(self, op, status_code, data, replayed=False):
+        return {
+            'client_id': op['client_id'],
+            'type': op['type'],
+            'status': status_code,
+            'data': data,
+            'replayed': replayed,
+        }
+
+    def _error(self, op, status_code, detail):
+        return {
+            'client_id': op['client_id'],
+            'type': op['type'],
+            'status': status_code,
+            'errors': detail,
+            'replayed': False,
+        }
@@ -0,0 +1,136 @@
+"""
+Transactional email outbox.
+
+Request handlers enqueue() EmailMessages instead of sending them: each one
+becomes an OutboxEmail row in the request's transaction, so a rolled-back
+request sends nothing and a slow SMTP server adds nothing to its latency.
+
+`manage.py deliver_outbox` drains the table. deliver() claims up to
+settings.OUTBOX_BATCH_SIZE due rows, leasing them for
+settings.OUTBOX_CLAIM_TIMEOUT seconds so concurrent workers skip them, and
+sends them over one SMTP connection, which is reopened only when the
+server drops it (a refused message leaves it usable). A failed message is
+retried after settings.OUTBOX_RETRY_DELAY seconds, doubling each time;
+after settings.OUTBOX_MAX_ATTEMPTS attempts it is marked DEAD and kept for
+inspection. Rows left untried because the server cannot be reached are put
+back for OUTBOX_RETRY_DELAY seconds without spending an attempt, so an SMTP
+outage does not dead-letter the queue. A worker that dies mid-batch leaves
+its rows to be claimed again once the lease runs out.
+"""
+import logging
+import smtplib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import mail
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(messages):
+    """Store EmailMessages for delivery; returns the OutboxEmail rows."""
+    now = timezone.now()
+    return OutboxEmail.objects.bulk_create(
+        OutboxEmail(
+            subject=message.subject,
+            body=message.body,
+            from_email=message.from_email or settings.DEFAULT_FROM_EMAIL,
+            to=list(message.to),
+            next_attempt_at=now,
+        )
+        for message in messages
+    )
+
+
+def _claim(limit, now):
+    with transaction.atomic():
+        due = OutboxEmail.objects.filter(status='PENDING', next_attempt_at__lte=now).order_by('next_attempt_at')
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        rows = list(due[:limit])
+        OutboxEmail.objects.filter(pk__in=[row.pk for row in rows]).update(
+            next_attempt_at=now + timedelta(seconds=settings.OUTBOX_CLAIM_TIMEOUT),
+        )
+    return rows
+
+
+def _retry_delay(attempts):
+    return timedelta(seconds=settings.OUTBOX_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def _open(smtp):
+    """Open the connection; returns the error if that failed."""
+    try:
+        smtp.open()
+    except Exception as e:
+        return e
+    return None
+
+
+def _keeps_connection(error):
+    """
+    Whether the server refused just this message (a recipient, the sender,
+    the data) and the connection can carry the next one. 421 means the
+    server is closing the connection.
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code != 421
+
+
+def deliver(limit=None, now=None):
+    """
+    Send one batch of due emails. Returns (sent, retried, dead) counts.
+    """
+    now = now or timezone.now()
+    rows = _claim(limit or settings.OUTBOX_BATCH_SIZE, now)
+    if not rows:
+        return 0, 0, 0
+
+    sent, failed, deferred = [], [], []
+    smtp = mail.get_connection(fail_silently=False)
+    error = _open(smtp)
+    for row in rows:
+        if error is not None:
+            # Not connected: the rest of the batch was never tried
+            deferred.append((row, error))
+            continue
+        message = mail.EmailMessage(row.subject, row.body, row.from_email, row.to)
+        try:
+            smtp.send_messages([message])
+            sent.append(row.pk)
+        except Exception as e:
+            failed.append((row, e))
+            if not _keeps_connection(e):
+                # The server dropped us: reconnect for the rest of the batch
+                smtp.close()
+                error = _open(smtp)
+    smtp.close()
+
+    OutboxEmail.objects.filter(pk__in=sent).update(
+        status='SENT', sent_at=timezone.now(), attempts=F('attempts') + 1, last_error='',
+    )
+    for row, error in deferred:
+        row.last_error = f"{type(error).__name__}: {error}"
+        row.next_attempt_at = now + timedelta(seconds=settings.OUTBOX_RETRY_DELAY)
+        row.save(update_fields=['last_error', 'next_attempt_at'])
+    if deferred:
+        logger.warning(f"SMTP unavailable, {len(deferred)} outbox emails put back: {deferred[0][0].last_error}")
+
+    dead = 0
+    for row, error in failed:
+        row.attempts += 1
+        row.last_error = f"{type(error).__name__}: {error}"
+        if row.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            row.status = 'DEAD'
+            dead += 1
+            logger.error(f"Giving up on outbox email {row.pk} after {row.attempts} attempts: {row.last_error}")
+        else:
+            row.next_attempt_at = now + _retry_delay(row.attempts)
+        row.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+    return len(sent), len(failed) - dead + len(deferred), dead
@@ -2,6 +2,7 @@
 Custom permissions for Trip management.
 """
 from rest_framework import permissions
+from . import access
 
 
 class IsOwner(permissions.BasePermission):
@@ -19,8 +20,9 @@ class IsOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         """
         Check if the requesting user is the owner of the trip.
+        Compares ids so the owner row is never loaded.
         """
-        return obj.owner == request.user
+        return obj.owner_id == request.user.id
 
 
 class IsOwnerOrCollaborator(permissions.BasePermission):
@@ -37,22 +39,16 @@ class IsOwnerOrCollaborator(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         """
         Check if the requesting user is owner or collaborator.
+        
+        Resolved through the request-scoped membership cache: at most one
+        query per trip per request, shared with the views' get_trip().
         """
-        # Owner always has access
-        # Handle objects that have 'owner' field (Trip)
-        if hasattr(obj, 'owner') and obj.owner == request.user:
-            return True
-        # Handle objects that belong to a Trip (Poll, ItineraryItem)
-        if hasattr(obj, 'trip') and obj.trip.owner == request.user:
-            return True
+        # Handle Trip objects directly
+        if hasattr(obj, 'collaborators'):
+            return access.is_member(request, obj)
         
-        # Check if user is a collaborator
-        # Handle objects that have 'collaborators' field (Trip)
-        if hasattr(obj, 'collaborators') and obj.collaborators.filter(id=request.user.id).exists():
-             return True
+        # Handle objects that belong to a Trip (Poll, ItineraryItem, ChatMessage)
+        if hasattr(obj, 'trip_id'):
+            return access.is_member(request, obj.trip_id)
         
-        # Handle objects that belong to a Trip (Poll, ItineraryItem)
-        if hasattr(obj, 'trip') and obj.trip.collaborators.filter(id=request.user.id).exists():
-             return True
-             
         return False
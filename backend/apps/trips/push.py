@@ -0,0 +1,165 @@
+"""
+Push notifications.
+
+Devices register their tokens with POST /api/users/devices/. The dispatcher
+(`manage.py dispatch_push --loop`) follows the Notification table by id
+from PushCursor, so the request path writes nothing extra: each pass claims
+up to settings.PUSH_BATCH_SIZE new notifications by advancing the cursor in
+a short transaction, then loads their recipients' devices, groups the
+pushes by platform, and hands them to the platform's provider in batches of
+provider.max_batch, at most settings.PUSH_CONCURRENCY calls at a time.
+Tokens a provider rejects are deleted.
+
+Ids are handed out before commit, so a notification can become visible
+after one with a higher id. Notifications younger than
+settings.PUSH_SETTLE_SECONDS wait for a later pass, which gives such
+transactions time to commit before the cursor moves past them.
+
+Providers are configured per platform in settings.PUSH_PROVIDERS.
+FileProvider is the local stand-in (JSON lines in settings.PUSH_FILE);
+adapters for FCM or APNs implement the same send(). Push is best effort:
+a failed batch is logged and not retried, and the notification stays in
+the in-app list; so are the pushes of a pass that crashes after its claim.
+Dispatchers claim batches under the cursor's row lock, so several can run
+without sending anything twice.
+"""
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from apps.users.models import PushDevice
+from .models import Notification, PushCursor
+
+logger = logging.getLogger(__name__)
+
+
+class Provider:
+    """
+    Delivers pushes for one platform. send() takes up to max_batch
+    (token, payload) pairs and returns the tokens the service reported as
+    no longer registered.
+    """
+    max_batch = 500
+
+    def send(self, messages):
+        raise NotImplementedError
+
+
+class FileProvider(Provider):
+    """Appends each push to settings.PUSH_FILE as a JSON line."""
+    _lock = threading.Lock()
+
+    def send(self, messages):
+        lines = ''.join(json.dumps({'token': token, **payload}) + '\n' for token, payload in messages)
+        with self._lock, open(settings.PUSH_FILE, 'a') as f:
+            f.write(lines)
+        return set()
+
+
+class LocmemProvider(Provider):
+    """
+    Records batches in LocmemProvider.batches, for tests; tokens in
+    LocmemProvider.invalid are reported as unregistered.
+    """
+    batches = []
+    invalid = set()
+
+    def send(self, messages):
+        self.batches.append(list(messages))
+        return {token for token, _ in messages if token in self.invalid}
+
+
+def get_provider(platform):
+    return import_string(settings.PUSH_PROVIDERS[platform])()
+
+
+def payload(row):
+    return {
+        'notification_id': row['id'],
+        'trip_id': str(row['trip_id']) if row['trip_id'] else None,
+        'type': row['target_type'],
+        'title': row['trip__title'] or '',
+        'body': f"{row['actor__username']} {row['verb']}",
+    }
+
+
+def _cursor():
+    # Start from now: notifications from before push was enabled are not sent.
+    # get_or_create settles a race between two first-run dispatchers.
+    cursor, _ = PushCursor.objects.select_for_update().get_or_create(pk=1, defaults={
+        'last_notification_id': lambda: Notification.objects.aggregate(last=Max('id'))['last'] or 0,
+    })
+    return cursor
+
+
+def _claim(now):
+    """
+    Claim the next batch of settled notifications: advance the cursor past
+    them and return their rows. The transaction covers only these queries.
+    """
+    cutoff = now - timedelta(seconds=settings.PUSH_SETTLE_SECONDS)
+    with transaction.atomic():
+        cursor = _cursor()
+        rows = list(
+            Notification.objects.filter(id__gt=cursor.last_notification_id, created_at__lte=cutoff).order_by('id')
+            .values('id', 'recipient_id', 'trip_id', 'trip__title', 'target_type', 'verb', 'actor__username')
+            [:settings.PUSH_BATCH_SIZE]
+        )
+        if rows:
+            cursor.last_notification_id = rows[-1]['id']
+            cursor.save(update_fields=['last_notification_id', 'updated_at'])
+    return rows
+
+
+def _send(provider, batch):
+    try:
+        return provider.send(batch)
+    except Exception as e:
+        logger.error(f"Push batch of {len(batch)} via {type(provider).__name__} failed: {e}")
+        return set()
+
+
+def dispatch(now=None):
+    """
+    Push the settled notifications created since the last call. Returns
+    (notifications, pushes, tokens invalidated).
+    """
+    rows = _claim(now or timezone.now())
+    if not rows:
+        return 0, 0, 0
+
+    devices = {}
+    recipients = {row['recipient_id'] for row in rows}
+    for user_id, token, platform in PushDevice.objects.filter(user_id__in=recipients).values_list(
+        'user_id', 'token', 'platform'
+    ):
+        devices.setdefault(user_id, []).append((token, platform))
+
+    by_platform = {}
+    for row in rows:
+        for token, platform in devices.get(row['recipient_id'], []):
+            by_platform.setdefault(platform, []).append((token, payload(row)))
+
+    # Providers are called outside any transaction, so a slow one holds no locks
+    calls = []
+    for platform, messages in by_platform.items():
+        provider = get_provider(platform)
+        calls += [
+            (provider, messages[i:i + provider.max_batch])
+            for i in range(0, len(messages), provider.max_batch)
+        ]
+    with ThreadPoolExecutor(settings.PUSH_CONCURRENCY) as pool:
+        invalid = set().union(*pool.map(lambda call: _send(*call), calls))
+
+    if invalid:
+        PushDevice.objects.filter(token__in=invalid).delete()
+    pushes = sum(len(messages) for messages in by_platform.values())
+    return len(rows), pushes, len(invalid)
@@ -0,0 +1,89 @@
+"""
+Fast read path for trip lists and notification history.
+
+Each reader mirrors a serializer field for field (TripSerializer,
+NotificationSerializer); see utils/fastread.py. Views use them when
+settings.FAST_READ_SERIALIZERS is on.
+"""
+
+from .models import Trip
+from .serializers import UnreadCountLoader
+from .utils import fastread
+from .utils.fastread import SKIP, ValuesReader
+from .utils.sparse import FULL
+
+_collaborator = fastread.user('user__')
+# User cards when nested, user ids otherwise; render_trips loads either
+_collaborators = fastread.computed(('id',), lambda row, ctx: ctx['collaborators'].get(row['id'], []))
+
+trip_reader = ValuesReader([
+    ('id', fastread.uuid('id')),
+    ('title', fastread.value('title')),
+    ('description', fastread.value('description')),
+    ('owner', fastread.user('owner__')),
+    ('collaborators', _collaborators),
+    ('created_at', fastread.datetime('created_at')),
+    ('updated_at', fastread.datetime('updated_at')),
+    ('is_owner', fastread.computed(('owner_id',), lambda row, ctx: row['owner_id'] == ctx['user_id'])),
+    ('notifications', fastread.computed(('id',), lambda row, ctx: ctx['unread'].load(row['id']))),
+])
+
+notification_reader = ValuesReader([
+    ('id', fastread.value('id')),
+    ('actor', fastread.user('actor__')),
+    ('trip', fastread.value('trip_id')),
+    # NotificationSerializer's trip_title (source='trip.title') is skipped without a trip
+    ('trip_title', fastread.computed(
+        ('trip_id', 'trip__title'),
+        lambda row, ctx: SKIP if row['trip_id'] is None else row['trip__title']
+    )),
+    ('verb', fastread.value('verb')),
+    ('target_type', fastread.value('target_type')),
+    ('is_read', fastread.value('is_read')),
+    ('created_at', fastread.datetime('created_at')),
+])
+
+
+_collapsed_trip_columns = {
+    'owner': fastread.value('owner_id'),
+    'collaborators': _collaborators,
+}
+_sideloaded_trip_keys = {
+    'owner': 'owner_id',
+    'collaborators': 'collaborator_ids',
+}
+
+
+def trip_reader_for(fieldset):
+    return trip_reader.sparse(fieldset, _collapsed_trip_columns, _sideloaded_trip_keys)
+
+
+def render_trips(rows, request, fieldset=FULL):
+    """
+    Render a page of trip rows selected with trip_reader_for(fieldset).fields.
+    Collaborators and unread counts are loaded for the whole page with one
+    query each, and only when the fieldset includes them.
+    """
+    rows = list(rows)
+    ctx = {'user_id': request.user.id}
+
+    if fieldset.includes('collaborators'):
+        trip_ids = [row['id'] for row in rows]
+        collaborators = ctx['collaborators'] = {}
+        memberships = Trip.collaborators.through.objects.filter(trip_id__in=trip_ids).order_by('user_id')
+        if fieldset.nests_user('collaborators'):
+            for row in memberships.values('trip_id', *_collaborator.fields):
+                collaborators.setdefault(row['trip_id'], []).append(_collaborator.extract(row, None))
+        else:
+            for trip_id, user_id in memberships.values_list('trip_id', 'user_id'):
+                collaborators.setdefault(trip_id, []).append(user_id)
+
+    if fieldset.includes('notifications'):
+        unread = ctx['unread'] = UnreadCountLoader.for_context({'request': request})
+        unread.prime([row['id'] for row in rows])
+
+    return trip_reader_for(fieldset).render(rows, ctx)
+
+
+def render_notifications(rows):
+    return notification_reader.render(rows)
@@ -0,0 +1,173 @@
+"""
+Response cache for trip-scoped GETs.
+
+A cached response is keyed by its ETag (see versions.make_etag): path,
+query string, user and the trip/user versions it was rendered at. Write
+paths and the signals in signals.py bump those versions, so a write makes
+every affected entry unreachable without deleting anything; stale entries
+age out through the backend's TIMEOUT and culling.
+
+Actions in shared_actions render the same body for every member of the
+trip; their key leaves the user out and personalize_response() re-applies
+any per-user fields on the way out.
+
+Misses are single-flight: concurrent identical misses in a process wait for
+the first one and share its result, so a broadcast that sends every member
+back for the same chat page runs its queries once. With
+RESPONSE_CACHE_LOCK_DIR set, a file lock does the same across the workers
+on a host (useful with a shared backend: the waiters find the result in it).
+
+The backend is the 'responses' alias in settings.CACHES (per-process LRU,
+file, database or Redis; see RESPONSE_CACHE_BACKEND).
+
+Views opt in with CachedResponseMixin and list the actions to cache in
+cached_actions. Hits, misses and coalesced misses are counted per process
+and reported in the X-Cache response header.
+"""
+import threading
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+from .utils.singleflight import Abandoned, SingleFlight, file_lock
+from .versions import ConditionalGetMixin, make_etag
+
+CACHE_ALIAS = 'responses'
+KEY_PREFIX = 'response:'
+
+_metrics = {'hits': 0, 'misses': 0, 'coalesced': 0, 'stores': 0}
+_metrics_lock = threading.Lock()
+
+flights = SingleFlight(timeout=settings.RESPONSE_CACHE_COALESCE_TIMEOUT)
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _count(name):
+    with _metrics_lock:
+        _metrics[name] += 1
+
+
+def metrics():
+    """Hit/miss counters of this process, with the hit ratio."""
+    with _metrics_lock:
+        snapshot = dict(_metrics)
+    lookups = snapshot['hits'] + snapshot['misses']
+    snapshot['hit_ratio'] = snapshot['hits'] / lookups if lookups else 0.0
+    return snapshot
+
+
+def reset_metrics():
+    with _metrics_lock:
+        for name in _metrics:
+            _metrics[name] = 0
+
+
+def _worker_lock(key):
+    directory = settings.RESPONSE_CACHE_LOCK_DIR
+    if not directory:
+        return nullcontext()
+    return file_lock(directory, key, timeout=settings.RESPONSE_CACHE_COALESCE_TIMEOUT)
+
+
+class Served(Exception):
+    """Short-circuits dispatch with a body from the cache or another request."""
+
+    def __init__(self, data, source):
+        self.data = data
+        self.source = source
+
+
+class Uncacheable(Exception):
+    """The handler produced a non-200 response; return it as is."""
+
+    def __init__(self, response):
+        self.response = response
+
+
+class CachedResponseMixin(ConditionalGetMixin):
+    """
+    Serves cached_actions from the response cache.
+
+    A hit skips the handler entirely: the only queries are the ones
+    get_etag_versions() and personalize_response() make. Only 200
+    responses are stored.
+    """
+    cached_actions = ()
+    shared_actions = ()
+    _cache_key = None
+
+    def shares_response(self):
+        return self.action in self.shared_actions
+
+    def personalize_response(self, data):
+        """Apply per-user fields to a shared body. Must not mutate data."""
+        return data
+
+    def initial(self, request, *args, **kwargs):
+        self._cache_key = None
+        super().initial(request, *args, **kwargs)
+        if not self._etag or not settings.RESPONSE_CACHE_ENABLED:
+            return
+        if getattr(self, 'action', None) not in self.cached_actions:
+            return
+
+        shared = self.shares_response()
+        if shared:
+            self._cache_key = KEY_PREFIX + make_etag(request, *self._etag_versions, per_user=False)
+        else:
+            self._cache_key = KEY_PREFIX + self._etag
+
+        data = get_cache().get(self._cache_key)
+        if data is not None:
+            _count('hits')
+            source = 'HIT'
+        else:
+            _count('misses')
+            try:
+                (data, source), coalesced = flights.do(
+                    self._cache_key, lambda: self._compute(request, *args, **kwargs)
+                )
+            except Abandoned:
+                # Run the handler ourselves
+                return
+            if coalesced:
+                _count('coalesced')
+                source = 'COALESCED'
+        if shared and source != 'MISS':
+            # A body this request rendered itself is already personal
+            data = self.personalize_response(data)
+        raise Served(data, source)
+
+    def _compute(self, request, *args, **kwargs):
+        with _worker_lock(self._cache_key):
+            # Another worker may have stored it while we waited
+            data = get_cache().get(self._cache_key)
+            if data is not None:
+                return data, 'HIT'
+            response = getattr(self, self.action)(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                raise Uncacheable(response)
+            get_cache().set(self._cache_key, response.data)
+            _count('stores')
+            return response.data, 'MISS'
+
+    def handle_exception(self, exc):
+        if isinstance(exc, Served):
+            response = Response(exc.data)
+            response['X-Cache'] = exc.source
+            return response
+        if isinstance(exc, Uncacheable):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self._cache_key and 'X-Cache' not in response:
+            response['X-Cache'] = 'MISS'
+        return response
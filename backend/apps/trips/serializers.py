@@ -4,7 +4,9 @@ Serializers for Trip management.
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.db import transaction, models
-from .models import Trip, ItineraryItem
+from .models import Trip, ItineraryItem, TripChange, TripNotificationState, TripNotificationPreference
+from apps.users import directory
+from . import changelog, invites
 
 User = get_user_model()
 
@@ -21,8 +23,27 @@ class UserBasicSerializer(serializers.ModelSerializer):
 
 
 from apps.users.serializers import UserSerializer
+from utils.loaders import BatchLoader, BatchLoadingMixin, BatchLoadingListSerializer
+from .utils.sparse import SparseFieldsMixin, pk_field
 
-class TripSerializer(serializers.ModelSerializer):
+
+class UnreadCountLoader(BatchLoader):
+    """Total unread notifications for the requesting user, keyed by trip id."""
+    default = 0
+    
+    def fetch(self, trip_ids):
+        if not self.request or not self.request.user.is_authenticated:
+            return {}
+        states = TripNotificationState.objects.filter(
+            user=self.request.user, trip_id__in=trip_ids
+        ).values_list('trip_id', 'unread_chat_count', 'unread_poll_count', 'unread_itinerary_count')
+        return {
+            trip_id: (chat or 0) + (poll or 0) + (itinerary or 0)
+            for trip_id, chat, poll, itinerary in states
+        }
+
+
+class TripSerializer(SparseFieldsMixin, BatchLoadingMixin, serializers.ModelSerializer):
     """
     Serializer for Trip model.
     Handles creation, updates, and list display with nested user info.
@@ -55,6 +76,24 @@ class TripSerializer(serializers.ModelSerializer):
             'notifications'
         ]
         read_only_fields = ['id', 'owner', 'created_at', 'updated_at', 'is_owner', 'notifications']
+        list_serializer_class = BatchLoadingListSerializer
+    
+    batch_relations = ('owner', 'collaborators')
+    collapsed_fields = {
+        'owner': pk_field(),
+        'collaborators': pk_field(many=True),
+    }
+    sideloaded_fields = {
+        'owner': 'owner_id',
+        'collaborators': 'collaborator_ids',
+    }
+    
+    def get_loader_keys(self, obj):
+        if self.includes('notifications') and not self._prefetched_states(obj):
+            yield UnreadCountLoader, obj.id
+    
+    def _prefetched_states(self, obj):
+        return 'notification_states' in getattr(obj, '_prefetched_objects_cache', {})
     
     def create(self, validated_data):
         """
@@ -68,20 +107,28 @@ class TripSerializer(serializers.ModelSerializer):
         if not request or not request.user or not request.user.is_authenticated:
             raise serializers.ValidationError("Authentication required to create a trip.")
         
-        # Create trip with owner
-        trip = Trip.objects.create(
-            owner=request.user,
-            **validated_data
-        )
-        
-        # Add collaborators (excluding owner)
-        if collaborators:
-            # Filter out owner if they're in the collaborators list
-            unique_collaborators = [c for c in collaborators if c != request.user]
-            trip.collaborators.set(unique_collaborators)
+        with transaction.atomic():
+            # Create trip with owner
+            trip = Trip.objects.create(
+                owner=request.user,
+                **validated_data
+            )
+            
+            # Add collaborators (excluding owner)
+            if collaborators:
+                # Filter out owner if they're in the collaborators list
+                unique_collaborators = [c for c in collaborators if c != request.user]
+                trip.collaborators.set(unique_collaborators)
         
         return trip
     
+    def update(self, instance, validated_data):
+        """
+        Update the trip and its collaborators in one transaction.
+        """
+        with transaction.atomic():
+            return super().update(instance, validated_data)
+    
     def validate_collaborator_ids(self, value):
         if len(value) != len(set(value)):
             raise serializers.ValidationError("Duplicate collaborators are not allowed.")
@@ -91,7 +138,7 @@ class TripSerializer(serializers.ModelSerializer):
         try:
             request = self.context.get('request')
             if request and hasattr(request, 'user') and request.user.is_authenticated:
-                return obj.owner == request.user
+                return obj.owner_id == request.user.id
             return False
         except Exception:
             return False
@@ -102,12 +149,11 @@ class TripSerializer(serializers.ModelSerializer):
             if not request or not hasattr(request, 'user') or not request.user.is_authenticated:
                 return 0
             
-            # Use prefetched related if available to avoid N+1
-            if hasattr(obj, '_prefetched_objects_cache') and 'notification_states' in obj._prefetched_objects_cache:
-                 state = next((s for s in obj.notification_states.all() if s.user_id == request.user.id), None)
-            else:
-                 state = obj.notification_states.filter(user=request.user).first()
+            # Use prefetched related if available, otherwise the batched loader
+            if not self._prefetched_states(obj):
+                return self.loader(UnreadCountLoader).load(obj.id)
             
+            state = next((s for s in obj.notification_states.all() if s.user_id == request.user.id), None)
             if state:
                 return (state.unread_chat_count or 0) + \
                        (state.unread_poll_count or 0) + \
@@ -132,7 +178,7 @@ class AddCollaboratorSerializer(serializers.Serializer):
         username = data.get('username')
         
         try:
-            user = User.objects.get(username=username)
+            user = directory.users_by_username(username).get()
         except User.DoesNotExist:
             raise serializers.ValidationError({"username": "User does not exist."})
         
@@ -183,7 +229,7 @@ class RemoveCollaboratorSerializer(serializers.Serializer):
         return data
 
 
-class ItineraryItemSerializer(serializers.ModelSerializer):
+class ItineraryItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for ItineraryItem model.
     
@@ -222,13 +268,14 @@ class ItineraryItemSerializer(serializers.ModelSerializer):
         # Get next order value
         next_order = ItineraryItem.get_next_order(trip)
         
-        # Create item
-        item = ItineraryItem.objects.create(
-            trip=trip,
-            order=next_order,
-            created_by=request.user, # Assign creator
-            **validated_data
-        )
+        # Create item (change feed entry is written in the same transaction)
+        with transaction.atomic():
+            item = ItineraryItem.objects.create(
+                trip=trip,
+                order=next_order,
+                created_by=request.user, # Assign creator
+                **validated_data
+            )
         
         return item
 
@@ -318,19 +365,64 @@ class ReorderItinerarySerializer(serializers.Serializer):
                     id=item_id,
                     trip=trip
                 ).update(order=index)
+            
+            # Bulk updates bypass signals, so feed the change log directly
+            items = list(ItineraryItem.objects.filter(trip=trip).order_by('order'))
+            changelog.record_changes(trip.id, [
+                ('itinerary', item.id, TripChange.OP_UPSERT, changelog.itinerary_payload(item))
+                for item in items
+            ])
         
         # Return updated items in new order
-        return ItineraryItem.objects.filter(trip=trip).order_by('order')
+        return items
 
 
 from .models import Trip, TripInvite, ItineraryItem, Notification
 from apps.users.serializers import UserSerializer
 
 
+class MutationSerializer(serializers.Serializer):
+    """
+    A single queued offline operation.
+    """
+    TYPE_CHOICES = [
+        'itinerary.create',
+        'itinerary.update',
+        'itinerary.delete',
+        'itinerary.reorder',
+        'chat.send',
+        'poll.create',
+        'poll.vote',
+    ]
+    
+    client_id = serializers.CharField(max_length=64, help_text="Client-generated idempotency id")
+    type = serializers.ChoiceField(choices=TYPE_CHOICES)
+    data = serializers.DictField(required=False, default=dict)
+
+
+class MutationBatchSerializer(serializers.Serializer):
+    """
+    Ordered list of operations for the mutation batch endpoint.
+    """
+    MAX_OPERATIONS = 200
+    
+    operations = MutationSerializer(many=True)
+    
+    def validate_operations(self, value):
+        if not value:
+            raise serializers.ValidationError("At least one operation is required.")
+        if len(value) > self.MAX_OPERATIONS:
+            raise serializers.ValidationError(f"At most {self.MAX_OPERATIONS} operations per batch.")
+        client_ids = [op['client_id'] for op in value]
+        if len(client_ids) != len(set(client_ids)):
+            raise serializers.ValidationError("Duplicate client_id values are not allowed.")
+        return value
 
 
 
-class NotificationSerializer(serializers.ModelSerializer):
+
+
+class NotificationSerializer(BatchLoadingMixin, serializers.ModelSerializer):
     actor = UserSerializer(read_only=True)
     trip_title = serializers.CharField(source='trip.title', read_only=True)
     
@@ -338,10 +430,32 @@ class NotificationSerializer(serializers.ModelSerializer):
         model = Notification
         fields = ['id', 'actor', 'trip', 'trip_title', 'verb', 'target_type', 'is_read', 'created_at']
         read_only_fields = ['id', 'actor', 'trip', 'verb', 'target_type', 'created_at']
+        list_serializer_class = BatchLoadingListSerializer
+    
+    batch_relations = ('actor', 'trip')
+
+
+class NotificationPreferenceSerializer(serializers.Serializer):
+    """
+    Levels for PUT /api/trips/{id}/notification-preferences/. Types left
+    out keep their level.
+    """
+    chat = serializers.ChoiceField(choices=TripNotificationPreference.LEVEL_CHOICES, required=False)
+    poll = serializers.ChoiceField(choices=TripNotificationPreference.LEVEL_CHOICES, required=False)
+    itinerary = serializers.ChoiceField(choices=TripNotificationPreference.LEVEL_CHOICES, required=False)
 
 
 from .utils.exceptions import Conflict
 
+class BulkInviteSerializer(serializers.Serializer):
+    """Usernames and emails for POST /api/trips/{id}/invite/bulk/ (invites.py)."""
+    identifiers = serializers.ListField(
+        child=serializers.CharField(allow_blank=True, max_length=254),
+        min_length=1,
+        max_length=invites.MAX_IDENTIFIERS,
+    )
+
+
 class TripInviteSerializer(serializers.ModelSerializer):
     """
     Unified Serializer for TripInvite.
@@ -394,13 +508,13 @@ class TripInviteSerializer(serializers.ModelSerializer):
         # 2. Resolve User
         if username:
             try:
-                invited_user = User.objects.get(username__iexact=username)
+                invited_user = directory.users_by_username(username).get()
             except User.DoesNotExist:
                 raise serializers.ValidationError({"identifier": "User not found."}) # 404-like error
         
         if email:
             try:
-                invited_user = User.objects.get(email__iexact=email)
+                invited_user = directory.users_by_email(email).get()
             except (User.DoesNotExist, User.MultipleObjectsReturned):
                 pass
                 
@@ -410,7 +524,8 @@ class TripInviteSerializer(serializers.ModelSerializer):
             if trip.collaborators.filter(id=invited_user.id).exists() or trip.owner == invited_user:
                 raise serializers.ValidationError({"identifier": "User is already a member."})
         elif email:
-             if trip.collaborators.filter(email__iexact=email).exists() or trip.owner.email == email:
+             if (trip.collaborators.filter(directory_entry__email=directory.normalize(email)).exists()
+                     or directory.normalize(trip.owner.email) == directory.normalize(email)):
                 raise serializers.ValidationError({"identifier": "User is already a member."})
 
         # B. Already Invited (Pending)
@@ -418,7 +533,7 @@ class TripInviteSerializer(serializers.ModelSerializer):
             if TripInvite.objects.filter(trip=trip, invited_user=invited_user, status='PENDING').exists():
                 raise serializers.ValidationError({"identifier": "User already invited."})
         if email:
-            if TripInvite.objects.filter(trip=trip, invited_email__iexact=email, status='PENDING').exists():
+            if TripInvite.objects.filter(trip=trip, invited_email=directory.normalize(email), status='PENDING').exists():
                  raise serializers.ValidationError({"identifier": "User already invited."})
 
         # 4. Prepare Output Data
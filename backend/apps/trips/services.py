@@ -1,11 +1,85 @@
-from django.db.models import F
-from .models import TripNotificationState, Notification
+import threading
+from contextlib import contextmanager
+from django.contrib.auth import get_user_model
+from django.db.models import F, FilteredRelation, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Trip, TripNotificationState, TripNotificationPreference, Notification
+from . import versions
+
+User = get_user_model()
+
+_coalescing = threading.local()
+
+# Types whose fan-out only bumps the unread counts
+COUNTER_ONLY_TYPES = {'chat'}
+
+
+@contextmanager
+def coalesce_notifications():
+    """
+    Defer notification fan-out until the block exits.
+
+    Calls to increment_notification_count inside the block are collapsed to
+    one per (trip, sender, type) and flushed on successful exit. Used by the
+    mutation batch endpoint so replaying 20 queued edits notifies once.
+    """
+    if getattr(_coalescing, 'pending', None) is not None:
+        # Already inside an outer block, which will flush.
+        yield
+        return
+
+    _coalescing.pending = {}
+    try:
+        yield
+        pending = _coalescing.pending
+    finally:
+        _coalescing.pending = None
+
+    for trip, sender, type in pending.values():
+        increment_notification_count(trip, sender, type)
+
+
+def notifications_coalesced():
+    """True while inside a coalesce_notifications() block."""
+    return getattr(_coalescing, 'pending', None) is not None
+
+
+def trip_members(trip):
+    """The owner and collaborators of trip, as a User queryset."""
+    collaborators = Trip.collaborators.through.objects.filter(trip=trip).values('user_id')
+    return User.objects.filter(Q(pk=trip.owner_id) | Q(pk__in=collaborators))
+
+
+def notification_levels(users, trip, type):
+    """
+    users (a User queryset) annotated with their notify_level for type in
+    trip, muted users left out. The preference is a left join on the same
+    query, so muted users are never loaded, let alone written for.
+    """
+    preferences = 'trip_notification_preferences'
+    return users.annotate(
+        preference=FilteredRelation(preferences, condition=Q(
+            **{f'{preferences}__trip': trip, f'{preferences}__target_type': type}
+        )),
+    ).annotate(
+        notify_level=Coalesce('preference__level', Value(TripNotificationPreference.ALL)),
+    ).exclude(notify_level=TripNotificationPreference.MUTED)
+
 
 def increment_notification_count(trip, sender, type):
     """
-    Increment notification count for all trip members except the sender.
+    Increment notification count for all trip members except the sender,
+    and notify those who want every update (see TripNotificationPreference).
+    Chat only counts: its notifications go to the members a message
+    mentions (signals.create_chat_notification).
     type: 'chat', 'poll', 'itinerary'
     """
+    pending = getattr(_coalescing, 'pending', None)
+    if pending is not None:
+        pending[(trip.pk, sender.pk, type)] = (trip, sender, type)
+        return
+
     field_map = {
         'chat': 'unread_chat_count',
         'poll': 'unread_poll_count',
@@ -16,42 +90,40 @@ def increment_notification_count(trip, sender, type):
     if not field:
         return
 
-    # Get all members (owner + collaborators)
-    members = set(trip.collaborators.all())
-    members.add(trip.owner)
-    
-    # Exclude sender
-    if sender in members:
-        members.remove(sender)
-        
-    for member in members:
-        # Get or create state
-        state, _ = TripNotificationState.objects.get_or_create(user=member, trip=trip)
-        setattr(state, field, getattr(state, field) + 1)
-        state.save()
-        
-    # Create persistent notifications for all members (except sender)
-    # Using bulk_create for efficiency if list gets large, but loop is fine for MVP group sizes
-    notifications_to_create = []
-    
+    # Members (owner + collaborators) except the sender, with their level
+    members = trip_members(trip).exclude(pk=sender.pk)
+    levels = dict(notification_levels(members, trip, type).values_list('pk', 'notify_level'))
+    if not levels:
+        return
+
+    # Bump the counters in two statements whatever the trip size
+    TripNotificationState.objects.bulk_create(
+        [TripNotificationState(user_id=user_id, trip=trip) for user_id in levels],
+        ignore_conflicts=True,
+    )
+    TripNotificationState.objects.filter(trip=trip, user_id__in=levels).update(
+        **{field: F(field) + 1, 'updated_at': timezone.now()}
+    )
+
     # Define verb based on type
     verb_map = {
-        'chat': 'sent a new message',
         'poll': 'created a new poll',
         'itinerary': 'updated the itinerary'
     }
     verb = verb_map.get(type, 'made an update')
     
-    for member in members:
-        notifications_to_create.append(
-            Notification(
-                recipient=member,
-                actor=sender,
-                trip=trip,
-                verb=verb,
-                target_type=type
-            )
+    notifications_to_create = [
+        Notification(
+            recipient_id=user_id,
+            actor=sender,
+            trip=trip,
+            verb=verb,
+            target_type=type
         )
+        for user_id, level in levels.items()
+        if level == TripNotificationPreference.ALL and type not in COUNTER_ONLY_TYPES
+    ]
     
     if notifications_to_create:
         Notification.objects.bulk_create(notifications_to_create)
+    versions.bump_users(levels)
@@ -1,11 +1,15 @@
 """
 Signals for automatic notification creation.
 """
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
 from django.dispatch import receiver
-from .models import TripInvite, ItineraryItem, Notification
+from django.contrib.auth import get_user_model
+from .models import Trip, TripInvite, ItineraryItem, Notification, TripNotificationPreference
+from . import changelog, versions
+from .services import notification_levels, notifications_coalesced, trip_members
 from apps.chat.models import ChatMessage
-from apps.polls.models import Poll
+from apps.users import directory
+from apps.polls.models import Poll, Vote
 
 
 @receiver(post_save, sender=TripInvite)
@@ -25,33 +29,38 @@ def create_invite_notification(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=ChatMessage)
 def create_chat_notification(sender, instance, created, **kwargs):
-    """Create notifications for all trip collaborators when a message is sent."""
-    if created:
+    """Notify the members a message mentions, or all of them on @all."""
+    # Mentions are not coalesced: each one is addressed to someone
+    if created and (instance.mentions or instance.mentions_all):
         trip = instance.trip
-        # Notify all collaborators except the sender
-        collaborators = trip.collaborators.exclude(id=instance.user.id)
+        recipients = trip_members(trip).exclude(id=instance.sender_id)
+        if not instance.mentions_all:
+            recipients = recipients.filter(id__in=instance.mentions)
         
         notifications = [
             Notification(
-                recipient=collaborator,
-                actor=instance.user,
+                recipient_id=user_id,
+                actor_id=instance.sender_id,
                 trip=trip,
-                verb=f"sent a message in {trip.title}",
+                verb=f"mentioned you in {trip.title}",
                 target_type='chat',
             )
-            for collaborator in collaborators
+            for user_id in notification_levels(recipients, trip, 'chat').values_list('id', flat=True)
         ]
         
         Notification.objects.bulk_create(notifications)
+        versions.bump_users(n.recipient_id for n in notifications)
 
 
 @receiver(post_save, sender=Poll)
 def create_poll_notification(sender, instance, created, **kwargs):
     """Create notifications when a poll is created."""
-    if created:
+    if created and not notifications_coalesced():
         trip = instance.trip
-        # Notify all collaborators except the creator
-        collaborators = trip.collaborators.exclude(id=instance.created_by.id)
+        # Notify collaborators except the creator, unless they opted out
+        collaborators = notification_levels(
+            trip.collaborators.exclude(id=instance.created_by.id), trip, 'poll'
+        ).filter(notify_level=TripNotificationPreference.ALL)
         
         notifications = [
             Notification(
@@ -65,15 +74,18 @@ def create_poll_notification(sender, instance, created, **kwargs):
         ]
         
         Notification.objects.bulk_create(notifications)
+        versions.bump_users(n.recipient_id for n in notifications)
 
 
 @receiver(post_save, sender=ItineraryItem)
 def create_itinerary_notification(sender, instance, created, **kwargs):
     """Create notifications when an itinerary item is added."""
-    if created:
+    if created and not notifications_coalesced():
         trip = instance.trip
-        # Notify all collaborators except the creator
-        collaborators = trip.collaborators.exclude(id=instance.created_by.id)
+        # Notify collaborators except the creator, unless they opted out
+        collaborators = notification_levels(
+            trip.collaborators.exclude(id=instance.created_by.id), trip, 'itinerary'
+        ).filter(notify_level=TripNotificationPreference.ALL)
         
         notifications = [
             Notification(
@@ -87,3 +99,111 @@ def create_itinerary_notification(sender, instance, created, **kwargs):
         ]
         
         Notification.objects.bulk_create(notifications)
+        versions.bump_users(n.recipient_id for n in notifications)
+
+
+# --- Versions ---------------------------------------------------------------
+# Trip-scoped writes bump versions through the change feed below. These cover
+# what the user-scoped reads (trip list, notifications) render besides.
+
+@receiver(post_save, sender=Notification)
+def bump_recipient_version(sender, instance, created, **kwargs):
+    versions.bump_users([instance.recipient_id])
+
+
+@receiver(post_save, sender=TripInvite)
+def bump_invitee_version(sender, instance, **kwargs):
+    # Pending invites are counted by email
+    invitees = set()
+    if instance.invited_email:
+        invitees.update(directory.users_by_email(instance.invited_email).values_list('id', flat=True))
+    if instance.invited_user_id:
+        invitees.add(instance.invited_user_id)
+    versions.bump_users(invitees)
+
+
+@receiver(pre_delete, sender=Trip)
+def bump_members_on_trip_delete(sender, instance, **kwargs):
+    versions.bump_trip_members([instance.id])
+
+
+# --- Change feed ------------------------------------------------------------
+# Tombstones are only recorded for direct deletes. Cascades (a trip or user
+# being deleted) are skipped: the parent row and its log go away together.
+
+def _is_direct_delete(instance, origin):
+    if origin is instance:
+        return True
+    return getattr(origin, 'model', None) is type(instance)
+
+
+@receiver(post_save, sender=Trip)
+def record_trip_change(sender, instance, **kwargs):
+    changelog.record_change(instance.id, 'trip', instance.id, data=changelog.trip_payload(instance))
+
+
+@receiver(m2m_changed, sender=Trip.collaborators.through)
+def record_membership_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+
+    User = get_user_model()
+    if reverse:
+        # user.collaborated_trips.add(trip): instance is the user
+        if action == 'pre_clear':
+            pk_set = set(instance.collaborated_trips.values_list('id', flat=True))
+        pairs = [(trip_id, instance) for trip_id in pk_set]
+    else:
+        if action == 'pre_clear':
+            users = list(instance.collaborators.all())
+        else:
+            users = list(User.objects.filter(pk__in=pk_set))
+        pairs = [(instance.id, user) for user in users]
+
+    for trip_id, user in pairs:
+        if action == 'post_add':
+            changelog.record_change(trip_id, 'member', user.id, data=changelog.member_payload(user))
+        else:
+            changelog.record_delete(trip_id, 'member', user.id)
+
+
+@receiver(post_save, sender=ItineraryItem)
+def record_itinerary_change(sender, instance, **kwargs):
+    changelog.record_change(instance.trip_id, 'itinerary', instance.id, data=changelog.itinerary_payload(instance))
+
+
+@receiver(post_delete, sender=ItineraryItem)
+def record_itinerary_delete(sender, instance, origin=None, **kwargs):
+    if _is_direct_delete(instance, origin):
+        changelog.record_delete(instance.trip_id, 'itinerary', instance.id)
+
+
+@receiver(post_save, sender=ChatMessage)
+def record_chat_change(sender, instance, **kwargs):
+    changelog.record_change(instance.trip_id, 'chat', instance.id, data=changelog.chat_payload(instance))
+
+
+@receiver(post_delete, sender=ChatMessage)
+def record_chat_delete(sender, instance, origin=None, **kwargs):
+    if _is_direct_delete(instance, origin):
+        changelog.record_delete(instance.trip_id, 'chat', instance.id)
+
+
+@receiver(post_save, sender=Poll)
+def record_poll_change(sender, instance, created, **kwargs):
+    # New polls are recorded by PollSerializer once their options exist.
+    if not created:
+        changelog.record_change(instance.trip_id, 'poll', instance.id, data=changelog.poll_payload(instance))
+
+
+@receiver(post_delete, sender=Poll)
+def record_poll_delete(sender, instance, origin=None, **kwargs):
+    if _is_direct_delete(instance, origin):
+        changelog.record_delete(instance.trip_id, 'poll', instance.id)
+
+
+@receiver(post_save, sender=Vote)
+def record_vote_change(sender, instance, **kwargs):
+    # Votes surface as a poll upsert carrying the new option counts.
+    poll = instance.poll
+    changelog.record_change(poll.trip_id, 'poll', poll.id, data=changelog.poll_payload(poll))
@@ -0,0 +1,72 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework import status
+from apps.trips.models import Trip, ItineraryItem
+from apps.chat.models import ChatMessage
+from apps.polls.models import Poll, PollOption
+
+User = get_user_model()
+
+
+class TripAccessQueryTests(TestCase):
+    """
+    Membership is resolved once per request and shared by permission
+    classes and get_trip(), so read endpoints have a small fixed cost.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.owner = User.objects.create_user(username='owner', password='password')
+        self.member = User.objects.create_user(username='member', password='password')
+        self.outsider = User.objects.create_user(username='outsider', password='password')
+        self.trip = Trip.objects.create(owner=self.owner, title="Test Trip")
+        self.trip.collaborators.add(self.member)
+
+        for i in range(3):
+            ItineraryItem.objects.create(trip=self.trip, title=f'Item {i}', order=i + 1, created_by=self.owner)
+            ChatMessage.objects.create(trip=self.trip, sender=self.member, message=f'Hi {i}')
+            poll = Poll.objects.create(trip=self.trip, question=f'Q{i}', created_by=self.owner)
+            PollOption.objects.create(poll=poll, text='A')
+            PollOption.objects.create(poll=poll, text='B')
+
+        # Collaborators exercise the non-owner path
+        self.client.force_authenticate(user=self.member)
+
+    def test_chat_list_queries(self):
+        # trip + membership, page count, page
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/chat/trips/{self.trip.id}/chat/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_itinerary_list_queries(self):
+        # trip + membership, items
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/trips/{self.trip.id}/itinerary/')
+        self.assertEqual(len(response.data), 3)
+
+    def test_poll_list_queries(self):
+        # trip + membership, polls, options with counts, user's votes
+        with self.assertNumQueries(4):
+            response = self.client.get(f'/api/polls/trips/{self.trip.id}/polls/')
+        self.assertEqual(len(response.data), 3)
+
+    def test_trip_retrieve_queries(self):
+        # trip + versions (ETag), trip + owner profile, collaborators + profiles,
+        # notification states; the permission check reuses the collaborators prefetch
+        with self.assertNumQueries(4):
+            response = self.client.get(f'/api/trips/{self.trip.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_outsider_denied(self):
+        self.client.force_authenticate(user=self.outsider)
+        self.assertEqual(self.client.get(f'/api/chat/trips/{self.trip.id}/chat/').status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get(f'/api/trips/{self.trip.id}/itinerary/').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(f'/api/polls/trips/{self.trip.id}/polls/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_item_delete_permission(self):
+        """Test non-creator collaborators still cannot delete others' items."""
+        item = ItineraryItem.objects.first()
+        response = self.client.delete(f'/api/trips/{self.trip.id}/itinerary/{item.id}/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,97 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
+from middleware import throttling
+from apps.users.write_behind import writes
+from apps.users.authentication import PrincipalRefreshToken, StatelessJWTAuthentication, TokenPrincipal
+from apps.trips.models import Trip
+from apps.chat.models import ChatMessage
+
+User = get_user_model()
+
+
+class StatelessPrincipalTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        throttling.get_store().clear()
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='password')
+        self.trip = Trip.objects.create(owner=self.user, title='Paris')
+        self.token = str(PrincipalRefreshToken.for_user(self.user).access_token)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def tearDown(self):
+        writes.clear()
+
+    def authenticate(self, token=None):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token or self.token}')
+        return StatelessJWTAuthentication().authenticate(request)[0]
+
+    def test_principal_needs_no_query(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            principal = self.authenticate()
+            self.assertIsInstance(principal, TokenPrincipal)
+            self.assertIsInstance(principal, User)
+            self.assertEqual((principal.pk, principal.username), (self.user.pk, 'owner'))
+            self.assertEqual(principal.date_joined, self.user.date_joined)
+            self.assertTrue(principal.is_authenticated)
+            self.assertEqual(principal, self.user)
+            self.assertEqual(self.user, principal)
+
+        # The ORM uses the id without loading the row
+        with self.assertNumQueries(1):
+            self.assertEqual(list(Trip.objects.filter(owner=principal)), [self.trip])
+
+        with self.assertNumQueries(1):
+            self.assertEqual(principal.email, 'owner@example.com')
+            self.assertEqual(principal.first_name, '')
+
+    def test_requests_with_token(self):
+        response = self.client.post(f'/api/chat/trips/{self.trip.id}/chat/', {'message': 'Hi'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(ChatMessage.objects.get().sender, self.user)
+        self.assertEqual(self.client.get('/api/trips/').status_code, status.HTTP_200_OK)
+
+    def test_login_and_token_endpoints_issue_principal_tokens(self):
+        client = APIClient()
+        for url, data in [
+            ('/api/auth/login/', {'identifier': 'owner', 'password': 'password'}),
+            ('/api/auth/token/', {'username': 'owner', 'password': 'password'}),
+        ]:
+            with self.subTest(url=url):
+                access = client.post(url, data, format='json').json()['access']
+                self.assertIsInstance(self.authenticate(access), TokenPrincipal)
+
+    def test_saves_the_user_query_per_request(self):
+        counts = []
+        for token in (RefreshToken.for_user(self.user).access_token, self.token):
+            self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+            self.client.get(f'/api/trips/{self.trip.id}/itinerary/')
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(f'/api/trips/{self.trip.id}/itinerary/').status_code, status.HTTP_200_OK)
+            counts.append(len(queries))
+        self.assertEqual(counts[1], counts[0] - 1)
+
+    def test_deactivation_and_password_change_revoke_tokens(self):
+        self.assertEqual(self.client.get('/api/trips/').status_code, status.HTTP_200_OK)
+        self.user.set_password('changed')
+        self.user.save()
+        self.assertEqual(self.client.get('/api/trips/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {PrincipalRefreshToken.for_user(self.user).access_token}')
+        self.assertEqual(self.client.get('/api/trips/').status_code, status.HTTP_200_OK)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/trips/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_tokens_without_claims_load_the_user(self):
+        token = str(RefreshToken.for_user(self.user).access_token)
+        user = self.authenticate(token)
+        self.assertNotIsInstance(user, TokenPrincipal)
+        self.assertEqual(user, self.user)
@@ -0,0 +1,116 @@
+import json
+from unittest import mock
+
+from django.http import JsonResponse
+from django.test import TestCase
+from django.urls import ResolverMatch, resolve
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework import status
+from apps.trips.models import Trip, ItineraryItem
+
+User = get_user_model()
+
+
+class BatchEndpointTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', password='password')
+        self.trip = Trip.objects.create(owner=self.owner, title="Test Trip")
+        ItineraryItem.objects.create(trip=self.trip, title='Museum', order=1, created_by=self.owner)
+        self.client.force_authenticate(user=self.owner)
+
+    def post(self, requests, **extra):
+        response = self.client.post('/api/batch/', {'requests': requests}, format='json', **extra)
+        return response, json.loads(response.content) if response.status_code == 200 else None
+
+    def with_views(self, **views):
+        """Route /api/<name>/ to the given view functions during the test."""
+        def fake_resolve(path):
+            view = views.get(path.strip('/').split('/')[-1])
+            return ResolverMatch(view, (), {}) if view else resolve(path)
+
+        patcher = mock.patch('config.batch.resolve', fake_resolve)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_multiplexed_gets(self):
+        """Test several GETs are answered in one envelope, in order."""
+        response, body = self.post([
+            {'id': 'trips', 'path': '/api/trips/'},
+            {'id': 'notifications', 'path': '/api/trips/notifications/'},
+            {'id': 'me', 'path': '/api/users/profile/me/'},
+            {'id': 'itinerary', 'path': f'/api/trips/{self.trip.id}/itinerary/'},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        responses = body['responses']
+        self.assertEqual([r['id'] for r in responses], ['trips', 'notifications', 'me', 'itinerary'])
+        self.assertTrue(all(r['status'] == 200 for r in responses))
+        self.assertEqual(responses[0]['body']['results'][0]['title'], 'Test Trip')
+        self.assertEqual(responses[2]['body']['username'], 'owner')
+        self.assertEqual(responses[3]['body'][0]['title'], 'Museum')
+
+    def test_query_string_forwarded(self):
+        """Test the sub-request query string reaches the view (page 2 does not exist)."""
+        response, body = self.post([{'id': 'p2', 'path': '/api/trips/?page=2'}])
+        self.assertEqual(body['responses'][0]['status'], status.HTTP_404_NOT_FOUND)
+
+    def test_unknown_path(self):
+        response, body = self.post([{'id': 'x', 'path': '/api/does-not-exist/'}])
+        self.assertEqual(body['responses'][0]['status'], status.HTTP_404_NOT_FOUND)
+
+    def test_rejects_non_api_and_recursive_paths(self):
+        response, _ = self.post([{'id': 'x', 'path': '/admin/'}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response, _ = self.post([{'id': 'x', 'path': '/api/batch/'}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(user=None)
+        response, _ = self.post([{'id': 'trips', 'path': '/api/trips/'}])
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_failing_view_fails_its_item_only(self):
+        def broken(request):
+            raise RuntimeError('boom')
+
+        self.with_views(broken=broken)
+        with self.assertLogs('config.batch', 'ERROR'):
+            response, body = self.post([
+                {'id': 'broken', 'path': '/api/broken/'},
+                {'id': 'trips', 'path': '/api/trips/'},
+            ])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['status'] for r in body['responses']], [500, 200])
+        self.assertTrue(body['responses'][0]['body']['error'])
+
+    def test_async_view(self):
+        async def hello(request):
+            return JsonResponse({'hello': request.user.username})
+
+        self.with_views(hello=hello)
+        response, body = self.post([{'id': 'hello', 'path': '/api/hello/'}])
+        self.assertEqual(body['responses'][0], {'id': 'hello', 'status': 200, 'headers': {}, 'body': {'hello': 'owner'}})
+
+    def test_envelope_headers_are_not_inherited(self):
+        seen = {}
+
+        def echo(request):
+            seen.update(request.META)
+            seen['headers'] = dict(request.headers)
+            return JsonResponse({})
+
+        self.with_views(echo=echo)
+        self.post(
+            [{'id': 'echo', 'path': '/api/echo/'}],
+            HTTP_IF_NONE_MATCH='"abc"', HTTP_IDEMPOTENCY_KEY='key-1', HTTP_ACCEPT_LANGUAGE='pt',
+        )
+        for key in ('HTTP_IF_NONE_MATCH', 'HTTP_IDEMPOTENCY_KEY', 'CONTENT_TYPE', 'CONTENT_LENGTH'):
+            self.assertNotIn(key, seen)
+        self.assertNotIn('If-None-Match', seen['headers'])
+        self.assertEqual((seen['HTTP_ACCEPT_LANGUAGE'], seen['REQUEST_METHOD']), ('pt', 'GET'))
+
+    def test_matching_etag_of_the_envelope_is_ignored(self):
+        etag = self.client.get('/api/trips/')['ETag']
+        _, body = self.post([{'id': 'trips', 'path': '/api/trips/'}], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(body['responses'][0]['status'], status.HTTP_200_OK)
@@ -0,0 +1,118 @@
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from apps.users import cards
+from apps.users.serializers import UserSerializer
+from apps.trips.models import Trip
+
+User = get_user_model()
+
+
+class UserCardTests(TestCase):
+    def setUp(self):
+        cards.get_cache().clear()
+        self.client = APIClient()
+        self.owner = User.objects.create_user(username='owner', password='password', first_name='Olga')
+        self.member = User.objects.create_user(username='member', password='password')
+        self.member.profile.avatar_color = 'green'
+        self.member.profile.save()
+        self.trip = Trip.objects.create(owner=self.owner, title='Paris')
+        self.trip.collaborators.add(self.member)
+        self.client.force_authenticate(user=self.owner)
+
+    def test_warm_cards_need_no_queries(self):
+        with self.assertNumQueries(1):
+            found = cards.get_many([self.owner.id, self.member.id, 0])
+        self.assertEqual(set(found), {self.owner.id, self.member.id})
+        self.assertEqual(found[self.owner.id]['first_name'], 'Olga')
+        self.assertEqual(found[self.member.id]['avatar'], {'style': 'circle', 'color': 'green', 'icon': 'person'})
+
+        with self.assertNumQueries(0):
+            cards.get_many([self.owner.id, self.member.id])
+        # The users only; avatars come from the cards
+        with self.assertNumQueries(1):
+            data = UserSerializer(self.trip.collaborators.all(), many=True).data
+        self.assertEqual(data, [found[self.member.id]])
+
+    def test_sideloaded_users(self):
+        with override_settings(RESPONSE_CACHE_ENABLED=False):
+            self.client.get('/api/trips/?sideload=users')
+            # version, count, page, collaborator ids, unread counts; no users
+            with self.assertNumQueries(5):
+                response = self.client.get('/api/trips/?sideload=users')
+        self.assertEqual(set(response.data['users']), {self.owner.id, self.member.id})
+
+    def test_saves_drop_the_card(self):
+        cards.get(self.member.id)
+        self.member.profile.avatar_icon = 'plane'
+        self.member.profile.save()
+        self.assertEqual(cards.get(self.member.id)['avatar']['icon'], 'plane')
+
+        self.member.first_name = 'Mia'
+        self.member.save()
+        self.assertEqual(cards.get(self.member.id)['first_name'], 'Mia')
+
+        # Saves of other columns keep it, and no longer write the profile
+        with self.assertNumQueries(1):
+            self.member.save(update_fields=['last_login'])
+        with self.assertNumQueries(0):
+            cards.get(self.member.id)
+
+        self.member.delete()
+        self.assertIsNone(cards.get(self.member.id))
+
+    def test_saves_reach_other_workers(self):
+        """A card dropped by one worker is dropped for the others too."""
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+
+        def cached_elsewhere():
+            # Threads open their own cache connections, as other processes do
+            keys = [cards._key(self.member.id), cards._generation_key(self.member.id)]
+            found = []
+            thread = threading.Thread(target=lambda: found.append(cards.get_cache().get_many(keys)))
+            thread.start()
+            thread.join()
+            entry, generation = found[0].get(keys[0]), found[0].get(keys[1])
+            # The card it would serve without loading the row
+            return entry[1] if entry and entry[0] == generation else None
+
+        shared = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+        with override_settings(CACHES={**settings.CACHES, 'cards': shared}):
+            cards.get(self.member.id)
+            self.assertEqual(cached_elsewhere()['first_name'], '')
+            self.member.first_name = 'Mia'
+            self.member.save(update_fields=['first_name'])
+            # The other worker misses and reloads rather than render the old name
+            self.assertIsNone(cached_elsewhere())
+
+    def test_read_racing_a_save_is_not_cached(self):
+        """A card loaded from the row as it was before a save is not served after it."""
+        from_row = cards._from_row
+
+        def save_meanwhile(row):
+            # The row was read; another request saves before the card is cached
+            if row['id'] == self.member.id and self.member.first_name != 'Mia':
+                self.member.first_name = 'Mia'
+                self.member.save(update_fields=['first_name'])
+            return from_row(row)
+
+        with mock.patch.object(cards, '_from_row', save_meanwhile):
+            self.assertEqual(cards.get(self.member.id)['first_name'], '')
+        self.assertEqual(cards.get(self.member.id)['first_name'], 'Mia')
+        with self.assertNumQueries(0):
+            self.assertEqual(cards.get(self.member.id)['first_name'], 'Mia')
+
+    def test_profile_me_is_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/users/profile/me/')
+        self.assertEqual(response.data['first_name'], 'Olga')
+
+        self.owner.profile.delete()
+        self.assertEqual(self.client.get('/api/users/profile/me/').status_code, 200)
@@ -0,0 +1,112 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+from apps.trips.models import Trip, ItineraryItem, TripChange, TripChangeState
+from apps.trips.changelog import compact_changes
+
+User = get_user_model()
+
+
+class TripChangeFeedTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', password='password')
+        self.member = User.objects.create_user(username='member', email='member@example.com', password='password')
+        self.outsider = User.objects.create_user(username='outsider', password='password')
+
+        self.trip = Trip.objects.create(owner=self.owner, title="Test Trip")
+        self.trip.collaborators.add(self.member)
+        self.client.force_authenticate(user=self.owner)
+        self.url = f'/api/trips/{self.trip.id}/changes/'
+
+    def test_full_feed_from_zero(self):
+        """Test trip creation and membership are in the feed."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        resources = [(c['resource'], c['op']) for c in response.data['changes']]
+        self.assertIn(('trip', 'upsert'), resources)
+        self.assertIn(('member', 'upsert'), resources)
+        self.assertFalse(response.data['reset'])
+
+    def test_delta_since_cursor(self):
+        """Test only changes after the cursor are returned."""
+        cursor = self.client.get(self.url).data['cursor']
+
+        response = self.client.post(f'/api/trips/{self.trip.id}/itinerary/', {'title': 'Museum'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        item_id = response.data['id']
+
+        response = self.client.get(self.url, {'since': cursor})
+        self.assertEqual(len(response.data['changes']), 1)
+        change = response.data['changes'][0]
+        self.assertEqual(change['resource'], 'itinerary')
+        self.assertEqual(change['id'], str(item_id))
+        self.assertEqual(change['data']['title'], 'Museum')
+        self.assertGreater(response.data['cursor'], cursor)
+
+    def test_delete_produces_tombstone(self):
+        """Test deleting an item yields a compact tombstone after its upsert collapses."""
+        cursor = self.client.get(self.url).data['cursor']
+        item = ItineraryItem.objects.create(trip=self.trip, title='Beach', order=1, created_by=self.owner)
+        self.client.delete(f'/api/trips/{self.trip.id}/itinerary/{item.id}/')
+
+        changes = self.client.get(self.url, {'since': cursor}).data['changes']
+        self.assertEqual(len(changes), 1)
+        self.assertEqual(changes[0]['op'], 'delete')
+        self.assertNotIn('data', changes[0])
+
+    def test_reorder_recorded(self):
+        """Test reorder (bulk update) still feeds the log."""
+        a = ItineraryItem.objects.create(trip=self.trip, title='A', order=1, created_by=self.owner)
+        b = ItineraryItem.objects.create(trip=self.trip, title='B', order=2, created_by=self.owner)
+        cursor = self.client.get(self.url).data['cursor']
+
+        self.client.post(f'/api/trips/{self.trip.id}/itinerary/reorder/', {'item_ids': [b.id, a.id]}, format='json')
+
+        changes = self.client.get(self.url, {'since': cursor}).data['changes']
+        orders = {c['id']: c['data']['order'] for c in changes}
+        self.assertEqual(orders, {str(b.id): 1, str(a.id): 2})
+
+    def test_membership_removal(self):
+        """Test removing a collaborator yields a member tombstone."""
+        cursor = self.client.get(self.url).data['cursor']
+        self.trip.collaborators.remove(self.member)
+
+        changes = self.client.get(self.url, {'since': cursor}).data['changes']
+        self.assertEqual([(c['resource'], c['id'], c['op']) for c in changes], [('member', str(self.member.id), 'delete')])
+
+    def test_outsider_denied(self):
+        """Test non-members cannot read the feed."""
+        self.client.force_authenticate(user=self.outsider)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalid_since(self):
+        response = self.client.get(self.url, {'since': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_compaction(self):
+        """Test superseded entries are dropped and expired tombstones raise the floor."""
+        item = ItineraryItem.objects.create(trip=self.trip, title='A', order=1, created_by=self.owner)
+        item.title = 'A2'
+        item.save()
+        self.assertEqual(TripChange.objects.filter(resource='itinerary').count(), 2)
+
+        compact_changes()
+        entries = TripChange.objects.filter(resource='itinerary')
+        self.assertEqual(entries.count(), 1)
+        self.assertEqual(entries.get().data['title'], 'A2')
+
+        item.delete()
+        TripChange.objects.filter(op=TripChange.OP_DELETE).update(created_at=timezone.now() - timedelta(days=60))
+        compact_changes(tombstone_cutoff=timezone.now() - timedelta(days=30))
+
+        state = TripChangeState.objects.get(trip=self.trip)
+        self.assertEqual(state.floor_seq, state.last_seq)
+        response = self.client.get(self.url, {'since': 0})
+        self.assertTrue(response.data['reset'])
+        self.assertEqual(response.data['cursor'], state.last_seq)
@@ -0,0 +1,77 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework import status
+from apps.trips.models import Trip, ItineraryItem, TripNotificationState
+from apps.chat.models import ChatMessage
+from apps.polls.models import Poll, PollOption, Vote
+
+User = get_user_model()
+
+# versions (ETag), trip, collaborators, notification state, itinerary, polls,
+# options, user's votes, chat messages
+DASHBOARD_QUERY_BUDGET = 9
+
+
+class TripDashboardTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.owner = User.objects.create_user(username='owner', password='password')
+        self.outsider = User.objects.create_user(username='outsider', password='password')
+        self.trip = Trip.objects.create(owner=self.owner, title="Test Trip")
+        self.client.force_authenticate(user=self.owner)
+        self.url = f'/api/trips/{self.trip.id}/dashboard/'
+
+    def populate(self, size):
+        """Add `size` members, items, polls (with votes) and messages."""
+        offset = self.trip.collaborators.count()
+        members = [
+            User.objects.create(username=f'member{offset + i}')
+            for i in range(size)
+        ]
+        self.trip.collaborators.add(*members)
+        start = ItineraryItem.get_next_order(self.trip)
+        for i in range(size):
+            ItineraryItem.objects.create(trip=self.trip, title=f'Item {i}', order=start + i, created_by=self.owner)
+            poll = Poll.objects.create(trip=self.trip, question=f'Q{i}', created_by=members[i])
+            option = PollOption.objects.create(poll=poll, text='A')
+            PollOption.objects.create(poll=poll, text='B')
+            Vote.objects.create(poll=poll, option=option, user=members[i])
+            ChatMessage.objects.create(trip=self.trip, sender=members[i], message=f'Hi {i}')
+
+    def test_dashboard_contents(self):
+        self.populate(2)
+        TripNotificationState.objects.create(user=self.owner, trip=self.trip, unread_chat_count=3)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data
+        self.assertEqual(data['trip']['title'], 'Test Trip')
+        self.assertEqual(len(data['trip']['collaborators']), 2)
+        self.assertEqual(len(data['itinerary']), 2)
+        self.assertEqual(len(data['polls']), 2)
+        self.assertEqual([o['vote_count'] for o in data['polls'][0]['options']], [1, 0])
+        self.assertFalse(data['polls'][0]['has_voted'])
+        self.assertEqual([m['message'] for m in data['chat']], ['Hi 0', 'Hi 1'])
+        self.assertEqual(data['unread']['chat'], 3)
+
+    def test_chat_limit(self):
+        self.populate(3)
+        response = self.client.get(self.url, {'chat_limit': 2})
+        self.assertEqual([m['message'] for m in response.data['chat']], ['Hi 1', 'Hi 2'])
+
+    def test_query_budget_is_fixed(self):
+        """Test the query count does not grow with items, polls or members."""
+        self.populate(2)
+        with self.assertNumQueries(DASHBOARD_QUERY_BUDGET):
+            self.client.get(self.url)
+
+        self.populate(10)
+        with self.assertNumQueries(DASHBOARD_QUERY_BUDGET):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data['polls']), 12)
+
+    def test_outsider_denied(self):
+        self.client.force_authenticate(user=self.outsider)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,97 @@
+import multiprocessing
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from datetime import timedelta
+from unittest import mock
+
+import django
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from apps.trips import digest
+from apps.trips.models import Trip, Notification, OutboxEmail, DigestState
+
+User = get_user_model()
+
+
+class InlineExecutor(Executor):
+    """Runs the pool's tasks in this process, where the test database is."""
+    created = []
+
+    def __init__(self, workers, mp_context=None, initializer=None):
+        self.created.append((workers, mp_context.get_start_method(), initializer))
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+class DigestTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='password')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='password')
+        self.paris = Trip.objects.create(owner=self.bob, title='Paris')
+        self.rome = Trip.objects.create(owner=self.bob, title='Rome')
+        self.later = timezone.now() + timedelta(hours=2)
+
+    def notify(self, trip, target_type, recipient=None, **kwargs):
+        return Notification.objects.create(
+            recipient=recipient or self.alice, actor=self.bob, trip=trip, verb='did something',
+            target_type=target_type, **kwargs
+        )
+
+    def test_groups_by_trip_and_type(self):
+        for _ in range(3):
+            self.notify(self.paris, 'chat')
+        self.notify(self.paris, 'poll')
+        self.notify(self.rome, 'itinerary')
+        self.notify(self.rome, 'chat', is_read=True)
+
+        self.assertEqual(digest.run(now=self.later), 1)
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.to, ['alice@example.com'])
+        self.assertEqual(email.subject, 'You have 5 unread updates')
+        self.assertIn("Paris\n  - 3 mentions\n  - 1 new poll\n\nRome\n  - 1 itinerary update", email.body)
+
+    def test_incremental(self):
+        first = self.notify(self.paris, 'chat')
+        digest.run(now=self.later)
+        self.assertEqual(DigestState.objects.get(user=self.alice).last_notification_id, first.id)
+
+        # Nothing new: nothing sent
+        self.assertEqual(digest.run(now=self.later), 0)
+
+        self.notify(self.rome, 'poll')
+        self.assertEqual(digest.run(now=self.later), 1)
+        self.assertEqual(OutboxEmail.objects.latest('id').subject, 'You have 1 unread update')
+
+    def test_recent_notifications_wait(self):
+        self.notify(self.paris, 'chat')
+        self.assertEqual(digest.run(), 0)
+        self.assertFalse(DigestState.objects.exists())
+
+    def test_pool_splits_chunks_across_workers(self):
+        for i in range(10):
+            user = User.objects.create_user(username=f'user{i}', email=f'user{i}@example.com', password='password')
+            self.notify(self.paris, 'chat', recipient=user)
+        InlineExecutor.created = []
+        with mock.patch.object(digest, 'ProcessPoolExecutor', InlineExecutor):
+            self.assertEqual(digest.run(chunk_size=3, workers=2, now=self.later), 10)
+        self.assertEqual(InlineExecutor.created, [(2, 'spawn', django.setup)])
+        self.assertEqual(DigestState.objects.count(), 10)
+        self.assertEqual(OutboxEmail.objects.count(), 10)
+
+    def test_spawned_worker_runs_chunks(self):
+        # A real worker process; the test database is not visible from it,
+        # so the chunk is one that needs no queries
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(1, mp_context=context, initializer=django.setup) as pool:
+            self.assertEqual(pool.submit(digest.digest_chunk, [], self.later).result(timeout=60), 0)
+
+    def test_three_queries_per_chunk(self):
+        for i in range(10):
+            user = User.objects.create_user(username=f'user{i}', email=f'user{i}@example.com', password='password')
+            self.notify(self.paris, 'chat', recipient=user)
+        # users; then per chunk (3 of them): aggregate, savepoint, outbox, state, release
+        with self.assertNumQueries(1 + 3 * 5):
+            self.assertEqual(digest.run(chunk_size=5, now=self.later), 10)
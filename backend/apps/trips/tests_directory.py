@@ -0,0 +1,97 @@
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework import status
+from middleware import throttling
+from apps.users import directory
+from apps.users.models import DirectoryEntry
+from apps.trips.models import Trip, TripInvite
+
+User = get_user_model()
+
+
+class DirectoryTests(TestCase):
+    def setUp(self):
+        throttling.get_store().clear()
+        self.client = APIClient()
+        self.owner = User.objects.create_user(username='Owner', email='Owner@Example.com', password='password')
+        self.trip = Trip.objects.create(owner=self.owner, title='Paris')
+        self.client.force_authenticate(user=self.owner)
+
+    def test_entries_follow_user_saves(self):
+        entry = DirectoryEntry.objects.get(user=self.owner)
+        self.assertEqual((entry.username, entry.email), ('owner', 'owner@example.com'))
+
+        self.owner.email = 'New@Example.com'
+        self.owner.save()
+        self.assertEqual(DirectoryEntry.objects.get(user=self.owner).email, 'new@example.com')
+        self.assertEqual(directory.users_by_email('NEW@example.com').get(), self.owner)
+        self.assertEqual(directory.users_by_username(' OWNER ').get(), self.owner)
+
+        # Saves that cannot change them skip the entry
+        with CaptureQueriesContext(connection) as queries:
+            self.owner.save(update_fields=['last_login'])
+        self.assertFalse([q for q in queries if 'directoryentry' in q['sql']])
+
+    def test_rebuild_repairs_writes_that_skip_save(self):
+        User.objects.filter(pk=self.owner.pk).update(username='Renamed', email='')
+        bulk = User.objects.bulk_create([User(username='Bulk', email='Bulk@Example.com')])[0]
+        self.assertFalse(directory.users_by_username('renamed').exists())
+
+        out = StringIO()
+        call_command('rebuild_directory', batch_size=1, stdout=out)
+        self.assertIn('Created 1 and updated 1', out.getvalue())
+        self.assertEqual(directory.users_by_username('RENAMED').get(), self.owner)
+        self.assertEqual(directory.users_by_email('bulk@example.com').get(), bulk)
+        self.assertEqual(directory.rebuild(), (0, 0))
+
+    @skipUnless(connection.vendor == 'sqlite', "SQLite query plan")
+    def test_lookups_use_the_index(self):
+        plan = directory.users_by_email('owner@example.com').explain()
+        self.assertIn('users_directoryentry_email', plan)
+        plan = directory._prefix(DirectoryEntry.objects.all(), 'ow').explain()
+        self.assertIn('users_directoryentry_username', plan)
+
+    def test_invites_match_any_case(self):
+        User.objects.create_user(username='Bob', email='Bob@Example.com', password='password')
+        url = f'/api/trips/{self.trip.id}/invite/'
+        response = self.client.post(url, {'identifier': 'BOB'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(TripInvite.objects.get().invited_email, 'bob@example.com')
+
+        response = self.client.post(url, {'identifier': 'bob@EXAMPLE.com'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(url, {'identifier': 'Carol@Example.com'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        carol = User.objects.create_user(username='carol', email='CAROL@example.com', password='password')
+        self.client.force_authenticate(user=carol)
+        self.assertEqual(self.client.get('/api/trips/invitations/').data['count'], 1)
+
+    def test_search(self):
+        for name in ['alice', 'Alicia', 'alan', 'bob', 'ali_ex']:
+            User.objects.create_user(username=name, email=f'{name}@mail.com', password='password')
+        User.objects.create_user(username='alina', password='password', is_active=False)
+
+        def search(q, **params):
+            response = self.client.get('/api/users/search/', {'q': q, **params})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return [user['username'] for user in response.data]
+
+        self.assertEqual(search('ALI'), ['ali_ex', 'alice', 'Alicia'])
+        self.assertEqual(search('ali', limit=2), ['ali_ex', 'alice'])
+        self.assertEqual(search('a'), [])
+        self.assertEqual(search('own'), [])
+        self.assertEqual(search('BOB@MAIL.COM'), ['bob'])
+        self.assertEqual(search('bob@mail'), [])
+        self.assertEqual(len(search('al', limit=500)), 4)
+
+        # The ids, then the users with their profiles
+        with self.assertNumQueries(2):
+            self.client.get('/api/users/search/', {'q': 'al'})
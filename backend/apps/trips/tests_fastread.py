@@ -0,0 +1,74 @@
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from apps.trips.models import Trip, Notification, TripNotificationState
+from apps.chat.models import ChatMessage
+from apps.users.models import Profile
+
+User = get_user_model()
+
+
+class FastReadEquivalenceTests(TestCase):
+    """
+    The values-based read path must return byte-identical JSON to the
+    serializers it replaces.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', first_name='Ann', password='password')
+        self.member = User.objects.create_user(username='member', email='member@example.com', password='password')
+        self.other = User.objects.create_user(username='other', email='other@example.com', last_name='Lee', password='password')
+        Profile.objects.filter(user=self.member).update(avatar_style='square', avatar_color='red', avatar_icon='star')
+        # A user without a profile falls back to the default avatar
+        Profile.objects.filter(user=self.other).delete()
+
+        self.trip = Trip.objects.create(owner=self.owner, title='Paris', description='Spring')
+        # Added out of id order; both paths list collaborators by user id
+        self.trip.collaborators.add(self.other)
+        self.trip.collaborators.add(self.member)
+        self.shared = Trip.objects.create(owner=self.member, title='Rome')
+        self.shared.collaborators.add(self.owner)
+        Trip.objects.create(owner=self.other, title='Hidden')
+
+        TripNotificationState.objects.create(user=self.owner, trip=self.trip, unread_chat_count=2, unread_poll_count=1)
+
+        for i in range(3):
+            ChatMessage.objects.create(trip=self.trip, sender=self.member, message=f'Message {i}')
+        Notification.objects.create(recipient=self.owner, actor=self.member, trip=self.trip, verb='sent a message', target_type='chat')
+        Notification.objects.create(recipient=self.owner, actor=self.other, trip=None, verb='joined', target_type='trip')
+        Notification.objects.create(recipient=self.owner, actor=self.member, trip=self.shared, verb='updated', target_type='itinerary')
+
+        self.client.force_authenticate(user=self.owner)
+
+    def assertSameBody(self, url):
+        with override_settings(FAST_READ_SERIALIZERS=False):
+            slow = self.client.get(url)
+        with override_settings(FAST_READ_SERIALIZERS=True):
+            fast = self.client.get(url)
+        self.assertEqual(slow.status_code, 200)
+        self.assertEqual(fast.status_code, 200)
+        self.assertEqual(fast.content, slow.content)
+        return fast
+
+    def test_trip_list(self):
+        response = self.assertSameBody('/api/trips/')
+        self.assertEqual(response.data['count'], 2)
+
+    def test_trip_list_ordering(self):
+        self.assertSameBody('/api/trips/?ordering=title')
+        self.assertSameBody('/api/trips/?ordering=-updated_at')
+
+    def test_chat_list(self):
+        response = self.assertSameBody(f'/api/chat/trips/{self.trip.id}/chat/')
+        self.assertEqual(response.data['count'], 3)
+        self.assertSameBody(f'/api/chat/trips/{self.trip.id}/chat/?page_size=2&page=2')
+
+    def test_notification_history(self):
+        response = self.assertSameBody('/api/trips/notifications/history/')
+        self.assertEqual(response.data['count'], 3)
+
+    def test_trip_list_queries(self):
+        # user version (ETag), count, page, collaborators, unread counts
+        with self.assertNumQueries(5):
+            self.client.get('/api/trips/')
@@ -0,0 +1,123 @@
+from datetime import timedelta
+
+from middleware import throttling
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+from apps.trips import idempotency
+from apps.trips.models import Trip, TripInvite, ItineraryItem, Notification, AppliedMutation, OutboxEmail
+from apps.chat.models import ChatMessage
+from apps.polls.models import Poll, PollOption, Vote
+
+User = get_user_model()
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        throttling.get_store().clear()
+        self.client = APIClient()
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', password='password')
+        self.member = User.objects.create_user(username='member', email='member@example.com', password='password')
+        self.trip = Trip.objects.create(owner=self.owner, title='Paris')
+        self.trip.collaborators.add(self.member)
+        self.client.force_authenticate(user=self.owner)
+        self.chat_url = f'/api/chat/trips/{self.trip.id}/chat/'
+
+    def post(self, url, data, key):
+        return self.client.post(url, data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retries_replay_first_response(self):
+        poll = Poll.objects.create(trip=self.trip, question='Where?', created_by=self.owner)
+        option = PollOption.objects.create(poll=poll, text='A')
+        PollOption.objects.create(poll=poll, text='B')
+        writes = [
+            (self.chat_url, {'message': 'Hi'}, ChatMessage),
+            (f'/api/trips/{self.trip.id}/itinerary/', {'title': 'Louvre'}, ItineraryItem),
+            (f'/api/polls/trips/{self.trip.id}/polls/', {'question': 'When?', 'options': [{'text': 'May'}, {'text': 'June'}]}, Poll),
+            (f'/api/polls/polls/{poll.id}/vote/', {'option_id': option.id}, Vote),
+            (f'/api/trips/{self.trip.id}/invite/', {'identifier': 'new@example.com'}, TripInvite),
+        ]
+        for i, (url, data, model) in enumerate(writes):
+            with self.subTest(url=url):
+                first = self.post(url, data, f'key-{i}')
+                self.assertTrue(status.is_success(first.status_code), first.data)
+                count = model.objects.count()
+                notifications = Notification.objects.count()
+
+                # The lookup only
+                with self.assertNumQueries(1):
+                    retry = self.post(url, data, f'key-{i}')
+                self.assertEqual(retry.status_code, first.status_code)
+                self.assertEqual(retry.json(), first.json())
+                self.assertEqual(retry['Idempotent-Replayed'], 'true')
+                self.assertEqual(model.objects.count(), count)
+                self.assertEqual(Notification.objects.count(), notifications)
+        # One invitation email, queued once
+        self.assertEqual(OutboxEmail.objects.count(), 1)
+
+    def test_replay_fires_no_signals(self):
+        self.post(self.chat_url, {'message': 'Hi'}, 'key')
+        saved = []
+        receiver = lambda sender, **kwargs: saved.append(sender)
+        post_save.connect(receiver, weak=False)
+        try:
+            self.post(self.chat_url, {'message': 'Hi'}, 'key')
+        finally:
+            post_save.disconnect(receiver)
+        self.assertEqual(saved, [])
+
+    def test_without_key_writes_every_time(self):
+        self.client.post(self.chat_url, {'message': 'Hi'}, format='json')
+        self.client.post(self.chat_url, {'message': 'Hi'}, format='json')
+        self.assertEqual(ChatMessage.objects.count(), 2)
+
+    def test_keys_are_per_user(self):
+        self.post(self.chat_url, {'message': 'Hi'}, 'key')
+        self.client.force_authenticate(user=self.member)
+        response = self.post(self.chat_url, {'message': 'Hi'}, 'key')
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(ChatMessage.objects.count(), 2)
+
+    def test_reused_key_for_different_request(self):
+        self.post(self.chat_url, {'message': 'Hi'}, 'key')
+        response = self.post(self.chat_url, {'message': 'Bye'}, 'key')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        response = self.post(f'/api/trips/{self.trip.id}/itinerary/', {'message': 'Hi'}, 'key')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(ChatMessage.objects.count(), 1)
+
+    def test_failures_are_not_recorded(self):
+        response = self.post(self.chat_url, {}, 'key')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.post(self.chat_url, {'message': 'Hi'}, 'key')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', response)
+
+    def test_invalid_key(self):
+        response = self.post(self.chat_url, {'message': 'Hi'}, 'x' * 65)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(ChatMessage.objects.count(), 0)
+
+    def test_expired_key_runs_again_and_is_pruned(self):
+        self.post(self.chat_url, {'message': 'Hi'}, 'key')
+        AppliedMutation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        response = self.post(self.chat_url, {'message': 'Hi'}, 'key')
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(ChatMessage.objects.count(), 2)
+
+        AppliedMutation.objects.create(user=self.owner, trip=self.trip, client_id='batch', type='chat.send', status_code=201)
+        self.assertEqual(idempotency.prune(now=timezone.now() + timedelta(days=2)), 1)
+        # Batch entries never expire
+        self.assertTrue(AppliedMutation.objects.filter(client_id='batch').exists())
+
+    def test_batch_client_id_is_not_applied_again(self):
+        response = self.client.post(f'/api/trips/{self.trip.id}/mutations/', {'operations': [
+            {'client_id': 'key', 'type': 'chat.send', 'data': {'message': 'Hi'}},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.post(self.chat_url, {'message': 'Hi'}, 'key')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(ChatMessage.objects.count(), 1)
@@ -3,7 +3,9 @@ from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.core import mail
-from apps.trips.models import Trip, TripInvite
+from middleware import throttling
+from apps.trips import outbox
+from apps.trips.models import Trip, TripInvite, Notification
 
 User = get_user_model()
 
@@ -28,7 +30,10 @@ class TripInviteTests(TestCase):
         invite = TripInvite.objects.first()
         self.assertEqual(invite.invited_email, 'newuser@example.com')
         self.assertIsNone(invite.invited_user)
-        self.assertEqual(len(mail.outbox), 1)
+        # Queued, then sent by the outbox worker
+        self.assertEqual(len(mail.outbox), 0)
+        outbox.deliver()
+        self.assertEqual(mail.outbox[0].to, ['newuser@example.com'])
 
     def test_send_invite_username_success(self):
         """Test sending an invite via username."""
@@ -37,6 +42,7 @@ class TripInviteTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         invite = TripInvite.objects.first()
         self.assertEqual(invite.invited_user, self.user)
+        outbox.deliver()
         self.assertEqual(len(mail.outbox), 1)
 
     def test_send_invite_email_existing_user(self):
@@ -101,3 +107,57 @@ class TripInviteTests(TestCase):
         data = {'identifier': 'new@example.com'}
         response = self.client.post(f'/api/trips/{self.trip.id}/invite/', data)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BulkInviteTests(TestCase):
+    def setUp(self):
+        throttling.get_store().clear()
+        self.client = APIClient()
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', password='password')
+        self.member = User.objects.create_user(username='member', email='member@example.com', password='password')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='password')
+        self.trip = Trip.objects.create(owner=self.owner, title='Rome')
+        self.trip.collaborators.add(self.member)
+        TripInvite.objects.create(trip=self.trip, invited_email='pending@example.com', invited_by=self.owner)
+        self.client.force_authenticate(user=self.owner)
+        self.url = f'/api/trips/{self.trip.id}/invite/bulk/'
+
+    def test_outcomes(self):
+        identifiers = [
+            'BOB', 'bob@example.com', 'New@Example.com', 'ghost', 'Member', 'owner@example.com',
+            'pending@example.com', 'not-an@email', '',
+        ]
+        response = self.client.post(self.url, {'identifiers': identifiers}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([result['status'] for result in response.data['results']], [
+            'invited', 'duplicate', 'invited', 'not_found', 'member', 'member',
+            'already_invited', 'invalid', 'invalid',
+        ])
+        self.assertEqual(response.data['invited'], 2)
+
+        invite = TripInvite.objects.get(invited_user=self.bob)
+        self.assertEqual(invite.invited_email, 'bob@example.com')
+        self.assertTrue(TripInvite.objects.filter(invited_email='new@example.com', invited_user=None).exists())
+        self.assertEqual(Notification.objects.get(recipient=self.bob).target_type, 'invite')
+        outbox.deliver()
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['bob@example.com', 'new@example.com'])
+
+        # Invited now
+        response = self.client.post(self.url, {'identifiers': ['bob']}, format='json')
+        self.assertEqual(response.data['results'][0]['status'], 'already_invited')
+
+    def test_query_count_is_independent_of_size(self):
+        for i in range(40):
+            User.objects.create_user(username=f'guest{i}', email=f'guest{i}@example.com', password='password')
+        identifiers = [f'guest{i}' if i % 2 else f'guest{i}@example.com' for i in range(40)]
+        # trip, entries, members, pending, savepoint, invites, notifications,
+        # user versions (select, insert, update), outbox emails, savepoint release
+        with self.assertNumQueries(12):
+            response = self.client.post(self.url, {'identifiers': identifiers}, format='json')
+        self.assertEqual(response.data['invited'], 40)
+
+    def test_owner_only(self):
+        self.client.force_authenticate(user=self.member)
+        response = self.client.post(self.url, {'identifiers': ['bob']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.post(self.url, {'identifiers': []}, format='json').status_code, 403)
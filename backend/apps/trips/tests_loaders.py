@@ -0,0 +1,93 @@
+from django.test import TestCase, RequestFactory, override_settings
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from apps.trips.models import Trip, Notification
+from apps.trips.serializers import TripSerializer
+from apps.polls.models import Poll, PollOption, Vote
+from apps.polls.serializers import PollSerializer
+
+User = get_user_model()
+
+
+class BatchLoaderTests(TestCase):
+    """
+    Method fields resolve through batched loaders, so rendering a list
+    costs a fixed number of queries however many rows it has.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='password')
+        self.request = RequestFactory().get('/')
+        self.request.user = self.user
+
+    def make_trips(self, count):
+        for i in range(count):
+            trip = Trip.objects.create(owner=self.user, title=f'Trip {i}')
+            member = User.objects.create(username=f'member-{trip.id}')
+            trip.collaborators.add(member)
+            Notification.objects.create(recipient=self.user, actor=member, trip=trip, verb='sent a message', target_type='chat')
+            poll = Poll.objects.create(trip=trip, question='Where?', created_by=member)
+            option = PollOption.objects.create(poll=poll, text='A')
+            PollOption.objects.create(poll=poll, text='B')
+            Vote.objects.create(poll=poll, option=option, user=self.user)
+
+    def render_trips(self):
+        return TripSerializer(Trip.objects.all(), many=True, context={'request': self.request}).data
+
+    def render_polls(self):
+        return PollSerializer(Poll.objects.all(), many=True, context={'request': self.request}).data
+
+    def test_trip_list_queries_constant(self):
+        # trips, owners, collaborators, avatars, unread counts
+        self.make_trips(2)
+        with self.assertNumQueries(5):
+            self.render_trips()
+
+        self.make_trips(8)
+        self.request = RequestFactory().get('/')
+        self.request.user = self.user
+        with self.assertNumQueries(5):
+            data = self.render_trips()
+        self.assertEqual(len(data), 10)
+        self.assertEqual(data[0]['collaborators'][0]['avatar'], {'style': 'circle', 'color': 'blue', 'icon': 'person'})
+
+    def test_poll_list_queries_constant(self):
+        # polls, creators, option results, user's votes
+        self.make_trips(2)
+        with self.assertNumQueries(4):
+            self.render_polls()
+
+        self.make_trips(8)
+        with self.assertNumQueries(4):
+            data = self.render_polls()
+        self.assertEqual(len(data), 10)
+        self.assertTrue(all(poll['has_voted'] for poll in data))
+        self.assertEqual([o['vote_count'] for o in data[0]['options']], [1, 0])
+
+    def test_request_memo(self):
+        """Test a second render in the same request reuses request-scoped loaders."""
+        self.make_trips(3)
+        self.render_trips()
+        # trips, owners, collaborators; avatars and unread counts are memoized
+        with self.assertNumQueries(3):
+            self.render_trips()
+
+    def test_single_object_render(self):
+        self.make_trips(1)
+        data = PollSerializer(Poll.objects.get(), context={'request': self.request}).data
+        self.assertTrue(data['has_voted'])
+        self.assertEqual(len(data['options']), 2)
+
+    @override_settings(FAST_READ_SERIALIZERS=False)
+    def test_notification_history_queries_constant(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        self.make_trips(3)
+        # user version (ETag), count, page, actors, trips, avatars
+        with self.assertNumQueries(6):
+            client.get('/api/trips/notifications/history/')
+
+        self.make_trips(12)
+        with self.assertNumQueries(6):
+            response = client.get('/api/trips/notifications/history/')
+        self.assertEqual(len(response.data['results']), 15)
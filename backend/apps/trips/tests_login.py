@@ -0,0 +1,191 @@
+import json
+import threading
+import time
+
+from asgiref.sync import async_to_sync
+from django.test import TestCase, TransactionTestCase, AsyncRequestFactory
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.signals import user_login_failed
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from middleware import throttling
+from apps.users import login
+from apps.users.views import AsyncLoginView
+from apps.users.write_behind import writes
+
+User = get_user_model()
+
+
+class LoginTests(TestCase):
+    def setUp(self):
+        throttling.get_store().clear()
+        writes.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='Alice', email='Alice@Example.com', password='password')
+
+    def tearDown(self):
+        writes.clear()
+
+    def post(self, identifier, password='password'):
+        return self.client.post('/api/auth/login/', {'identifier': identifier, 'password': password}, format='json')
+
+    def test_one_query_and_no_writes(self):
+        # The user with its profile
+        with self.assertNumQueries(1):
+            response = self.post('alice')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['user']['avatar'], {'style': 'circle', 'color': 'blue', 'icon': 'person'})
+
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.last_login)
+        self.assertFalse(OutstandingToken.objects.exists())
+
+        writes.flush()
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+        self.assertEqual(OutstandingToken.objects.get().user, self.user)
+
+    def test_flushes_in_batches(self):
+        with self.settings(LOGIN_WRITE_BATCH=3, LOGIN_WRITE_INTERVAL=3600):
+            self.post('alice')
+            self.assertEqual(writes.pending(), 2)
+            self.post('alice')
+        # The second token reached the batch size; its last_login came after
+        self.assertEqual(writes.pending(), 1)
+        self.assertEqual(OutstandingToken.objects.count(), 2)
+
+    def test_identifiers(self):
+        self.assertEqual(self.post('ALICE').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.post('alice@example.com').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.post('alice', 'wrong').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.post('bob').status_code, status.HTTP_401_UNAUTHORIZED)
+
+        User.objects.create_user(username='carol@home', password='password')
+        self.assertEqual(self.post('carol@home').status_code, status.HTTP_200_OK)
+
+        # ModelBackend.user_can_authenticate refuses inactive users
+        self.user.is_active = False
+        self.user.save()
+        response = self.post('alice')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.data, {'error': 'Invalid credentials.'})
+
+    def test_goes_through_the_auth_backends(self):
+        failed = []
+
+        def handler(sender, credentials, **kwargs):
+            failed.append(credentials)
+
+        user_login_failed.connect(handler)
+        self.addCleanup(user_login_failed.disconnect, handler)
+
+        self.assertEqual(self.post('alice', 'wrong').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(failed, [{'identifier': 'alice', 'password': '********************'}])
+
+        with self.settings(AUTHENTICATION_BACKENDS=['django.contrib.auth.backends.AllowAllUsersModelBackend']):
+            # No backend takes an identifier
+            self.assertEqual(self.post('alice').status_code, status.HTTP_401_UNAUTHORIZED)
+        # The admin's username logins still work
+        self.assertEqual(authenticate(username='Alice', password='password'), self.user)
+
+    def test_missing_profile_is_created(self):
+        self.user.profile.delete()
+        self.assertEqual(self.post('alice').status_code, status.HTTP_200_OK)
+        self.assertTrue(User.objects.get(pk=self.user.pk).profile)
+
+
+class WriteBehindThreadTests(TransactionTestCase):
+    """The flusher thread needs real commits to write from its own connection."""
+
+    def setUp(self):
+        throttling.get_store().clear()
+        writes.clear()
+        self.user = User.objects.create_user(username='alice', password='password')
+
+    def tearDown(self):
+        writes.stop()
+        writes.clear()
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 10
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.02)
+
+    def test_logins_do_not_flush(self):
+        flushed_on = []
+        flush = writes.flush
+
+        def recording():
+            flushed_on.append(threading.current_thread().name)
+            flush()
+
+        writes.flush = recording
+        self.addCleanup(delattr, writes, 'flush')
+        with self.settings(LOGIN_WRITE_THREAD=True, LOGIN_WRITE_BATCH=2, LOGIN_WRITE_INTERVAL=3600):
+            response = APIClient().post('/api/auth/login/', {'identifier': 'alice', 'password': 'password'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            # The full batch wakes the thread instead of being written here
+            self.wait_for(lambda: OutstandingToken.objects.exists())
+            self.wait_for(lambda: User.objects.get(pk=self.user.pk).last_login is not None)
+        self.assertEqual(set(flushed_on), {'login-write-behind'})
+
+    def test_flushes_on_the_interval(self):
+        with self.settings(LOGIN_WRITE_THREAD=True, LOGIN_WRITE_INTERVAL=0.05):
+            writes.last_login(self.user.pk, timezone.now())
+            self.wait_for(lambda: writes.pending() == 0)
+        self.assertIsNotNone(User.objects.get(pk=self.user.pk).last_login)
+
+
+class AsyncLoginTests(TestCase):
+    def setUp(self):
+        throttling.get_store().clear()
+        writes.clear()
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='password')
+
+    def tearDown(self):
+        writes.clear()
+
+    def post(self, body):
+        request = AsyncRequestFactory().post('/api/auth/login/', body, content_type='application/json')
+        return async_to_sync(AsyncLoginView.as_view())(request)
+
+    def test_same_contract_as_sync_view(self):
+        response = self.post({'identifier': 'alice@example.com', 'password': 'password'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = json.loads(response.content)
+        self.assertEqual(data['user']['username'], 'alice')
+        self.assertTrue(data['access'] and data['refresh'])
+        self.assertEqual(writes.pending(), 2)
+
+        response = self.post({'identifier': 'alice', 'password': 'wrong'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(json.loads(response.content), {'error': 'Invalid credentials.'})
+        self.user.is_active = False
+        self.user.save()
+        response = self.post({'identifier': 'alice', 'password': 'password'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.post({}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.post({'identifier': 'alice'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_throttled(self):
+        codes = [self.post({'identifier': 'alice', 'password': 'wrong'}).status_code for _ in range(11)]
+        self.assertEqual(codes[:10], [status.HTTP_401_UNAUTHORIZED] * 10)
+        self.assertEqual(codes[10], status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_hash_runs_off_the_event_loop(self):
+        threads = []
+        check_password = login.check_password
+
+        def recording(user, password):
+            threads.append(threading.current_thread().name)
+            return check_password(user, password)
+
+        login.check_password = recording
+        try:
+            self.post({'identifier': 'alice', 'password': 'password'})
+        finally:
+            login.check_password = check_password
+        self.assertTrue(threads[0].startswith('login-hash'))
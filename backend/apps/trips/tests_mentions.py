@@ -0,0 +1,69 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework import status
+from middleware import throttling
+from apps.chat import mentions
+from apps.chat.models import ChatMessage
+from apps.trips.models import Trip, Notification, TripNotificationState, TripNotificationPreference
+
+User = get_user_model()
+
+
+class MentionTests(TestCase):
+    def setUp(self):
+        throttling.get_store().clear()
+        self.client = APIClient()
+        self.owner = User.objects.create_user(username='Owner', password='password')
+        self.ana = User.objects.create_user(username='ana', password='password')
+        self.ben = User.objects.create_user(username='ben', password='password')
+        self.outsider = User.objects.create_user(username='outsider', password='password')
+        self.trip = Trip.objects.create(owner=self.owner, title='Kyoto')
+        self.trip.collaborators.add(self.ana, self.ben)
+        self.client.force_authenticate(user=self.ana)
+        self.url = f'/api/chat/trips/{self.trip.id}/chat/'
+
+    def send(self, message):
+        response = self.client.post(self.url, {'message': message}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response
+
+    def recipients(self):
+        return sorted(Notification.objects.values_list('recipient__username', flat=True))
+
+    def test_parse(self):
+        self.assertEqual(mentions.parse('Thanks @Ben. Ask @owner, not me@example.com'), {'ben.', 'ben', 'owner'})
+        self.assertEqual(mentions.parse('@all hands'), {'all'})
+        self.assertEqual(mentions.parse('no mentions @ all'), set())
+
+    def test_mentions_are_resolved_in_one_query(self):
+        with self.assertNumQueries(1):
+            ids, everyone = mentions.resolve(self.trip, {'ben', 'owner', 'outsider', 'nobody', 'all'})
+        self.assertEqual(ids, sorted([self.owner.id, self.ben.id]))
+        self.assertTrue(everyone)
+
+    def test_only_mentioned_members_are_notified(self):
+        response = self.send('@ben @Owner see you @outsider')
+        self.assertEqual(response.data['mentions'], sorted([self.owner.id, self.ben.id]))
+        self.assertEqual(self.recipients(), ['Owner', 'ben'])
+        self.assertEqual(Notification.objects.first().verb, 'mentioned you in Kyoto')
+
+        Notification.objects.all().delete()
+        self.send('No one in particular')
+        self.assertEqual(self.recipients(), [])
+        # Everyone still sees both messages as unread
+        counts = dict(TripNotificationState.objects.values_list('user__username', 'unread_chat_count'))
+        self.assertEqual(counts, {'Owner': 2, 'ben': 2})
+
+    def test_all_notifies_everyone_not_muted(self):
+        TripNotificationPreference.objects.create(user=self.ben, trip=self.trip, target_type='chat', level='muted')
+        self.send('@all dinner at 8')
+        message = ChatMessage.objects.get()
+        self.assertEqual((message.mentions, message.mentions_all), ([], True))
+        self.assertEqual(self.recipients(), ['Owner'])
+
+    def test_mentions_only_level_is_notified_when_mentioned(self):
+        TripNotificationPreference.objects.create(user=self.ben, trip=self.trip, target_type='chat', level='mentions')
+        self.send('@ben @ana')
+        # The sender is not notified of their own mention
+        self.assertEqual(self.recipients(), ['ben'])
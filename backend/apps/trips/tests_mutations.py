@@ -0,0 +1,144 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework import status
+from apps.trips.models import Trip, ItineraryItem, Notification, TripNotificationState, AppliedMutation
+from apps.trips.mutations import MutationBatch
+from apps.chat.models import ChatMessage
+from apps.polls.models import Poll, Vote
+
+User = get_user_model()
+
+
+class MutationBatchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', password='password')
+        self.member = User.objects.create_user(username='member', email='member@example.com', password='password')
+        self.outsider = User.objects.create_user(username='outsider', password='password')
+
+        self.trip = Trip.objects.create(owner=self.owner, title="Test Trip")
+        self.trip.collaborators.add(self.member)
+        self.client.force_authenticate(user=self.owner)
+        self.url = f'/api/trips/{self.trip.id}/mutations/'
+
+    def post(self, operations):
+        return self.client.post(self.url, {'operations': operations}, format='json')
+
+    def test_apply_mixed_operations(self):
+        """Test every operation type applies and later ops can reference earlier ones."""
+        response = self.post([
+            {'client_id': 'i1', 'type': 'itinerary.create', 'data': {'title': 'Museum'}},
+            {'client_id': 'i2', 'type': 'itinerary.create', 'data': {'title': 'Beach'}},
+            {'client_id': 'u1', 'type': 'itinerary.update', 'data': {'id': '$i1', 'title': 'Louvre'}},
+            {'client_id': 'r1', 'type': 'itinerary.reorder', 'data': {'item_ids': ['$i2', '$i1']}},
+            {'client_id': 'c1', 'type': 'chat.send', 'data': {'message': 'Hello'}},
+            {'client_id': 'p1', 'type': 'poll.create', 'data': {'question': 'Where?', 'options': [{'text': 'A'}, {'text': 'B'}]}},
+            {'client_id': 'd1', 'type': 'itinerary.delete', 'data': {'id': '$i2'}},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        statuses = [r['status'] for r in response.data['results']]
+        self.assertEqual(statuses, [201, 201, 200, 200, 201, 201, 204])
+
+        self.assertEqual(list(ItineraryItem.objects.values_list('title', flat=True)), ['Louvre'])
+        self.assertEqual(ChatMessage.objects.count(), 1)
+        self.assertEqual(Poll.objects.count(), 1)
+
+    def test_vote(self):
+        poll_response = self.post([
+            {'client_id': 'p1', 'type': 'poll.create', 'data': {'question': 'Where?', 'options': [{'text': 'A'}, {'text': 'B'}]}},
+        ])
+        option_id = poll_response.data['results'][0]['data']['options'][0]['id']
+
+        response = self.post([{'client_id': 'v1', 'type': 'poll.vote', 'data': {'poll_id': '$p1', 'option_id': option_id}}])
+        # $p1 was created in an earlier batch, so it must be referenced by id
+        self.assertEqual(response.data['results'][0]['status'], status.HTTP_400_BAD_REQUEST)
+
+        poll_id = poll_response.data['results'][0]['data']['id']
+        response = self.post([{'client_id': 'v2', 'type': 'poll.vote', 'data': {'poll_id': poll_id, 'option_id': option_id}}])
+        self.assertEqual(response.data['results'][0]['status'], status.HTTP_200_OK)
+        self.assertEqual(Vote.objects.count(), 1)
+
+    def test_replay_is_idempotent(self):
+        """Test replaying a batch returns stored results without re-applying."""
+        operations = [
+            {'client_id': 'c1', 'type': 'chat.send', 'data': {'message': 'Hello'}},
+            {'client_id': 'i1', 'type': 'itinerary.create', 'data': {'title': 'Museum'}},
+        ]
+        first = self.post(operations)
+        second = self.post(operations)
+
+        self.assertEqual(ChatMessage.objects.count(), 1)
+        self.assertEqual(ItineraryItem.objects.count(), 1)
+        self.assertTrue(all(r['replayed'] for r in second.data['results']))
+        self.assertEqual(first.data['results'][1]['data']['id'], second.data['results'][1]['data']['id'])
+
+    def test_client_ids_are_per_trip(self):
+        """Test a client_id used on one trip is applied afresh on another."""
+        other = Trip.objects.create(owner=self.owner, title="Other Trip")
+        self.post([{'client_id': 'c1', 'type': 'chat.send', 'data': {'message': 'Hi'}}])
+        response = self.client.post(
+            f'/api/trips/{other.id}/mutations/',
+            {'operations': [{'client_id': 'c1', 'type': 'chat.send', 'data': {'message': 'Hi'}}]},
+            format='json',
+        )
+        self.assertFalse(response.data['results'][0]['replayed'])
+        self.assertEqual(ChatMessage.objects.filter(trip=other).count(), 1)
+
+    def test_concurrent_replay_returns_the_stored_result(self):
+        """Test losing the race to record an operation replays the winner's result."""
+        request = APIRequestFactory().post(self.url)
+        request.user = self.owner
+        winner = AppliedMutation.objects.create(
+            user=self.owner, trip=self.trip, client_id='c1', type='chat.send', status_code=201, result={'id': 7},
+        )
+
+        class RacingBatch(MutationBatch):
+            # Looked up before the concurrent request committed its record
+            def _applied(self, client_ids):
+                return {}
+
+        batch = RacingBatch(self.trip, request)
+        results = batch.apply([{'client_id': 'c1', 'type': 'chat.send', 'data': {'message': 'Hi'}}])
+        self.assertEqual((results[0]['status'], results[0]['data'], results[0]['replayed']), (201, {'id': 7}, True))
+        self.assertEqual(batch.created_ids, {'c1': winner.result['id']})
+        self.assertEqual(ChatMessage.objects.count(), 0)
+
+    def test_failed_operation_does_not_sink_batch(self):
+        """Test a stale operation reports an error while the others apply."""
+        response = self.post([
+            {'client_id': 'd1', 'type': 'itinerary.delete', 'data': {'id': 9999}},
+            {'client_id': 'c1', 'type': 'chat.send', 'data': {'message': 'Still here'}},
+        ])
+        results = response.data['results']
+        self.assertEqual(results[0]['status'], status.HTTP_404_NOT_FOUND)
+        self.assertIn('errors', results[0])
+        self.assertEqual(results[1]['status'], status.HTTP_201_CREATED)
+        self.assertEqual(ChatMessage.objects.count(), 1)
+
+    def test_notifications_coalesced(self):
+        """Test many operations of one type produce a single fan-out."""
+        self.post([
+            {'client_id': f'c{i}', 'type': 'chat.send', 'data': {'message': f'Message {i}'}}
+            for i in range(5)
+        ] + [{'client_id': 'c5', 'type': 'chat.send', 'data': {'message': 'Right, @member?'}}])
+        # Only the mention is a notification; every message counts as unread once
+        self.assertEqual(Notification.objects.filter(recipient=self.member).count(), 1)
+        state = TripNotificationState.objects.get(user=self.member, trip=self.trip)
+        self.assertEqual(state.unread_chat_count, 1)
+
+    def test_invalid_batch(self):
+        response = self.post([
+            {'client_id': 'x', 'type': 'chat.send', 'data': {'message': 'a'}},
+            {'client_id': 'x', 'type': 'chat.send', 'data': {'message': 'b'}},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.post([{'client_id': 'x', 'type': 'trip.delete'}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_outsider_denied(self):
+        self.client.force_authenticate(user=self.outsider)
+        response = self.post([{'client_id': 'c1', 'type': 'chat.send', 'data': {'message': 'Hi'}}])
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(ChatMessage.objects.count(), 0)
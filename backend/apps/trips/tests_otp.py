@@ -0,0 +1,86 @@
+import re
+import time
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework import status
+from middleware import throttling
+from apps.users import otp
+from apps.users.otp import LocmemSender
+
+User = get_user_model()
+
+
+@override_settings(OTP_SENDER='apps.users.otp.LocmemSender', OTP_MAX_ATTEMPTS=3)
+class OTPTests(TestCase):
+    def setUp(self):
+        throttling.get_store().clear()
+        caches['otp'].clear()
+        LocmemSender.outbox.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='alice', password='password')
+        self.client.force_authenticate(user=self.user)
+
+    def send(self, phone='+15550001'):
+        with self.assertNumQueries(0):
+            response = self.client.post('/api/users/profile/generate-otp/', {'phone_number': phone}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        number, message = LocmemSender.outbox[-1]
+        self.assertEqual(number, phone)
+        return re.search(r'\d{6}', message).group()
+
+    def update(self, code, phone='+15550001'):
+        return self.client.put('/api/users/profile/update/', {'phone_number': phone, 'otp': code}, format='json')
+
+    def test_verified_code_saves_the_phone_once(self):
+        code = self.send()
+        self.assertEqual(self.update('000000' if code != '000000' else '111111').status_code, 400)
+
+        response = self.update(code)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['phone_number'], '+15550001')
+
+        # Consumed
+        self.user.profile.refresh_from_db()
+        self.user.profile.phone_number = ''
+        self.user.profile.save()
+        self.assertEqual(self.update(code).data, {'otp': 'Invalid OTP.'})
+
+    def test_code_is_bound_to_the_phone(self):
+        code = self.send('+15550001')
+        self.assertEqual(self.update(code, phone='+15550002').status_code, 400)
+        self.assertEqual(self.update(code, phone='+15550001').status_code, 200)
+
+    def test_code_needs_a_phone(self):
+        response = self.client.post('/api/users/profile/generate-otp/', {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(LocmemSender.outbox, [])
+
+        # A code sent to no number verifies none
+        otp.request(self.user, '')
+        code = re.search(r'\d{6}', LocmemSender.outbox[-1][1]).group()
+        self.assertEqual(self.update(code).data, {'otp': 'Invalid OTP.'})
+
+    def test_attempts_are_limited(self):
+        code = self.send()
+        wrong = '000000' if code != '000000' else '111111'
+        for _ in range(3):
+            self.assertEqual(self.update(wrong).data, {'otp': 'Invalid OTP.'})
+        self.assertEqual(self.update(code).data, {'otp': 'Too many attempts. Request a new code.'})
+        self.assertEqual(self.update(code).data, {'otp': 'Invalid OTP.'})
+
+        # A new code starts over
+        self.assertEqual(self.update(self.send()).status_code, 200)
+
+    def test_codes_expire(self):
+        code = self.send()
+        with mock.patch('time.time', return_value=time.time() + 301):
+            self.assertEqual(self.update(code).status_code, 400)
+
+    def test_generate(self):
+        codes = {otp.generate() for _ in range(50)}
+        self.assertTrue(all(re.fullmatch(r'\d{6}', code) for code in codes))
+        self.assertGreater(len(codes), 1)
@@ -0,0 +1,180 @@
+import socketserver
+import threading
+from datetime import timedelta
+
+from django.core import mail
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+from middleware import throttling
+from apps.trips import outbox
+from apps.trips.models import Trip, OutboxEmail
+
+User = get_user_model()
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """
+    Just enough SMTP for smtplib: accepts everything but server.refused,
+    and hangs up on server.dropped.
+    """
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        recipients = []
+        self.reply('220 stand-in')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb in ('EHLO', 'HELO', 'NOOP'):
+                self.reply('250 stand-in')
+            elif verb in ('MAIL', 'RSET'):
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                address = command.split(':', 1)[1].strip().strip('<>')
+                if address in server.dropped:
+                    return
+                if address in server.refused:
+                    self.reply('550 No such user')
+                else:
+                    recipients.append(address)
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                server.delivered.extend(recipients)
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Not implemented')
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.connections = 0
+        self.delivered = []
+        self.refused = set()
+        self.dropped = set()
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.smtp = SMTPStandIn()
+        threading.Thread(target=self.smtp.serve_forever, daemon=True).start()
+        self.addCleanup(self.smtp.server_close)
+        self.addCleanup(self.smtp.shutdown)
+        smtp_settings = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=self.smtp.server_address[1],
+            EMAIL_TIMEOUT=5,
+            OUTBOX_MAX_ATTEMPTS=3,
+            OUTBOX_RETRY_DELAY=60,
+        )
+        smtp_settings.enable()
+        self.addCleanup(smtp_settings.disable)
+
+    def enqueue(self, *addresses):
+        return outbox.enqueue(mail.EmailMessage('Hi', 'Body', 'trips@example.com', [a]) for a in addresses)
+
+    def test_batch_shares_one_connection(self):
+        self.enqueue('a@example.com', 'b@example.com', 'c@example.com')
+        self.assertEqual(outbox.deliver(), (3, 0, 0))
+        self.assertEqual(self.smtp.connections, 1)
+        self.assertEqual(sorted(self.smtp.delivered), ['a@example.com', 'b@example.com', 'c@example.com'])
+        self.assertEqual(OutboxEmail.objects.filter(status='SENT', attempts=1).count(), 3)
+        self.assertEqual(outbox.deliver(), (0, 0, 0))
+
+    def test_retries_with_backoff_then_dead_letters(self):
+        self.smtp.refused.add('bad@example.com')
+        self.enqueue('good@example.com', 'bad@example.com')
+        now = timezone.now()
+        self.assertEqual(outbox.deliver(now=now), (1, 1, 0))
+        bad = OutboxEmail.objects.get(to=['bad@example.com'])
+        self.assertEqual((bad.status, bad.attempts), ('PENDING', 1))
+        self.assertIn('SMTPRecipientsRefused', bad.last_error)
+        self.assertEqual(bad.next_attempt_at, now + timedelta(seconds=60))
+
+        # Not due yet; then the delay doubles
+        self.assertEqual(outbox.deliver(now=now + timedelta(seconds=30)), (0, 0, 0))
+        self.assertEqual(outbox.deliver(now=now + timedelta(seconds=60)), (0, 1, 0))
+        bad.refresh_from_db()
+        self.assertEqual(bad.next_attempt_at, now + timedelta(seconds=180))
+
+        self.assertEqual(outbox.deliver(now=now + timedelta(seconds=180)), (0, 0, 1))
+        bad.refresh_from_db()
+        self.assertEqual((bad.status, bad.attempts), ('DEAD', 3))
+        self.assertEqual(outbox.deliver(now=now + timedelta(days=1)), (0, 0, 0))
+
+    def test_refused_recipient_keeps_the_connection(self):
+        self.smtp.refused.add('bad@example.com')
+        self.enqueue('bad@example.com', 'a@example.com', 'b@example.com')
+        self.assertEqual(outbox.deliver(), (2, 1, 0))
+        self.assertEqual(self.smtp.connections, 1)
+
+    def test_dropped_connection_is_reopened(self):
+        self.smtp.dropped.add('b@example.com')
+        self.enqueue('a@example.com', 'b@example.com', 'c@example.com', 'd@example.com')
+        self.assertEqual(outbox.deliver(), (3, 1, 0))
+        self.assertEqual(sorted(self.smtp.delivered), ['a@example.com', 'c@example.com', 'd@example.com'])
+        self.assertEqual(self.smtp.connections, 2)
+        # The message the server hung up on spent its attempt
+        self.assertEqual(OutboxEmail.objects.get(to=['b@example.com']).attempts, 1)
+
+    def test_unreachable_server_spends_no_attempts(self):
+        self.enqueue('a@example.com', 'b@example.com')
+        now = timezone.now()
+        with override_settings(EMAIL_PORT=1):
+            # An outage longer than OUTBOX_MAX_ATTEMPTS retries dead-letters nothing
+            for minute in range(5):
+                self.assertEqual(outbox.deliver(now=now + timedelta(minutes=minute)), (0, 2, 0))
+        row = OutboxEmail.objects.first()
+        self.assertEqual((row.status, row.attempts), ('PENDING', 0))
+        self.assertEqual(row.next_attempt_at, now + timedelta(minutes=5))
+        self.assertTrue(row.last_error)
+
+        self.assertEqual(outbox.deliver(now=now + timedelta(minutes=5)), (2, 0, 0))
+        self.assertEqual(OutboxEmail.objects.filter(status='SENT', attempts=1).count(), 2)
+
+    def test_claimed_rows_are_leased(self):
+        self.enqueue('a@example.com')
+        now = timezone.now()
+        self.assertEqual(len(outbox._claim(10, now)), 1)
+        self.assertEqual(outbox._claim(10, now), [])
+        self.assertEqual(len(outbox._claim(10, now + timedelta(seconds=301))), 1)
+
+    def test_rolled_back_request_sends_nothing(self):
+        with transaction.atomic():
+            self.enqueue('a@example.com')
+            transaction.set_rollback(True)
+        self.assertFalse(OutboxEmail.objects.exists())
+
+    def test_invite_does_not_wait_for_smtp(self):
+        throttling.get_store().clear()
+        owner = User.objects.create_user(username='owner', password='password')
+        trip = Trip.objects.create(owner=owner, title='Oslo')
+        client = APIClient()
+        client.force_authenticate(user=owner)
+        with override_settings(EMAIL_PORT=1):
+            response = client.post(f'/api/trips/{trip.id}/invite/', {'identifier': 'new@example.com'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.smtp.connections, 0)
+        outbox.deliver()
+        self.assertEqual(self.smtp.delivered, ['new@example.com'])
@@ -0,0 +1,67 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework import status
+from middleware import throttling
+from apps.trips.models import Trip, Notification, TripNotificationState, TripNotificationPreference
+from apps.trips.services import increment_notification_count
+
+User = get_user_model()
+
+
+class NotificationPreferenceTests(TestCase):
+    def setUp(self):
+        throttling.get_store().clear()
+        self.client = APIClient()
+        self.owner = User.objects.create_user(username='owner', password='password')
+        self.loud = User.objects.create_user(username='loud', password='password')
+        self.quiet = User.objects.create_user(username='quiet', password='password')
+        self.muted = User.objects.create_user(username='muted', password='password')
+        self.trip = Trip.objects.create(owner=self.owner, title='Lisbon')
+        self.trip.collaborators.add(self.loud, self.quiet, self.muted)
+        self.url = f'/api/trips/{self.trip.id}/notification-preferences/'
+
+    def prefer(self, user, **levels):
+        self.client.force_authenticate(user=user)
+        return self.client.put(self.url, levels, format='json')
+
+    def test_get_and_put(self):
+        self.client.force_authenticate(user=self.quiet)
+        self.assertEqual(self.client.get(self.url).data, {'chat': 'all', 'poll': 'all', 'itinerary': 'all'})
+
+        response = self.prefer(self.quiet, chat='mentions', poll='muted')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'chat': 'mentions', 'poll': 'muted', 'itinerary': 'all'})
+        response = self.prefer(self.quiet, chat='muted', poll='all')
+        self.assertEqual(response.data, {'chat': 'muted', 'poll': 'all', 'itinerary': 'all'})
+        # Back to the default leaves no row behind
+        self.assertEqual(list(TripNotificationPreference.objects.values_list('target_type', 'level')), [('chat', 'muted')])
+
+        self.assertEqual(self.prefer(self.quiet, chat='loud').status_code, status.HTTP_400_BAD_REQUEST)
+        outsider = User.objects.create_user(username='outsider', password='password')
+        self.assertEqual(self.prefer(outsider, chat='muted').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_fan_out_skips_muted_members(self):
+        self.prefer(self.quiet, poll='mentions')
+        self.prefer(self.muted, poll='muted')
+        # Another type is unaffected
+        TripNotificationPreference.objects.create(user=self.loud, trip=self.trip, target_type='chat', level='muted')
+
+        # members, states insert, counter update, notifications, versions
+        with self.assertNumQueries(5):
+            increment_notification_count(self.trip, self.owner, 'poll')
+        counts = dict(TripNotificationState.objects.values_list('user__username', 'unread_poll_count'))
+        self.assertEqual(counts, {'loud': 1, 'quiet': 1})
+        self.assertEqual(list(Notification.objects.values_list('recipient__username', flat=True)), ['loud'])
+
+        increment_notification_count(self.trip, self.owner, 'poll')
+        self.assertEqual(TripNotificationState.objects.get(user=self.quiet).unread_poll_count, 2)
+
+    def test_message_writes_nothing_for_muted_members(self):
+        self.prefer(self.muted, chat='muted')
+        self.client.force_authenticate(user=self.owner)
+        response = self.client.post(f'/api/chat/trips/{self.trip.id}/chat/', {'message': '@all hi'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(Notification.objects.filter(recipient=self.muted).exists())
+        self.assertFalse(TripNotificationState.objects.filter(user=self.muted).exists())
+        self.assertTrue(Notification.objects.filter(recipient=self.quiet).exists())
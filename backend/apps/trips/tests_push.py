@@ -0,0 +1,144 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework import status
+from middleware import throttling
+from apps.users.models import PushDevice
+from apps.trips import push
+from apps.trips.models import Trip, Notification
+
+User = get_user_model()
+
+
+class PairProvider(push.LocmemProvider):
+    max_batch = 2
+
+
+class DepthProvider(push.Provider):
+    """Records how deep in transactions the dispatching connection is."""
+    connection = None
+    depths = []
+
+    def send(self, messages):
+        self.depths.append(len(self.connection.savepoint_ids))
+        return set()
+
+
+LOCMEM = 'apps.trips.push.LocmemProvider'
+
+
+@override_settings(
+    PUSH_PROVIDERS={'android': 'apps.trips.tests_push.PairProvider', 'ios': LOCMEM, 'web': LOCMEM},
+    PUSH_SETTLE_SECONDS=0,
+)
+class PushTests(TestCase):
+    def setUp(self):
+        throttling.get_store().clear()
+        push.LocmemProvider.batches.clear()
+        push.LocmemProvider.invalid.clear()
+        self.client = APIClient()
+        self.alice = User.objects.create_user(username='alice', password='password')
+        self.bob = User.objects.create_user(username='bob', password='password')
+        self.trip = Trip.objects.create(owner=self.bob, title='Paris')
+        self.trip.collaborators.add(self.alice)
+
+    def notify(self, recipient):
+        return Notification.objects.create(
+            recipient=recipient, actor=self.bob, trip=self.trip, verb='sent a message in Paris', target_type='chat',
+        )
+
+    def test_device_registry(self):
+        self.client.force_authenticate(user=self.alice)
+        url = '/api/users/devices/'
+        response = self.client.post(url, {'token': 'tok-1', 'platform': 'android'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.client.post(url, {'token': 'tok-1', 'platform': 'bogus'}).status_code, 400)
+
+        # The same token registered by someone else moves to them
+        self.client.force_authenticate(user=self.bob)
+        response = self.client.post(url, {'token': 'tok-1', 'platform': 'ios'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(PushDevice.objects.get().user, self.bob)
+        self.assertEqual([d['token'] for d in self.client.get(url).data], ['tok-1'])
+
+        self.assertEqual(self.client.delete(url, {'token': 'tok-1'}, format='json').status_code, 204)
+        self.assertFalse(PushDevice.objects.exists())
+
+    def test_dispatch_batches_by_platform(self):
+        self.notify(self.alice)
+        # Notifications from before the first dispatch are not pushed
+        self.assertEqual(push.dispatch(), (0, 0, 0))
+
+        for i in range(3):
+            PushDevice.objects.create(user=self.alice, token=f'a{i}', platform='android')
+        PushDevice.objects.create(user=self.bob, token='b0', platform='ios')
+        first = self.notify(self.alice)
+        self.notify(self.bob)
+
+        # savepoint, cursor, notifications, cursor update, release, devices
+        with self.assertNumQueries(6):
+            self.assertEqual(push.dispatch(), (2, 4, 0))
+        batches = sorted(push.LocmemProvider.batches, key=len)
+        self.assertEqual([len(batch) for batch in batches], [1, 1, 2])
+        token, payload = batches[-1][0]
+        self.assertEqual(payload, {
+            'notification_id': first.id, 'trip_id': str(self.trip.id), 'type': 'chat',
+            'title': 'Paris', 'body': 'bob sent a message in Paris',
+        })
+        self.assertEqual(push.dispatch(), (0, 0, 0))
+
+    def test_young_notifications_wait_to_settle(self):
+        push.dispatch()
+        PushDevice.objects.create(user=self.alice, token='a0', platform='web')
+        self.notify(self.alice)
+        now = timezone.now()
+        with override_settings(PUSH_SETTLE_SECONDS=30):
+            self.assertEqual(push.dispatch(now=now), (0, 0, 0))
+            self.assertEqual(push.dispatch(now=now + timedelta(seconds=31)), (1, 1, 0))
+
+    def test_providers_are_called_outside_the_claim(self):
+        push.dispatch()
+        PushDevice.objects.create(user=self.alice, token='a0', platform='web')
+        self.notify(self.alice)
+        DepthProvider.connection = connections['default']
+        DepthProvider.depths = []
+        depth = len(DepthProvider.connection.savepoint_ids)
+        with override_settings(PUSH_PROVIDERS={'web': 'apps.trips.tests_push.DepthProvider'}):
+            self.assertEqual(push.dispatch(), (1, 1, 0))
+        self.assertEqual(DepthProvider.depths, [depth])
+
+    def test_invalid_tokens_are_removed(self):
+        push.dispatch()
+        PushDevice.objects.create(user=self.alice, token='gone', platform='web')
+        PushDevice.objects.create(user=self.alice, token='live', platform='web')
+        push.LocmemProvider.invalid.add('gone')
+        self.notify(self.alice)
+        self.assertEqual(push.dispatch(), (1, 2, 1))
+        self.assertEqual(list(PushDevice.objects.values_list('token', flat=True)), ['live'])
+
+    def test_not_sent_on_the_request_path(self):
+        push.dispatch()
+        PushDevice.objects.create(user=self.alice, token='a0', platform='web')
+        self.client.force_authenticate(user=self.bob)
+        response = self.client.post(f'/api/chat/trips/{self.trip.id}/chat/', {'message': 'Hi @alice'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(push.LocmemProvider.batches, [])
+        self.assertEqual(push.dispatch(), (1, 1, 0))
+
+    def test_file_provider(self):
+        fd, path = tempfile.mkstemp(suffix='.jsonl')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        with override_settings(PUSH_FILE=path):
+            push.FileProvider().send([('t1', {'body': 'Hi'}), ('t2', {'body': 'Yo'})])
+        with open(path) as f:
+            self.assertEqual([json.loads(line) for line in f], [
+                {'token': 't1', 'body': 'Hi'}, {'token': 't2', 'body': 'Yo'},
+            ])
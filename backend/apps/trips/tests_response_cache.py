@@ -0,0 +1,211 @@
+import tempfile
+import threading
+import time
+
+from middleware import throttling
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework import status
+from apps.trips import response_cache
+from apps.trips.utils.singleflight import SingleFlight, file_lock
+from apps.trips.models import Trip, ItineraryItem
+from apps.polls.models import Poll, PollOption, Vote
+from apps.chat.models import ChatMessage
+
+User = get_user_model()
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        throttling.get_store().clear()
+        response_cache.get_cache().clear()
+        response_cache.reset_metrics()
+        self.client = APIClient()
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', password='password')
+        self.member = User.objects.create_user(username='member', email='member@example.com', password='password')
+
+        self.trip = Trip.objects.create(owner=self.owner, title='Paris')
+        self.trip.collaborators.add(self.member)
+        ItineraryItem.objects.create(trip=self.trip, title='Louvre', order=1, created_by=self.owner)
+        self.poll = Poll.objects.create(trip=self.trip, question='Where?', created_by=self.member)
+        self.option = PollOption.objects.create(poll=self.poll, text='A')
+        self.client.force_authenticate(user=self.owner)
+
+        self.urls = [
+            '/api/trips/',
+            f'/api/trips/{self.trip.id}/',
+            f'/api/trips/{self.trip.id}/dashboard/',
+            f'/api/trips/{self.trip.id}/itinerary/',
+            f'/api/polls/trips/{self.trip.id}/polls/',
+        ]
+
+    def test_second_read_is_served_from_cache(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                self.assertEqual(first['X-Cache'], 'MISS')
+                # Only the version lookup, and has_voted for the shared poll list
+                with self.assertNumQueries(2 if '/polls/' in url else 1):
+                    second = self.client.get(url)
+                self.assertEqual(second['X-Cache'], 'HIT')
+                self.assertEqual(second.json(), first.json())
+                self.assertEqual(second['ETag'], first['ETag'])
+
+        self.assertEqual(response_cache.metrics()['hits'], len(self.urls))
+        self.assertEqual(response_cache.metrics()['misses'], len(self.urls))
+
+    def test_write_invalidates(self):
+        url = f'/api/trips/{self.trip.id}/itinerary/'
+        self.client.get(url)
+        self.client.post(url, {'title': 'Orsay'}, format='json')
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual([item['title'] for item in response.data], ['Louvre', 'Orsay'])
+
+        self.client.get('/api/trips/')
+        self.client.patch(f'/api/trips/{self.trip.id}/', {'title': 'Rome'}, format='json')
+        response = self.client.get('/api/trips/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['title'], 'Rome')
+
+    def test_vote_invalidates_poll_list_per_user(self):
+        url = f'/api/polls/trips/{self.trip.id}/polls/'
+        self.client.get(url)
+        self.client.force_authenticate(user=self.member)
+        self.client.get(url)
+
+        self.client.post(f'/api/polls/polls/{self.poll.id}/vote/', {'option_id': self.option.id}, format='json')
+        self.assertTrue(self.client.get(url).data[0]['has_voted'])
+
+        self.client.force_authenticate(user=self.owner)
+        response = self.client.get(url)
+        self.assertFalse(response.data[0]['has_voted'])
+        self.assertEqual(response.data[0]['options'][0]['vote_count'], 1)
+
+    def test_errors_are_not_cached(self):
+        outsider = User.objects.create_user(username='outsider', password='password')
+        self.client.force_authenticate(user=outsider)
+        url = f'/api/trips/{self.trip.id}/itinerary/'
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response_cache.metrics()['stores'], 0)
+
+    @override_settings(RESPONSE_CACHE_ENABLED=False)
+    def test_disabled(self):
+        self.client.get('/api/trips/')
+        response = self.client.get('/api/trips/')
+        self.assertNotIn('X-Cache', response)
+
+    def test_file_backend_shared_store(self):
+        with tempfile.TemporaryDirectory() as location:
+            caches = {
+                'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                'responses': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location},
+            }
+            with override_settings(CACHES=caches):
+                url = f'/api/trips/{self.trip.id}/'
+                first = self.client.get(url)
+                second = self.client.get(url)
+                self.assertEqual(second['X-Cache'], 'HIT')
+                self.assertEqual(second.json(), first.json())
+
+    def test_shared_across_members(self):
+        ChatMessage.objects.create(trip=self.trip, sender=self.member, message='Hi')
+        chat_url = f'/api/chat/trips/{self.trip.id}/chat/'
+        owner_response = self.client.get(chat_url)
+
+        self.client.force_authenticate(user=self.member)
+        with self.assertNumQueries(1):
+            member_response = self.client.get(chat_url)
+        self.assertEqual(member_response['X-Cache'], 'HIT')
+        self.assertEqual(member_response.json(), owner_response.json())
+        # Conditional GETs stay per user
+        self.assertNotEqual(member_response['ETag'], owner_response['ETag'])
+
+    def test_shared_poll_list_has_voted_per_user(self):
+        Vote.objects.create(poll=self.poll, option=self.option, user=self.member)
+        url = f'/api/polls/trips/{self.trip.id}/polls/'
+        self.assertFalse(self.client.get(url).data[0]['has_voted'])
+
+        self.client.force_authenticate(user=self.member)
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertTrue(response.data[0]['has_voted'])
+
+        # Without ids has_voted cannot be re-applied, so the body is per user
+        response = self.client.get(url + '?fields=question,has_voted')
+        self.assertEqual(response.data, [{'question': 'Where?', 'has_voted': True}])
+        self.client.force_authenticate(user=self.owner)
+        response = self.client.get(url + '?fields=question,has_voted')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertFalse(response.data[0]['has_voted'])
+
+    def test_notifications_cached_per_user(self):
+        url = '/api/trips/notifications/'
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+        self.client.force_authenticate(user=self.member)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+
+
+class SingleFlightTests(TestCase):
+    def run_concurrently(self, flights, fn, count=5):
+        results, errors = [], []
+
+        def call():
+            try:
+                results.append(flights.do('key', fn))
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=call) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        # Everyone but the leader is queued behind it
+        while flights.waiting('key') < count - 1:
+            time.sleep(0.001)
+        return threads, results, errors
+
+    def test_concurrent_calls_share_one_run(self):
+        flights = SingleFlight(timeout=5)
+        release, calls = threading.Event(), []
+
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return 'body'
+
+        threads, results, errors = self.run_concurrently(flights, compute)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [('body', False)] + [('body', True)] * 4)
+        self.assertEqual(flights.waiting('key'), 0)
+
+    def test_waiters_abandoned_when_leader_fails(self):
+        flights = SingleFlight(timeout=5)
+        release = threading.Event()
+
+        def compute():
+            release.wait(5)
+            raise ValueError('boom')
+
+        threads, results, errors = self.run_concurrently(flights, compute, count=3)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [])
+        self.assertEqual(sorted(type(e).__name__ for e in errors), ['Abandoned', 'Abandoned', 'ValueError'])
+
+        # The key is free again
+        self.assertEqual(flights.do('key', lambda: 1), (1, False))
+
+    def test_file_lock_excludes_other_holders(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with file_lock(directory, 'key') as locked:
+                self.assertTrue(locked)
+                with file_lock(directory, 'key', timeout=0) as other:
+                    self.assertFalse(other)
+            with file_lock(directory, 'key', timeout=0) as locked:
+                self.assertTrue(locked)
@@ -0,0 +1,74 @@
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from apps.trips.models import Trip
+from apps.chat.models import ChatMessage
+
+User = get_user_model()
+
+
+class SideloadedUsersTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', password='password')
+        self.members = [
+            User.objects.create_user(username=f'member{i}', email=f'member{i}@example.com', password='password')
+            for i in range(3)
+        ]
+        self.trip = Trip.objects.create(owner=self.owner, title='Paris')
+        self.trip.collaborators.add(*self.members)
+        other = Trip.objects.create(owner=self.members[0], title='Rome')
+        other.collaborators.add(self.owner, self.members[1])
+
+        for i in range(12):
+            ChatMessage.objects.create(trip=self.trip, sender=self.members[i % 3], message=f'Message {i}')
+
+        self.client.force_authenticate(user=self.owner)
+        self.chat_url = f'/api/chat/trips/{self.trip.id}/chat/'
+
+    def get_both(self, url):
+        with override_settings(FAST_READ_SERIALIZERS=False):
+            slow = self.client.get(url)
+        with override_settings(FAST_READ_SERIALIZERS=True):
+            fast = self.client.get(url)
+        self.assertEqual(fast.content, slow.content)
+        return fast
+
+    def test_chat_sideload(self):
+        response = self.get_both(self.chat_url + '?sideload=users')
+        message = response.data['results'][0]
+        self.assertNotIn('sender', message)
+        self.assertEqual(message['sender_id'], self.members[0].id)
+        self.assertEqual(sorted(response.data['users']), sorted(m.id for m in self.members))
+        self.assertEqual(response.data['users'][self.members[0].id], {
+            'id': self.members[0].id, 'username': 'member0', 'email': 'member0@example.com'
+        })
+
+    def test_chat_sideload_queries(self):
+        # trip access, count, page, users
+        with self.assertNumQueries(4):
+            self.client.get(self.chat_url + '?sideload=users')
+
+    def test_trip_sideload(self):
+        response = self.get_both('/api/trips/?sideload=users')
+        trips = {trip['title']: trip for trip in response.data['results']}
+        self.assertEqual(trips['Paris']['owner_id'], self.owner.id)
+        self.assertEqual(trips['Paris']['collaborator_ids'], [m.id for m in self.members])
+        self.assertNotIn('owner', trips['Paris'])
+        # Each user once, with avatar, however many trips reference them
+        self.assertEqual(len(response.data['users']), 4)
+        self.assertIn('avatar', response.data['users'][self.owner.id])
+
+    def test_sideload_with_fields(self):
+        response = self.get_both('/api/trips/?sideload=users&fields=id,owner')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'owner_id'})
+        self.assertEqual(len(response.data['users']), 2)
+
+    def test_default_shape_unchanged(self):
+        response = self.client.get(self.chat_url)
+        self.assertNotIn('users', response.data)
+        self.assertEqual(response.data['results'][0]['sender']['username'], 'member0')
+
+    def test_detail_ignores_sideload(self):
+        response = self.client.get(f'/api/trips/{self.trip.id}/?sideload=users')
+        self.assertEqual(response.data['owner']['username'], 'owner')
@@ -0,0 +1,89 @@
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from apps.trips.models import Trip, ItineraryItem
+from apps.chat.models import ChatMessage
+from apps.polls.models import Poll, PollOption
+
+User = get_user_model()
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', password='password')
+        self.member = User.objects.create_user(username='member', email='member@example.com', password='password')
+
+        self.trip = Trip.objects.create(owner=self.owner, title='Paris')
+        self.trip.collaborators.add(self.member)
+        ItineraryItem.objects.create(trip=self.trip, title='Louvre', order=1, created_by=self.owner)
+        ChatMessage.objects.create(trip=self.trip, sender=self.member, message='Hi')
+        poll = Poll.objects.create(trip=self.trip, question='Where?', created_by=self.member)
+        PollOption.objects.create(poll=poll, text='A')
+        PollOption.objects.create(poll=poll, text='B')
+
+        self.client.force_authenticate(user=self.owner)
+
+    def test_trip_picker(self):
+        """Test ?fields=id,title drops the collaborator and unread queries."""
+        for fast in (True, False):
+            with self.subTest(fast=fast), override_settings(FAST_READ_SERIALIZERS=fast, RESPONSE_CACHE_ENABLED=False):
+                # user version (ETag), count, page
+                with self.assertNumQueries(3):
+                    response = self.client.get('/api/trips/?fields=id,title')
+                self.assertEqual(response.data['results'], [{'id': str(self.trip.id), 'title': 'Paris'}])
+
+    def test_trip_collapsed_relations(self):
+        for fast in (True, False):
+            with self.subTest(fast=fast), override_settings(FAST_READ_SERIALIZERS=fast):
+                response = self.client.get('/api/trips/?fields=id,owner,collaborators&expand=')
+                trip = response.data['results'][0]
+                self.assertEqual(trip['owner'], self.owner.id)
+                self.assertEqual(list(trip['collaborators']), [self.member.id])
+
+                response = self.client.get('/api/trips/?fields=id,owner,collaborators&expand=owner')
+                trip = response.data['results'][0]
+                self.assertEqual(trip['owner']['username'], 'owner')
+                self.assertEqual(list(trip['collaborators']), [self.member.id])
+
+    def test_trip_retrieve(self):
+        # versions (ETag) and the trip; no owner join, collaborator prefetch or unread query
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/trips/{self.trip.id}/?fields=title')
+        self.assertEqual(response.data, {'title': 'Paris'})
+
+    def test_default_unchanged(self):
+        response = self.client.get('/api/trips/')
+        self.assertIn('avatar', response.data['results'][0]['owner'])
+        self.assertEqual(response.data['results'][0]['collaborators'][0]['username'], 'member')
+
+    def test_polls(self):
+        url = f'/api/polls/trips/{self.trip.id}/polls/'
+        # trip access, polls
+        with self.assertNumQueries(2):
+            response = self.client.get(url + '?fields=id,question,created_by&expand=')
+        self.assertEqual(response.data[0], {
+            'id': response.data[0]['id'], 'question': 'Where?', 'created_by': self.member.id
+        })
+
+        response = self.client.get(url + '?fields=id,options,has_voted')
+        self.assertEqual([o['vote_count'] for o in response.data[0]['options']], [0, 0])
+        self.assertFalse(response.data[0]['has_voted'])
+
+    def test_chat(self):
+        url = f'/api/chat/trips/{self.trip.id}/chat/?fields=message,sender&expand='
+        for fast in (True, False):
+            with self.subTest(fast=fast), override_settings(FAST_READ_SERIALIZERS=fast):
+                response = self.client.get(url)
+                self.assertEqual(response.data['results'], [{'sender': self.member.id, 'message': 'Hi'}])
+
+    def test_itinerary(self):
+        response = self.client.get(f'/api/trips/{self.trip.id}/itinerary/?fields=id,title')
+        self.assertEqual(list(response.data[0]), ['id', 'title'])
+
+    def test_writes_ignore_fieldset_for_input(self):
+        response = self.client.post(
+            f'/api/chat/trips/{self.trip.id}/chat/?fields=id', {'message': 'Hello'}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(ChatMessage.objects.filter(message='Hello').count(), 1)
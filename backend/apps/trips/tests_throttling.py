@@ -0,0 +1,106 @@
+import os
+import tempfile
+import threading
+
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework import status
+from middleware import throttling
+from apps.trips.models import Trip
+from apps.users.write_behind import writes
+
+User = get_user_model()
+
+
+class GCRATests(TestCase):
+    def test_burst_then_one_per_interval(self):
+        tat, now = None, 1000.0
+        # 3 per 60s: a burst of 3, then one every 20s
+        for _ in range(3):
+            allowed, tat, wait = throttling.gcra(tat, now, 20, 60)
+            self.assertTrue(allowed)
+        allowed, new_tat, wait = throttling.gcra(tat, now, 20, 60)
+        self.assertFalse(allowed)
+        self.assertIsNone(new_tat)
+        self.assertEqual(wait, 20)
+
+        allowed, _, _ = throttling.gcra(tat, now + 20, 20, 60)
+        self.assertTrue(allowed)
+
+    def test_idle_key_starts_fresh(self):
+        allowed, tat, _ = throttling.gcra(500.0, 1000.0, 20, 60)
+        self.assertTrue(allowed)
+        self.assertEqual(tat, 1020.0)
+
+
+class SQLiteStoreTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.path = os.path.join(directory, 'throttle.sqlite3')
+
+    def test_state_is_shared_between_stores(self):
+        first, second = throttling.SQLiteStore(self.path), throttling.SQLiteStore(self.path)
+        self.assertTrue(first.acquire('key', 30, 60)[0])
+        self.assertTrue(second.acquire('key', 30, 60)[0])
+        allowed, wait = first.acquire('key', 30, 60)
+        self.assertFalse(allowed)
+        self.assertGreater(wait, 0)
+
+    def test_concurrent_acquires_admit_exactly_the_burst(self):
+        admitted = []
+
+        def worker():
+            # A store per thread, like one per worker process
+            store = throttling.SQLiteStore(self.path)
+            for _ in range(10):
+                if store.acquire('key', 6, 60)[0]:
+                    admitted.append(1)
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(admitted), 10)
+
+
+class ScopedThrottleTests(TestCase):
+    def setUp(self):
+        throttling.get_store().clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='owner', email='owner@example.com', password='password')
+        self.trip = Trip.objects.create(owner=self.user, title='Paris')
+        self.client.force_authenticate(user=self.user)
+        self.chat_url = f'/api/chat/trips/{self.trip.id}/chat/'
+
+    def tearDown(self):
+        throttling.get_store().clear()
+        writes.clear()
+
+    def test_chat_send_scope_limits_writes_only(self):
+        for _ in range(30):
+            response = self.client.post(self.chat_url, {'message': 'Hi'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(self.chat_url, {'message': 'Hi'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+
+        self.assertEqual(self.client.get(self.chat_url).status_code, status.HTTP_200_OK)
+
+    def test_login_scope(self):
+        client = APIClient()
+        codes = [
+            client.post('/api/auth/login/', {'identifier': 'owner', 'password': 'wrong'}, format='json').status_code
+            for _ in range(11)
+        ]
+        self.assertNotIn(status.HTTP_429_TOO_MANY_REQUESTS, codes[:10])
+        self.assertEqual(codes[10], status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_sqlite_store_from_settings(self):
+        location = os.path.join(tempfile.mkdtemp(), 'throttle.sqlite3')
+        with override_settings(THROTTLE_STORE='sqlite', THROTTLE_STORE_LOCATION=location):
+            self.assertIsInstance(throttling.get_store(), throttling.SQLiteStore)
+            response = self.client.post(self.chat_url, {'message': 'Hi'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIsInstance(throttling.get_store(), throttling.MemoryStore)
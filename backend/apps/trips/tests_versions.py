@@ -0,0 +1,113 @@
+from middleware import throttling
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework import status
+from apps.trips.models import Trip, ItineraryItem
+from apps.chat.models import ChatMessage
+
+User = get_user_model()
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        # Many requests per test; start from fresh throttle counters
+        throttling.get_store().clear()
+        self.client = APIClient()
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', password='password')
+        self.member = User.objects.create_user(username='member', email='member@example.com', password='password')
+        self.outsider = User.objects.create_user(username='outsider', password='password')
+
+        self.trip = Trip.objects.create(owner=self.owner, title='Paris')
+        self.trip.collaborators.add(self.member)
+        ChatMessage.objects.create(trip=self.trip, sender=self.member, message='Hi')
+        self.client.force_authenticate(user=self.owner)
+
+        self.chat_url = f'/api/chat/trips/{self.trip.id}/chat/'
+        self.itinerary_url = f'/api/trips/{self.trip.id}/itinerary/'
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_not_modified_after_single_lookup(self):
+        for url in (self.chat_url, self.itinerary_url, f'/api/polls/trips/{self.trip.id}/polls/'):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                # trip + membership + versions; no content queries
+                with self.assertNumQueries(1):
+                    response = self.revalidate(url, etag)
+                self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+                self.assertEqual(response['ETag'], etag)
+                self.assertEqual(response.content, b'')
+
+        for url in ('/api/trips/', '/api/trips/notifications/', '/api/trips/notifications/history/'):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                with self.assertNumQueries(1):
+                    response = self.revalidate(url, etag)
+                self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_trip_write_changes_etag(self):
+        etag = self.client.get(self.chat_url)['ETag']
+        self.client.post(self.chat_url, {'message': 'Hello'}, format='json')
+        response = self.revalidate(self.chat_url, etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_other_members_lists_invalidated(self):
+        """Test a message from one member invalidates another's notifications and trip list."""
+        self.client.force_authenticate(user=self.member)
+        trips_etag = self.client.get('/api/trips/')['ETag']
+        notifications_etag = self.client.get('/api/trips/notifications/')['ETag']
+
+        self.client.force_authenticate(user=self.owner)
+        self.client.post(self.chat_url, {'message': 'Hello'}, format='json')
+
+        self.client.force_authenticate(user=self.member)
+        self.assertEqual(self.revalidate('/api/trips/', trips_etag).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.revalidate('/api/trips/notifications/', notifications_etag).status_code, status.HTTP_200_OK)
+
+    def test_membership_and_profile_changes(self):
+        self.client.force_authenticate(user=self.member)
+        etag = self.client.get('/api/trips/')['ETag']
+        self.trip.collaborators.remove(self.member)
+        self.assertEqual(self.revalidate('/api/trips/', etag).status_code, status.HTTP_200_OK)
+
+        self.trip.collaborators.add(self.member)
+        etag = self.client.get('/api/trips/')['ETag']
+        self.client.force_authenticate(user=self.owner)
+        self.client.patch('/api/users/profile/update/', {'avatar': {'color': 'red'}}, format='json')
+        self.client.force_authenticate(user=self.member)
+        self.assertEqual(self.revalidate('/api/trips/', etag).status_code, status.HTTP_200_OK)
+
+    def test_etag_varies_by_params_and_user(self):
+        etag = self.client.get(self.itinerary_url)['ETag']
+        self.assertNotEqual(self.client.get(self.itinerary_url + '?fields=id')['ETag'], etag)
+
+        self.client.force_authenticate(user=self.member)
+        self.assertEqual(self.revalidate(self.itinerary_url, etag).status_code, status.HTTP_200_OK)
+
+    def test_mark_read_changes_trip_detail(self):
+        self.client.force_authenticate(user=self.member)
+        self.client.post(self.chat_url, {'message': 'Unread'}, format='json')
+        self.client.force_authenticate(user=self.owner)
+
+        url = f'/api/trips/{self.trip.id}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.revalidate(url, etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.client.post('/api/trips/notifications/mark-read/', {'trip_id': str(self.trip.id), 'type': 'chat'}, format='json')
+        self.assertEqual(self.revalidate(url, etag).status_code, status.HTTP_200_OK)
+
+    def test_outsider_gets_no_304(self):
+        etag = self.client.get(self.itinerary_url)['ETag']
+        self.client.force_authenticate(user=self.outsider)
+        response = self.revalidate(self.itinerary_url, etag)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn('ETag', response)
+
+    def test_itinerary_reorder_changes_etag(self):
+        item = ItineraryItem.objects.create(trip=self.trip, title='Louvre', order=1, created_by=self.owner)
+        etag = self.client.get(self.itinerary_url)['ETag']
+        item.title = 'Orsay'
+        item.save()
+        self.assertEqual(self.revalidate(self.itinerary_url, etag).status_code, status.HTTP_200_OK)
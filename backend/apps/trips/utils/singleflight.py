@@ -0,0 +1,104 @@
+"""
+Single-flight call coalescing.
+
+    flights = SingleFlight(timeout=10)
+    result, shared = flights.do(key, compute)
+
+Concurrent do() calls with the same key run compute once: the first caller
+runs it, the others block until it finishes and get the same result (with
+shared=True). If the first caller fails or overruns the timeout, the others
+get Abandoned and should do the work themselves.
+
+file_lock() extends this across worker processes on one host: whoever holds
+the lock for a key computes, the rest wait and then find the result in a
+shared cache.
+"""
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Lock files are striped by key hash so the directory stays bounded
+LOCK_STRIPES = 256
+
+
+class Abandoned(Exception):
+    """The call being waited on failed or took too long."""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.failed = False
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Return (result, shared); see the module docstring."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            if not call.done.wait(self.timeout) or call.failed:
+                raise Abandoned(key)
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException:
+            call.failed = True
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def waiting(self, key):
+        """Number of callers waiting on the call in flight for key."""
+        with self._lock:
+            call = self._calls.get(key)
+            return call.waiters if call else 0
+
+
+@contextmanager
+def file_lock(directory, key, timeout=10.0, poll_interval=0.005):
+    """
+    Exclusive flock() on the stripe file for key. Yields True once held, or
+    False if it could not be taken within timeout (the caller goes ahead
+    unlocked rather than failing the request).
+    """
+    import fcntl
+
+    os.makedirs(directory, exist_ok=True)
+    stripe = int(hashlib.sha1(key.encode()).hexdigest(), 16) % LOCK_STRIPES
+    with open(os.path.join(directory, f'{stripe:03d}.lock'), 'a') as handle:
+        deadline = time.monotonic() + timeout
+        locked = False
+        while True:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                locked = True
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    break
+                time.sleep(poll_interval)
+        try:
+            yield locked
+        finally:
+            if locked:
+                fcntl.flock(handle, fcntl.LOCK_UN)
@@ -0,0 +1,176 @@
+"""
+Sparse fieldsets and expansion control.
+
+    GET /api/trips/?fields=id,title
+    GET /api/trips/?fields=id,title,owner&expand=
+
+`fields` limits the top-level keys of each object. `expand` lists the
+relations rendered as nested objects; relations left out of it are rendered
+as ids. Without `expand` every relation is expanded, as before.
+
+    GET /api/chat/trips/{id}/chat/?sideload=users
+
+`sideload=users` normalizes user references: each object carries ids under
+the serializer's `sideloaded_fields` keys (sender -> sender_id) and the
+response gets one `users` map, {id: user}, covering the whole page.
+
+Views mix in SparseFieldsetViewMixin (which puts the request's Fieldset in
+the serializer context) and ask the same Fieldset which joins and prefetches
+are needed. Serializers mix in SparseFieldsMixin and declare
+`collapsed_fields` for their expandable relations.
+"""
+from rest_framework import serializers
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+SIDELOAD_PARAM = 'sideload'
+
+
+def _parse(value):
+    if value is None:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class Fieldset:
+    """The requested fields and expansions; None means "all"."""
+
+    def __init__(self, fields=None, expand=None, sideload=None):
+        self.fields = fields
+        self.expand = expand
+        self.sideload = sideload
+
+    @classmethod
+    def from_request(cls, request):
+        if request is None:
+            return cls()
+        params = getattr(request, 'query_params', request.GET)
+        return cls(
+            _parse(params.get(FIELDS_PARAM)),
+            _parse(params.get(EXPAND_PARAM)),
+            _parse(params.get(SIDELOAD_PARAM)),
+        )
+
+    @property
+    def is_full(self):
+        return self.fields is None and self.expand is None and not self.sideloads_users
+
+    @property
+    def sideloads_users(self):
+        return self.sideload is not None and 'users' in self.sideload
+
+    def includes(self, name):
+        return self.fields is None or name in self.fields
+
+    def expands(self, name):
+        return self.includes(name) and (self.expand is None or name in self.expand)
+
+    def nests_user(self, name):
+        """True if the user relation `name` is rendered as nested objects."""
+        return self.expands(name) and not self.sideloads_users
+
+
+FULL = Fieldset()
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin honouring context['fieldset'] on the top-level object.
+
+    collapsed_fields maps a nested relation to a factory for the field used
+    when it is not expanded, e.g. {'owner': pk_field()}. sideloaded_fields
+    maps user relations to the key their ids are rendered under when users
+    are side-loaded, e.g. {'owner': 'owner_id'}. Writable fields are
+    unaffected; only the output is trimmed.
+    """
+    collapsed_fields = {}
+    sideloaded_fields = {}
+
+    @property
+    def fieldset(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if parent is not None:
+            return FULL
+        return self.context.get('fieldset') or FULL
+
+    def includes(self, name):
+        return self.fieldset.includes(name)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fieldset = self.fieldset
+        if fieldset.is_full:
+            return fields
+        sideloaded = self.sideloaded_fields if fieldset.sideloads_users else {}
+        for name, make_field in self.collapsed_fields.items():
+            if name in fields and fieldset.includes(name) and not fieldset.expands(name):
+                fields[name] = make_field()
+        if sideloaded:
+            # Id keys replace any same-named field (write-only inputs; only
+            # list responses are side-loaded)
+            id_keys = set(sideloaded.values())
+            fields = type(fields)(
+                (sideloaded[name], self.collapsed_fields[name](source=name)) if name in sideloaded else (name, field)
+                for name, field in fields.items()
+                if name not in id_keys
+            )
+        return fields
+
+    @property
+    def _readable_fields(self):
+        fieldset = self.fieldset
+        renamed = {key: name for name, key in self.sideloaded_fields.items()}
+        for field in super()._readable_fields:
+            if fieldset.includes(renamed.get(field.field_name, field.field_name)):
+                yield field
+
+
+class SparseFieldsetViewMixin:
+    """
+    View mixin passing the request's Fieldset to the serializer.
+
+    Views that support side-loading set sideloaded_user_keys (the id keys
+    to collect from each row), implement get_sideloaded_users(ids) and pass
+    their list response through attach_sideloaded_users().
+    """
+    sideloaded_user_keys = ()
+
+    def get_fieldset(self):
+        fieldset = Fieldset.from_request(self.request)
+        if not self.sideloaded_user_keys or getattr(self, 'action', None) != 'list':
+            fieldset.sideload = None
+        return fieldset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fieldset'] = self.get_fieldset()
+        return context
+
+    def get_sideloaded_users(self, user_ids):
+        raise NotImplementedError
+
+    def attach_sideloaded_users(self, response):
+        """Add the `users` map for the rendered rows, if it was requested."""
+        if not self.get_fieldset().sideloads_users:
+            return response
+        rows = response.data['results'] if isinstance(response.data, dict) else response.data
+        user_ids = set()
+        for row in rows:
+            for key in self.sideloaded_user_keys:
+                value = row.get(key)
+                if isinstance(value, list):
+                    user_ids.update(value)
+                elif value is not None:
+                    user_ids.add(value)
+        users = {user['id']: user for user in self.get_sideloaded_users(user_ids)} if user_ids else {}
+        if isinstance(response.data, list):
+            response.data = {'results': response.data}
+        response.data['users'] = users
+        return response
+
+
+def pk_field(**kwargs):
+    """Factory for collapsed_fields: render a relation as its primary key(s)."""
+    return lambda **extra: serializers.PrimaryKeyRelatedField(read_only=True, **kwargs, **extra)
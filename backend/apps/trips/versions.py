@@ -0,0 +1,165 @@
+"""
+Version counters and conditional GETs.
+
+Trip-scoped reads (itinerary, polls, chat, trip detail) are validated by
+TripChangeState.version; user-scoped reads (trip list, notifications) by
+UserChangeState.version. Write paths bump the counters; GET responses carry
+an ETag derived from them, and a request whose If-None-Match still matches
+gets a 304 after the version lookup alone.
+
+Views opt in with ConditionalGetMixin and implement get_etag_versions().
+"""
+import hashlib
+
+from django.db.models import F, Q
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from middleware.request_cache import get_request_cache
+from .models import Trip, TripChangeState, UserChangeState
+
+
+# --- Bumping ----------------------------------------------------------------
+
+def _bump(model, key, ids):
+    ids = {i for i in ids if i is not None}
+    if not ids:
+        return
+    updated = model.objects.filter(**{f'{key}__in': ids}).update(version=F('version') + 1)
+    if updated < len(ids):
+        # Rows that already exist conflict and are left alone
+        model.objects.bulk_create(
+            [model(**{key: i, 'version': 1}) for i in ids],
+            ignore_conflicts=True,
+        )
+
+
+def bump_users(user_ids):
+    """Invalidate the trip list and notifications of these users."""
+    _bump(UserChangeState, 'user_id', user_ids)
+
+
+def bump_trips(trip_ids):
+    """Invalidate trip-scoped reads without recording a change feed entry."""
+    _bump(TripChangeState, 'trip_id', trip_ids)
+
+
+def trip_member_ids(trip_ids):
+    """Owner and collaborator ids of the given trips."""
+    trip_ids = list(trip_ids)
+    owners = Trip.objects.filter(id__in=trip_ids).values_list('owner_id', flat=True)
+    collaborators = Trip.collaborators.through.objects.filter(
+        trip_id__in=trip_ids
+    ).values_list('user_id', flat=True)
+    return set(owners) | set(collaborators)
+
+
+def bump_trip_members(trip_ids, extra_user_ids=()):
+    """Invalidate the user-scoped reads of every member of these trips."""
+    bump_users(trip_member_ids(trip_ids) | set(extra_user_ids))
+
+
+def touch_user(user):
+    """
+    A user's name or avatar changed: every trip they belong to renders it,
+    and so does every co-member's trip list.
+    """
+    trip_ids = list(
+        Trip.objects.filter(Q(owner=user) | Q(collaborators=user)).values_list('id', flat=True).distinct()
+    )
+    bump_trips(trip_ids)
+    bump_trip_members(trip_ids, extra_user_ids=[user.id])
+
+
+# --- Reading ----------------------------------------------------------------
+
+def user_version(request):
+    """The requesting user's version, one query per request."""
+    cache = get_request_cache(request)
+    key = ('user_version', request.user.id)
+    if key not in cache:
+        cache[key] = UserChangeState.objects.filter(
+            user_id=request.user.id
+        ).values_list('version', flat=True).first() or 0
+    return cache[key]
+
+
+def make_etag(request, *versions, per_user=True):
+    """
+    Weak ETag for this request's representation at the given versions.
+    Path, query string and user are part of it: the same versions render
+    differently for another page, fieldset or user. The ETag doubles as the
+    response cache key, so the user is identified by id and join date: a
+    reused id (SQLite reissues the highest deleted one) is a new key.
+
+    per_user=False leaves the user out, for representations every member
+    of the trip shares.
+    """
+    user = request.user
+    raw = '|'.join([
+        request.path,
+        request.META.get('QUERY_STRING', ''),
+        f'{user.id}:{user.date_joined.timestamp()}' if per_user else '*',
+        *(str(v) for v in versions),
+    ])
+    return 'W/"%s"' % hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+
+def _strip_weak(etag):
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def etag_matches(request, etag):
+    """If-None-Match uses weak comparison (RFC 9110 13.1.2)."""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header or etag is None:
+        return False
+    candidates = parse_etags(header)
+    if '*' in candidates:
+        return True
+    return _strip_weak(etag) in {_strip_weak(c) for c in candidates}
+
+
+class NotModified(Exception):
+    pass
+
+
+class ConditionalGetMixin:
+    """
+    Adds ETag / If-None-Match handling to GET actions.
+
+    get_etag_versions() returns the versions the current action's response
+    depends on, or None when it cannot be validated (e.g. no access; the
+    handler then produces the error as usual). It runs after authentication
+    and permission checks, before the handler.
+    """
+    _etag = None
+    _etag_versions = None
+
+    def get_etag_versions(self):
+        return None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._etag = self._etag_versions = None
+        if request.method not in ('GET', 'HEAD'):
+            return
+        versions = self.get_etag_versions()
+        if versions is None:
+            return
+        self._etag_versions = versions
+        self._etag = make_etag(request, *versions)
+        if etag_matches(request, self._etag):
+            raise NotModified()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': self._etag})
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self._etag and response.status_code == status.HTTP_200_OK:
+            response['ETag'] = self._etag
+        return response
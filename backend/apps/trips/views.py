@@ -1,4 +1,4 @@
-from .models import Trip, TripInvite, ItineraryItem, Notification, TripNotificationState
+from .models import Trip, TripInvite, ItineraryItem, Notification, TripNotificationState, TripNotificationPreference
 from .serializers import (
     TripSerializer, 
     AddCollaboratorSerializer, 
@@ -6,45 +6,105 @@ from .serializers import (
     ItineraryItemSerializer, 
     ReorderItinerarySerializer,
     TripInviteSerializer,
-    NotificationSerializer
+    BulkInviteSerializer,
+    NotificationSerializer,
+    NotificationPreferenceSerializer,
+    MutationBatchSerializer
 )
 from rest_framework.views import APIView
 from rest_framework import viewsets, status, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Q, Prefetch
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
-from django.core.mail import send_mail
 from django.conf import settings
 from .permissions import IsOwner, IsOwnerOrCollaborator
+from . import access, changelog, dashboard, invites, outbox, readers, versions
+from .response_cache import CachedResponseMixin
+from .idempotency import idempotent
+from .mutations import MutationBatch
+from apps.users import cards, directory
+from .utils.sparse import SparseFieldsetViewMixin
 
-class TripViewSet(viewsets.ModelViewSet):
+User = get_user_model()
+
+class TripViewSet(CachedResponseMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     ViewSet for Trip management.
+    Reads accept ?fields= and ?expand=, and the list ?sideload=users
+    (see utils/sparse.py). List, detail and dashboard support If-None-Match
+    and are served from the response cache.
     """
     serializer_class = TripSerializer
     permission_classes = [IsAuthenticated]
+    sideloaded_user_keys = ('owner_id', 'collaborator_ids')
+    cached_actions = ('list', 'retrieve', 'dashboard')
+    
+    def get_etag_versions(self):
+        if self.action == 'list':
+            return (versions.user_version(self.request),)
+        if self.action in ('retrieve', 'dashboard'):
+            # Unread counts are per user: notifications on other trips leave
+            # this representation alone, so the user's state for this trip
+            # validates them rather than the user version
+            trip = access.get_accessible_trip(self.request, self.kwargs.get('pk'))
+            if trip is None:
+                return None
+            return (trip.change_version, trip.unread_updated_at)
+        return None
     
     def get_queryset(self):
         user = self.request.user
-        return Trip.objects.filter(
-            Q(owner=user) | Q(collaborators=user)
-        ).select_related('owner').prefetch_related('collaborators', 'notification_states').distinct()
+        fieldset = self.get_fieldset()
+        queryset = Trip.objects.filter(Q(owner=user) | Q(collaborators=user)).distinct()
+        # Only load the relations the response renders
+        if fieldset.nests_user('owner'):
+            queryset = queryset.select_related('owner__profile')
+        if fieldset.includes('collaborators'):
+            users = User.objects.order_by('id')
+            if fieldset.nests_user('collaborators'):
+                users = users.select_related('profile')
+            else:
+                users = users.only('id')
+            queryset = queryset.prefetch_related(Prefetch('collaborators', queryset=users))
+        return queryset
 
     def get_permissions(self):
-        if self.action in ['retrieve']:
+        if self.action in ['retrieve', 'changes', 'mutations', 'notification_preferences']:
             permission_classes = [IsAuthenticated, IsOwnerOrCollaborator]
-        elif self.action in ['update', 'partial_update', 'destroy', 'add_collaborator', 'remove_collaborator', 'invite']:
+        elif self.action in ['update', 'partial_update', 'destroy', 'add_collaborator', 'remove_collaborator', 'invite', 'invite_bulk']:
             # IMPORTANT: Ensure Owners can always access these actions
             permission_classes = [IsAuthenticated, IsOwner]
         else:
             permission_classes = [IsAuthenticated]
         
         return [permission() for permission in permission_classes]
+
+    def list(self, request, *args, **kwargs):
+        if not settings.FAST_READ_SERIALIZERS:
+            return self.attach_sideloaded_users(super().list(request, *args, **kwargs))
+
+        user = request.user
+        fieldset = self.get_fieldset()
+        queryset = self.filter_queryset(
+            Trip.objects.filter(Q(owner=user) | Q(collaborators=user)).distinct()
+        ).values(*readers.trip_reader_for(fieldset).fields)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            response = self.get_paginated_response(readers.render_trips(page, request, fieldset))
+        else:
+            response = Response(readers.render_trips(queryset, request, fieldset))
+        return self.attach_sideloaded_users(response)
+
+    def get_sideloaded_users(self, user_ids):
+        # Each user is rendered once per page, from the card cache
+        return cards.render(user_ids)
     
     @action(detail=True, methods=['post'], url_path='invite')
+    @idempotent('trip.invite', trip_id='pk')
     def invite(self, request, pk=None):
         """
         Send an invitation to join the trip (Email or Username).
@@ -63,31 +123,14 @@ class TripViewSet(viewsets.ModelViewSet):
             )
             serializer.is_valid(raise_exception=True)
             
-            invite = serializer.save(trip=trip)
+            # The email is queued with the invite and delivered by the
+            # outbox worker, not on the request path
+            with transaction.atomic():
+                invite = serializer.save(trip=trip)
+                if invite.invited_email:
+                    outbox.enqueue([invites.invite_email(invite, request.user, trip)])
             logger.info(f"Invite created (ID: {invite.id}) for trip '{trip.title}'")
             
-            # Email Dispatch (Best Effort)
-            target_email = invite.invited_email
-            if target_email:
-                try:
-                    invite_link = f"http://localhost:8000/api/invites/accept/{invite.token}/"
-                    subject = "You're invited to join a trip"
-                    user_text = f"User {request.user.username}"
-                    trip_text = f"'{trip.title}'"
-                    message = f"{user_text} has invited you to join the trip {trip_text}.\n\nClick the link below to join:\n{invite_link}"
-                    
-                    send_mail(
-                        subject,
-                        message,
-                        settings.DEFAULT_FROM_EMAIL or 'noreply@smarttripplanner.com',
-                        [target_email],
-                        fail_silently=False,
-                    )
-                    logger.info(f"Invitation email sent to {target_email}")
-                except Exception as e:
-                    logger.error(f"Failed to send email to {target_email}: {str(e)}")
-                    # Do not fail request
-            
             return Response({
                 'message': 'Invitation sent successfully', 
             }, status=status.HTTP_200_OK)
@@ -116,6 +159,101 @@ class TripViewSet(viewsets.ModelViewSet):
             logger.error(f"Invite API Error: {str(e)}")
             return Response({'detail': 'An error occurred while processing the invitation.'}, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=['post'], url_path='invite/bulk')
+    @idempotent('trip.invite_bulk', trip_id='pk')
+    def invite_bulk(self, request, pk=None):
+        """
+        Invite many usernames and emails at once, with an outcome for each
+        (invites.py).
+        """
+        trip = self.get_object()
+        serializer = BulkInviteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = invites.bulk_invite(trip, request.user, serializer.validated_data['identifiers'])
+        return Response({
+            'invited': sum(result['status'] == 'invited' for result in results),
+            'results': results,
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'], url_path='changes')
+    def changes(self, request, pk=None):
+        """
+        Delta sync feed: upserts and tombstones recorded after ?since=<seq>.
+        Pass the returned cursor as `since` on the next call.
+        """
+        trip = self.get_object()
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = int(request.query_params.get('limit', changelog.DEFAULT_PAGE_SIZE))
+        except ValueError:
+            return Response({'detail': 'since and limit must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+        if since < 0 or limit < 1:
+            return Response({'detail': 'since must be >= 0 and limit >= 1.'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        limit = min(limit, changelog.MAX_PAGE_SIZE)
+        data = changelog.get_changes(trip.id, since, limit=limit)
+        return Response({'trip': str(trip.id), **data})
+
+    @action(detail=True, methods=['get'], url_path='dashboard')
+    def dashboard(self, request, pk=None):
+        """
+        Everything the trip screen needs in one response, built from a
+        fixed number of queries. ?chat_limit= controls how many recent
+        messages are included.
+        """
+        try:
+            chat_limit = int(request.query_params.get('chat_limit', dashboard.DEFAULT_CHAT_LIMIT))
+        except ValueError:
+            return Response({'detail': 'chat_limit must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        chat_limit = max(0, min(chat_limit, dashboard.MAX_CHAT_LIMIT))
+        
+        # Membership is enforced by the lookup itself, so no object permission pass
+        trip = dashboard.get_dashboard_trip(request.user, pk)
+        return Response(dashboard.build_dashboard(trip, request, chat_limit=chat_limit))
+
+    @action(detail=True, methods=['post'], url_path='mutations')
+    def mutations(self, request, pk=None):
+        """
+        Apply a queue of offline operations in one transaction.
+        Returns one result per operation, keyed by its client_id.
+        """
+        trip = self.get_object()
+        serializer = MutationBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        results = MutationBatch(trip, request).apply(serializer.validated_data['operations'])
+        return Response({'results': results})
+
+    @action(detail=True, methods=['get', 'put'], url_path='notification-preferences')
+    def notification_preferences(self, request, pk=None):
+        """
+        The caller's notification level for each type in this trip: all,
+        mentions or muted. PUT accepts any subset of the types.
+        """
+        trip = self.get_object()
+        preferences = TripNotificationPreference.objects.filter(user=request.user, trip=trip)
+        if request.method == 'PUT':
+            serializer = NotificationPreferenceSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            levels = serializer.validated_data
+            # ALL is the default, so it is kept as no row at all
+            preferences.filter(
+                target_type__in=[type for type, level in levels.items() if level == TripNotificationPreference.ALL]
+            ).delete()
+            TripNotificationPreference.objects.bulk_create(
+                [
+                    TripNotificationPreference(user=request.user, trip=trip, target_type=type, level=level)
+                    for type, level in levels.items() if level != TripNotificationPreference.ALL
+                ],
+                update_conflicts=True,
+                unique_fields=['user', 'trip', 'target_type'],
+                update_fields=['level', 'updated_at'],
+            )
+
+        levels = {type: TripNotificationPreference.ALL for type, _ in TripNotificationPreference.TYPE_CHOICES}
+        levels.update(preferences.values_list('target_type', 'level'))
+        return Response(levels)
+
     @action(detail=True, methods=['post'], url_path='add-collaborator')
     def add_collaborator(self, request, pk=None):
         """
@@ -160,7 +298,7 @@ class AcceptInviteView(APIView):
             if request.user != invite.invited_user:
                 return Response({'detail': 'This invitation was meant for a different user.'}, status=status.HTTP_403_FORBIDDEN)
         elif invite.invited_email:
-            if request.user.email != invite.invited_email:
+            if directory.normalize(request.user.email) != invite.invited_email:
                  return Response({'detail': 'This invitation was sent to a different email address.'}, status=status.HTTP_403_FORBIDDEN)
              
         # Add to trip
@@ -191,7 +329,7 @@ class TripInviteViewSet(viewsets.GenericViewSet, viewsets.mixins.ListModelMixin)
         # Fetch invites where the user is explicitly linked
         # OR where the email matches the user's email
         return TripInvite.objects.filter(
-            Q(invited_user=user) | Q(invited_email__iexact=user.email),
+            Q(invited_user=user) | Q(invited_email=directory.normalize(user.email)),
             status='PENDING'
         ).select_related('trip', 'invited_by').order_by('-created_at')
 
@@ -267,23 +405,24 @@ class InviteActionViewSet(viewsets.ViewSet):
         
         return Response({'status': 'DECLINED', 'message': 'Invitation declined.'})
 
-class ItineraryItemViewSet(viewsets.ModelViewSet):
+class ItineraryItemViewSet(CachedResponseMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     serializer_class = ItineraryItemSerializer
     permission_classes = [IsAuthenticated, IsOwnerOrCollaborator]
+    cached_actions = ('list',)
+    shared_actions = ('list',)
+    
+    def get_etag_versions(self):
+        if self.action != 'list':
+            return None
+        trip = self.get_trip()
+        return None if trip is None else (trip.change_version,)
     
     def get_queryset(self):
         trip_pk = self.kwargs.get('trip_pk')
         return ItineraryItem.objects.filter(trip_id=trip_pk).order_by('order')
     
     def get_trip(self):
-        trip_pk = self.kwargs.get('trip_pk')
-        try:
-            trip = Trip.objects.get(pk=trip_pk)
-        except Trip.DoesNotExist:
-            return None
-        if not trip.has_access(self.request.user):
-            return None
-        return trip
+        return access.get_accessible_trip(self.request, self.kwargs.get('trip_pk'))
     
     def list(self, request, *args, **kwargs):
         trip = self.get_trip()
@@ -293,6 +432,7 @@ class ItineraryItemViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
     
+    @idempotent('itinerary.create', trip_id='trip_pk')
     def create(self, request, *args, **kwargs):
         trip = self.get_trip()
         if not trip:
@@ -307,8 +447,8 @@ class ItineraryItemViewSet(viewsets.ModelViewSet):
         try:
             instance = self.get_object()
             user = request.user
-            trip = instance.trip
-            if not (instance.created_by == user or trip.owner == user):
+            trip = access.get_trip(request, instance.trip_id)
+            if not (instance.created_by_id == user.id or trip.owner_id == user.id):
                  return Response({'detail': 'Permission denied.'}, status=status.HTTP_403_FORBIDDEN)
             self.perform_destroy(instance)
             increment_notification_count(trip, request.user, 'itinerary')
@@ -331,17 +471,23 @@ class ItineraryItemViewSet(viewsets.ModelViewSet):
         return Response({'message': 'Reordered successfully.', 'items': item_serializer.data})
 
 
-class NotificationViewSet(viewsets.ViewSet):
+class NotificationViewSet(CachedResponseMixin, viewsets.ViewSet):
     """
     ViewSet for managing User Notifications.
     """
     permission_classes = [IsAuthenticated]
+    cached_actions = ('list', 'history')
+    
+    def get_etag_versions(self):
+        if self.action in ('list', 'history'):
+            return (versions.user_version(self.request),)
+        return None
     
     def list(self, request):
         user = request.user
         
         # 1. Invitation Count (Pending only, matched by email)
-        invite_count = TripInvite.objects.filter(invited_email=user.email, status='PENDING').count()
+        invite_count = TripInvite.objects.filter(invited_email=directory.normalize(user.email), status='PENDING').count()
         
         # 2. Trip Notifications
         states = TripNotificationState.objects.filter(user=user)
@@ -365,6 +511,10 @@ class NotificationViewSet(viewsets.ViewSet):
         from rest_framework.pagination import PageNumberPagination
         paginator = PageNumberPagination()
         paginator.page_size = 20
+        if settings.FAST_READ_SERIALIZERS:
+            rows = notifications.values(*readers.notification_reader.fields)
+            result_page = paginator.paginate_queryset(rows, request)
+            return paginator.get_paginated_response(readers.render_notifications(result_page))
         result_page = paginator.paginate_queryset(notifications, request)
         serializer = NotificationSerializer(result_page, many=True)
         return paginator.get_paginated_response(serializer.data)
@@ -381,6 +531,7 @@ class NotificationViewSet(viewsets.ViewSet):
              elif notif_type == 'poll': state.unread_poll_count = 0
              elif notif_type == 'itinerary': state.unread_itinerary_count = 0
              state.save()
+             versions.bump_users([request.user.id])
              return Response({'status': 'ok'})
         except TripNotificationState.DoesNotExist:
              return Response({'status': 'ok'})
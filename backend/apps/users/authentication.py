@@ -0,0 +1,160 @@
+"""
+Stateless JWT authentication.
+
+simplejwt's JWTAuthentication loads the User row on every request. Tokens
+issued here also carry the username, the join date and a short hash of
+the user's auth state (password and is_active), and StatelessJWTAuthentication
+turns them into a TokenPrincipal: id, pk, username and date_joined come
+from the token, and the User row is only loaded when another attribute is
+touched. ORM filters and foreign-key assignments (owner=request.user) use
+the id without loading it.
+
+Revocation: the current auth hash per user is cached for
+settings.JWT_PRINCIPAL_CHECK_TTL seconds. Saving or deleting a user drops
+the entry, so deactivation and password changes reject existing tokens
+right away in this process and within the TTL in the others.
+
+Tokens without the claims (issued before this) fall back to the database
+lookup.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router
+from django.db.models import Model
+from django.db.models.base import ModelState
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import serializers
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import BlacklistMixin, RefreshToken
+
+from .write_behind import writes
+
+USERNAME_CLAIM = 'username'
+JOINED_CLAIM = 'joined'
+AUTH_CLAIM = 'auth'
+CACHE_PREFIX = 'jwt-auth:'
+
+
+def auth_hash(user):
+    """Changes when the password does; '' for an inactive user."""
+    return user.get_session_auth_hash()[:16] if user.is_active else ''
+
+
+def current_auth_hash(user_id):
+    key = f'{CACHE_PREFIX}{user_id}'
+    value = cache.get(key)
+    if value is None:
+        User = get_user_model()
+        row = User._default_manager.filter(pk=user_id).values_list('password', 'is_active').first()
+        value = auth_hash(User(pk=user_id, password=row[0], is_active=row[1])) if row else ''
+        cache.set(key, value, settings.JWT_PRINCIPAL_CHECK_TTL)
+    return value
+
+
+def forget(user_id):
+    cache.delete(f'{CACHE_PREFIX}{user_id}')
+
+
+class PrincipalRefreshToken(RefreshToken):
+    @classmethod
+    def for_user(cls, user):
+        # Skips BlacklistMixin.for_user: the OutstandingToken row is written
+        # behind (write_behind.py)
+        token = super(BlacklistMixin, cls).for_user(user)
+        token[USERNAME_CLAIM] = user.get_username()
+        token[JOINED_CLAIM] = user.date_joined.timestamp()
+        token[AUTH_CLAIM] = auth_hash(user)
+        writes.outstanding_token(user, token)
+        return token
+
+
+class TokenObtainPairSerializer(serializers.TokenObtainPairSerializer):
+    token_class = PrincipalRefreshToken
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        # In place of UPDATE_LAST_LOGIN, which writes on the request path
+        writes.last_login(self.user.pk, timezone.now())
+        return data
+
+
+class TokenPrincipal(SimpleLazyObject):
+    """
+    request.user built from token claims. Passes isinstance(..., User) and
+    compares equal to the User with the same pk; any attribute the token
+    does not carry loads the row (once).
+    """
+
+    def __init__(self, user_id, username, date_joined):
+        User = get_user_model()
+        super().__init__(lambda: User._default_manager.get(pk=user_id))
+        state = ModelState()
+        state.db = router.db_for_read(User)
+        state.adding = False
+        self.__dict__.update(
+            id=user_id,
+            pk=user_id,
+            username=username,
+            date_joined=date_joined,
+            is_active=True,
+            is_authenticated=True,
+            is_anonymous=False,
+            _state=state,
+        )
+
+    @property
+    def __class__(self):
+        return get_user_model()
+
+    @property
+    def _meta(self):
+        return get_user_model()._meta
+
+    def get_username(self):
+        return self.username
+
+    def __getattr__(self, name):
+        # The ORM probes values (hasattr(value, 'resolve_expression')); a
+        # name the model does not define must not load the row
+        if not hasattr(get_user_model(), name):
+            raise AttributeError(name)
+        return super().__getattr__(name)
+
+    def __eq__(self, other):
+        if not isinstance(other, Model):
+            return NotImplemented
+        return other._meta.concrete_model is self._meta.concrete_model and other.pk == self.pk
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    def __bool__(self):
+        return True
+
+    def __str__(self):
+        return self.username
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        claims = (USERNAME_CLAIM, JOINED_CLAIM, AUTH_CLAIM)
+        if not all(claim in validated_token for claim in claims):
+            return super().get_user(validated_token)
+
+        # simplejwt stores the id as a string
+        user_id = get_user_model()._meta.pk.to_python(validated_token[api_settings.USER_ID_CLAIM])
+        token_hash = validated_token[AUTH_CLAIM]
+        if not token_hash or token_hash != current_auth_hash(user_id):
+            raise AuthenticationFailed(_("User is inactive or the token was revoked"), code="token_revoked")
+        return TokenPrincipal(
+            user_id,
+            validated_token[USERNAME_CLAIM],
+            datetime.fromtimestamp(validated_token[JOINED_CLAIM], tz=dt_timezone.utc),
+        )
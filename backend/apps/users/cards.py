@@ -0,0 +1,130 @@
+"""
+User cards: the id, username, names and avatar UserSerializer renders,
+cached per user id.
+
+Trip lists, notifications and sideloaded users render the same few people
+over and over. get_many() reads their cards from the 'cards' cache and
+loads the misses with one query joining the profile, so a warm page renders
+its users without touching the database.
+
+Saving a user's username or names, or their profile's avatar, drops the
+card (models.py) and bumps the versions behind the ETags of everything that
+renders it (versions.touch_user). Every worker must then miss the card, or
+it would render the old one under the new ETag, so with more than one
+worker settings.USER_CARD_CACHE_BACKEND must be shared (file, the default,
+db or redis).
+
+Each card is stored with the generation of its user read before the card
+was loaded, and invalidate() replaces the generation, again once the save
+commits. A card loaded from the old row by a read racing the save is
+stored under the old generation and never served.
+"""
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import transaction
+
+CACHE_ALIAS = 'cards'
+CACHE_PREFIX = 'user-card:'
+GENERATION_PREFIX = 'user-card-generation:'
+# Saves touching only other columns (last_login, bio) keep the card
+USER_FIELDS = frozenset({'username', 'first_name', 'last_name'})
+PROFILE_FIELDS = frozenset({'avatar_style', 'avatar_color', 'avatar_icon'})
+
+DEFAULT_AVATAR = {
+    'style': 'circle',
+    'color': 'blue',
+    'icon': 'person'
+}
+
+_COLUMNS = (
+    'id', 'username', 'first_name', 'last_name',
+    'profile__avatar_style', 'profile__avatar_color', 'profile__avatar_icon',
+)
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _key(user_id):
+    return f'{CACHE_PREFIX}{user_id}'
+
+
+def _generation_key(user_id):
+    return f'{GENERATION_PREFIX}{user_id}'
+
+
+def _from_row(row):
+    # Users without a profile get the default avatar, as in UserSerializer
+    return {
+        'id': row['id'],
+        'username': row['username'],
+        'first_name': row['first_name'],
+        'last_name': row['last_name'],
+        'avatar': dict(DEFAULT_AVATAR) if row['profile__avatar_style'] is None else {
+            'style': row['profile__avatar_style'],
+            'color': row['profile__avatar_color'],
+            'icon': row['profile__avatar_icon'],
+        },
+    }
+
+
+def get_many(user_ids):
+    """{user_id: card} for the users that exist; one query for the misses."""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return {}
+    cache = get_cache()
+    cached = cache.get_many(
+        [_key(user_id) for user_id in user_ids] + [_generation_key(user_id) for user_id in user_ids]
+    )
+    cards, generations = {}, {}
+    for user_id in user_ids:
+        generation = cached.get(_generation_key(user_id))
+        entry = cached.get(_key(user_id))
+        if generation is not None and entry is not None and entry[0] == generation:
+            cards[user_id] = entry[1]
+        else:
+            generations[user_id] = generation
+
+    if generations:
+        # A user seen for the first time gets a generation before its row is
+        # read; if another worker got there first, this load is not cached
+        for user_id, generation in generations.items():
+            if generation is None:
+                token = uuid.uuid4().hex
+                added = cache.add(_generation_key(user_id), token, settings.USER_CARD_TIMEOUT)
+                generations[user_id] = token if added else None
+        rows = get_user_model()._default_manager.filter(id__in=generations.keys()).values(*_COLUMNS)
+        loaded = {row['id']: _from_row(row) for row in rows}
+        cache.set_many({
+            _key(user_id): (generations[user_id], card)
+            for user_id, card in loaded.items() if generations[user_id] is not None
+        }, settings.USER_CARD_TIMEOUT)
+        cards.update(loaded)
+    return cards
+
+
+def get(user_id):
+    return get_many([user_id]).get(user_id)
+
+
+def render(user_ids):
+    """Cards for the given users ordered by id, as get_sideloaded_users returns them."""
+    cards = get_many(user_ids)
+    return [cards[user_id] for user_id in sorted(cards)]
+
+
+def invalidate(user_id):
+    """
+    Retire the user's card now, for this transaction, and again on commit
+    for reads that loaded the old row in between.
+    """
+    def bump():
+        get_cache().set(_generation_key(user_id), uuid.uuid4().hex, settings.USER_CARD_TIMEOUT)
+
+    bump()
+    transaction.on_commit(bump)
@@ -0,0 +1,99 @@
+"""
+Case-insensitive user lookups and prefix search.
+
+Usernames and emails are matched case-insensitively everywhere (login,
+invites, registration). An iexact filter on auth_user cannot use an index,
+so every lookup here goes through DirectoryEntry, which keeps both values
+lowercased in indexed columns.
+
+Invariant: every user has an entry holding its normalized username and
+email. models.py keeps it on User.save(); writes that skip save() -- a
+queryset update(), bulk_create()/bulk_update(), loading rows with raw SQL --
+leave it stale until rebuild() (`manage.py rebuild_directory`, also run on
+deploy) repairs it, so code that writes users that way must call it.
+
+search() serves the invite dialog's autocomplete from the same index:
+usernames by prefix, emails only as a full address, so the endpoint does
+not let anyone enumerate addresses by prefix.
+"""
+from django.contrib.auth import get_user_model
+from django.db import connection
+
+from .models import DirectoryEntry
+
+User = get_user_model()
+
+MIN_QUERY_LENGTH = 2
+MAX_RESULTS = 20
+
+
+def normalize(value):
+    return (value or '').strip().lower()
+
+
+def rebuild(batch_size=1000):
+    """
+    Create missing entries and correct stale ones, batch_size users at a
+    time. Returns (created, updated).
+    """
+    created = updated = 0
+    users = User.objects.order_by('pk').values_list('pk', 'username', 'email')
+    last_pk = None
+    while True:
+        batch = list((users if last_pk is None else users.filter(pk__gt=last_pk))[:batch_size])
+        if not batch:
+            return created, updated
+        last_pk = batch[-1][0]
+        entries = DirectoryEntry.objects.in_bulk([pk for pk, _, _ in batch])
+        missing, stale = [], []
+        for pk, username, email in batch:
+            values = (normalize(username), normalize(email))
+            entry = entries.get(pk)
+            if entry is None:
+                missing.append(DirectoryEntry(user_id=pk, username=values[0], email=values[1]))
+            elif (entry.username, entry.email) != values:
+                entry.username, entry.email = values
+                stale.append(entry)
+        DirectoryEntry.objects.bulk_create(missing, ignore_conflicts=True)
+        DirectoryEntry.objects.bulk_update(stale, ['username', 'email'])
+        created += len(missing)
+        updated += len(stale)
+
+
+def users_by_username(username):
+    return User.objects.filter(directory_entry__username=normalize(username))
+
+
+def users_by_email(email):
+    return User.objects.filter(directory_entry__email=normalize(email))
+
+
+def _prefix(entries, prefix):
+    if connection.vendor == 'postgresql':
+        # Served by the varchar_pattern_ops index Django adds for db_index
+        return entries.filter(username__startswith=prefix)
+    # A range on the plain index (SQLite's LIKE is not index-assisted)
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return entries.filter(username__gte=prefix, username__lt=upper)
+
+
+def search(query, limit=10, exclude=None):
+    """
+    Active users whose username starts with query, or whose email is
+    query, ordered by username; at most min(limit, MAX_RESULTS). A query
+    shorter than MIN_QUERY_LENGTH matches nothing.
+    """
+    query = normalize(query)
+    if len(query) < MIN_QUERY_LENGTH:
+        return []
+    limit = max(1, min(limit, MAX_RESULTS))
+    entries = DirectoryEntry.objects.filter(user__is_active=True)
+    if exclude is not None:
+        entries = entries.exclude(user_id=exclude)
+
+    ids = list(_prefix(entries, query).order_by('username').values_list('user_id', flat=True)[:limit])
+    if '@' in query and len(ids) < limit:
+        ids += [pk for pk in entries.filter(email=query).values_list('user_id', flat=True)[:limit] if pk not in ids]
+        ids = ids[:limit]
+    users = User.objects.filter(pk__in=ids).select_related('profile').in_bulk()
+    return sorted((users[pk] for pk in ids if pk in users), key=lambda user: normalize(user.username))
@@ -0,0 +1,148 @@
+"""
+Login steps shared by LoginAPIView and AsyncLoginView.
+
+A login is one identity lookup (the profile comes with it), one password
+check and a token pair. Nothing is written on the request path:
+last_login and the refresh token's OutstandingToken row go to the
+write-behind buffer (write_behind.py).
+
+Credentials go through django.contrib.auth.authenticate(), so
+AUTHENTICATION_BACKENDS and the user_login_failed signal apply; LoginBackend
+is the backend that does the lookup and the check.
+
+The async view runs the password hash, the expensive part, on a bounded
+thread pool (settings.LOGIN_HASH_WORKERS); hashlib releases the GIL, so
+concurrent logins hash in parallel without tying up the event loop.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import get_user_model, hashers
+from django.contrib.auth.backends import ModelBackend
+from django.utils import timezone
+
+from . import directory
+from .authentication import PrincipalRefreshToken
+from .models import Profile
+from .write_behind import writes
+
+User = get_user_model()
+
+
+class LoginFailed(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def find_user(identifier):
+    """
+    The user an identifier (username or email, any case) names, with its
+    profile. One indexed lookup (directory.py); an identifier with '@' is
+    tried as an email first, since usernames may contain '@' too.
+    """
+    if '@' in identifier:
+        user = directory.users_by_email(identifier).select_related('profile').order_by('pk').first()
+        if user is not None:
+            return user
+    return directory.users_by_username(identifier).select_related('profile').first()
+
+
+def check_password(user, password):
+    """
+    (valid, needs_rehash) without touching the database. A missing user
+    still costs one hash, so timing does not reveal which identifiers exist.
+    """
+    if user is None:
+        hashers.make_password(password)
+        return False, False
+    rehash = []
+    valid = hashers.check_password(password, user.password, setter=lambda raw: rehash.append(True))
+    return valid, bool(rehash)
+
+
+def _rehash(user, password):
+    # The hasher's parameters changed since the password was stored
+    user.set_password(password)
+    user.save(update_fields=['password'])
+
+
+class LoginBackend(ModelBackend):
+    """
+    Username-or-email credentials (identifier=, password=) in one indexed
+    lookup and one hash, refusing users ModelBackend.user_can_authenticate
+    refuses. Other credentials (the admin's username=) fall through to the
+    next backend.
+    """
+
+    def authenticate(self, request, identifier=None, password=None):
+        if identifier is None or password is None:
+            return None
+        # aauthenticate() has done the lookup and the hash already
+        checked = getattr(request, 'login_checked', None)
+        if checked is None:
+            user = find_user(identifier)
+            valid, rehash = check_password(user, password)
+        else:
+            user, valid, rehash = checked
+        if not valid or not self.user_can_authenticate(user):
+            return None
+        if rehash:
+            _rehash(user, password)
+        return user
+
+
+def _checked(user):
+    if user is None:
+        raise LoginFailed('Invalid credentials.', 401)
+    # Only reached with a backend that lets inactive users authenticate
+    if not user.is_active:
+        raise LoginFailed('Account disabled.', 403)
+    return user
+
+
+def authenticate(request, identifier, password):
+    """The active user for these credentials; raises LoginFailed."""
+    return _checked(auth.authenticate(request, identifier=identifier, password=password))
+
+
+_hash_pool = ThreadPoolExecutor(max_workers=settings.LOGIN_HASH_WORKERS, thread_name_prefix='login-hash')
+
+
+async def aauthenticate(request, identifier, password):
+    user = await sync_to_async(find_user)(identifier)
+    loop = asyncio.get_running_loop()
+    valid, rehash = await loop.run_in_executor(_hash_pool, check_password, user, password)
+    request.login_checked = (user, valid, rehash)
+    return _checked(await sync_to_async(auth.authenticate)(request, identifier=identifier, password=password))
+
+
+def login_payload(user):
+    """Tokens and user data for the response; records the login."""
+    refresh = PrincipalRefreshToken.for_user(user)
+    writes.last_login(user.pk, timezone.now())
+
+    try:
+        profile = user.profile
+    except Profile.DoesNotExist:
+        profile = Profile.objects.create(user=user)
+    return {
+        'access': str(refresh.access_token),
+        'refresh': str(refresh),
+        'user': {
+            'id': user.id,
+            'username': user.username,
+            'email': user.email,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'avatar': {
+                'style': profile.avatar_style,
+                'color': profile.avatar_color,
+                'icon': profile.avatar_icon,
+            },
+        },
+    }
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_directory(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    DirectoryEntry = apps.get_model("users", "DirectoryEntry")
+    rows = User.objects.values_list("pk", "username", "email").iterator(chunk_size=2000)
+    batch = []
+    for pk, username, email in rows:
+        batch.append(DirectoryEntry(user_id=pk, username=username.strip().lower(), email=(email or "").strip().lower()))
+        if len(batch) == 2000:
+            DirectoryEntry.objects.bulk_create(batch)
+            batch = []
+    DirectoryEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("users", "0003_profile_avatar_color_profile_avatar_icon_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DirectoryEntry",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="directory_entry",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("username", models.CharField(db_index=True, max_length=150)),
+                ("email", models.CharField(blank=True, db_index=True, max_length=254)),
+            ],
+        ),
+        migrations.RunPython(fill_directory, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:43
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0004_user_directory"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="profile",
+            name="otp",
+        ),
+        migrations.RemoveField(
+            model_name="profile",
+            name="otp_created_at",
+        ),
+    ]
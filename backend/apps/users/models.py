@@ -1,6 +1,6 @@
 from django.db import models
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
 User = get_user_model()
@@ -12,10 +12,6 @@ class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     bio = models.TextField(max_length=500, blank=True)
     phone_number = models.CharField(max_length=20, blank=True)
-    
-    # OTP Fields
-    otp = models.CharField(max_length=6, blank=True, null=True)
-    otp_created_at = models.DateTimeField(null=True, blank=True)
 
     # Avatar Fields (Bitmoji Style)
     avatar_style = models.CharField(max_length=20, default='circle') # circle, transparent
@@ -26,14 +22,74 @@ class Profile(models.Model):
     def __str__(self):
         return f"Profile of {self.user.username}"
 
+
+class DirectoryEntry(models.Model):
+    """
+    A user's username and email, lowercased and indexed: the
+    case-insensitive lookups and prefix search in directory.py run on
+    these columns, on every database backend. Kept in sync by
+    sync_directory_entry on User.save() only; see directory.rebuild() for
+    writes that bypass it.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='directory_entry')
+    username = models.CharField(max_length=150, db_index=True)
+    email = models.CharField(max_length=254, db_index=True, blank=True)
+
+    def __str__(self):
+        return self.username
+
+
+class PushDevice(models.Model):
+    """
+    A device registered for push notifications (apps/trips/push.py). A
+    token belongs to one user: registering it again moves it.
+    """
+    PLATFORM_CHOICES = [
+        ('android', 'Android'),
+        ('ios', 'iOS'),
+        ('web', 'Web'),
+    ]
+
+    token = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='push_devices')
+    platform = models.CharField(max_length=10, choices=PLATFORM_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_seen_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.platform} device of {self.user_id}"
+
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance)
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    try:
-        instance.profile.save()
-    except Profile.DoesNotExist:
-        Profile.objects.create(user=instance)
+def sync_directory_entry(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not {'username', 'email'} & set(update_fields):
+        return
+    from .directory import normalize
+    values = {'username': normalize(instance.username), 'email': normalize(instance.email)}
+    if created or not DirectoryEntry.objects.filter(user=instance).update(**values):
+        DirectoryEntry.objects.create(user=instance, **values)
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_auth_state(sender, instance, **kwargs):
+    # Tokens are checked against the cached auth state (authentication.py)
+    from .authentication import forget
+    forget(instance.pk)
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user_card(sender, instance, update_fields=None, **kwargs):
+    from . import cards
+    if update_fields is None or cards.USER_FIELDS & set(update_fields):
+        cards.invalidate(instance.pk)
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def forget_profile_card(sender, instance, update_fields=None, **kwargs):
+    from . import cards
+    if update_fields is None or cards.PROFILE_FIELDS & set(update_fields):
+        cards.invalidate(instance.user_id)
@@ -0,0 +1,108 @@
+"""
+One-time codes for phone verification.
+
+    POST /api/users/profile/generate-otp/   {"phone_number": "+4470..."}
+    PUT  /api/users/profile/update/         {"phone_number": "+4470...", "otp": "123456"}
+
+Codes live in the 'otp' cache (settings.OTP_CACHE_BACKEND), not on the
+Profile row: requesting one writes a single cache key, and the profile is
+only saved once a code is verified. Each code is drawn with `secrets`,
+stored as an HMAC bound to the user and phone number, expires after
+settings.OTP_TTL seconds and allows settings.OTP_MAX_ATTEMPTS guesses.
+
+Codes are delivered by settings.OTP_SENDER: ConsoleSender logs them,
+LocmemSender keeps them in LocmemSender.outbox for tests.
+"""
+import logging
+import secrets
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'otp:'
+DIGITS = 6
+
+
+class OTPError(Exception):
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+class ConsoleSender:
+    def send(self, phone_number, message):
+        logger.info("SMS to %s: %s", phone_number or '(no phone)', message)
+
+
+class LocmemSender:
+    """Keeps messages in LocmemSender.outbox, like Django's locmem email backend."""
+    outbox = []
+
+    def send(self, phone_number, message):
+        self.outbox.append((phone_number, message))
+
+
+def get_sender():
+    return import_string(settings.OTP_SENDER)()
+
+
+def _cache():
+    return caches['otp']
+
+
+def _keys(user_id):
+    return f'{CACHE_PREFIX}{user_id}', f'{CACHE_PREFIX}{user_id}:attempts'
+
+
+def _digest(user_id, phone_number, code):
+    return salted_hmac('apps.users.otp', f'{user_id}:{phone_number}:{code}').hexdigest()
+
+
+def generate():
+    return f'{secrets.randbelow(10 ** DIGITS):0{DIGITS}d}'
+
+
+def request(user, phone_number):
+    """
+    Send a new code to `phone_number`, valid only for that number, replacing
+    the user's previous code and its attempt count.
+    """
+    code = generate()
+    entry_key, attempts_key = _keys(user.pk)
+    _cache().set_many({
+        entry_key: {'digest': _digest(user.pk, phone_number, code), 'phone': phone_number},
+        attempts_key: 0,
+    }, settings.OTP_TTL)
+    get_sender().send(phone_number, f"Your verification code is {code}")
+
+
+def verify(user, phone_number, code):
+    """
+    Consume the user's code for `phone_number`; raises OTPError when it is
+    wrong, expired or out of attempts.
+    """
+    cache = _cache()
+    entry_key, attempts_key = _keys(user.pk)
+    entry = cache.get(entry_key)
+    if entry is None or not code:
+        raise OTPError("Invalid OTP.")
+
+    try:
+        attempts = cache.incr(attempts_key)
+    except ValueError:
+        # The counter expired with (or was evicted before) the code
+        attempts = settings.OTP_MAX_ATTEMPTS + 1
+    if attempts > settings.OTP_MAX_ATTEMPTS:
+        cache.delete_many([entry_key, attempts_key])
+        raise OTPError("Too many attempts. Request a new code.")
+
+    # A code proves ownership only of the number it was sent to
+    if not entry['phone'] or entry['phone'] != phone_number or not constant_time_compare(
+        entry['digest'], _digest(user.pk, entry['phone'], code)
+    ):
+        raise OTPError("Invalid OTP.")
+    cache.delete_many([entry_key, attempts_key])
@@ -1,9 +1,20 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import Profile
+from utils.loaders import BatchLoader, BatchLoadingMixin, BatchLoadingListSerializer
+from . import cards, directory
+from .cards import DEFAULT_AVATAR
+from .models import Profile, PushDevice
 
 User = get_user_model()
 
+
+class UserCardLoader(BatchLoader):
+    """User cards keyed by user id, through the card cache (cards.py)."""
+
+    def fetch(self, user_ids):
+        return cards.get_many(user_ids)
+
+
 class LoginSerializer(serializers.Serializer):
     """
     Login serializer accepting identifier (username/email) and password.
@@ -40,7 +51,7 @@ class RegisterSerializer(serializers.ModelSerializer):
 
     def validate_username(self, value):
         username = value.lower()
-        if User.objects.filter(username__iexact=username).exists():
+        if directory.users_by_username(username).exists():
              raise serializers.ValidationError("Username already taken.")
         return username
 
@@ -56,7 +67,17 @@ class RegisterSerializer(serializers.ModelSerializer):
         return user
 
 class OTPRequestSerializer(serializers.Serializer):
-    pass 
+    # The number the code is sent to, and the only one it verifies
+    phone_number = serializers.CharField(max_length=20)
+
+class PushDeviceSerializer(serializers.ModelSerializer):
+    # Re-registering a token moves it, so it is not validated as unique here
+    token = serializers.CharField(max_length=255)
+
+    class Meta:
+        model = PushDevice
+        fields = ['token', 'platform', 'created_at', 'last_seen_at']
+        read_only_fields = ['created_at', 'last_seen_at']
 
 class UpdateProfileSerializer(serializers.Serializer):
     first_name = serializers.CharField(required=False, allow_blank=True, allow_null=True)
@@ -66,15 +87,24 @@ class UpdateProfileSerializer(serializers.Serializer):
     otp = serializers.CharField(required=False, min_length=6, max_length=6, allow_blank=True, allow_null=True)
     avatar = serializers.DictField(required=False, allow_null=True)
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(BatchLoadingMixin, serializers.ModelSerializer):
     avatar = serializers.SerializerMethodField()
     
     class Meta:
         model = User
         fields = ['id', 'username', 'first_name', 'last_name', 'avatar']
         read_only_fields = ['id', 'username', 'first_name', 'last_name']
+        list_serializer_class = BatchLoadingListSerializer
+
+    def get_loader_keys(self, obj):
+        # Profiles joined by the view (select_related) need no lookup
+        if 'profile' not in obj._state.fields_cache:
+            yield UserCardLoader, obj.id
 
     def get_avatar(self, obj):
+        if 'profile' not in obj._state.fields_cache:
+            card = self.loader(UserCardLoader).load(obj.id)
+            return dict(card['avatar'] if card else DEFAULT_AVATAR)
         try:
             return {
                 'style': obj.profile.avatar_style,
@@ -82,8 +112,4 @@ class UserSerializer(serializers.ModelSerializer):
                 'icon': obj.profile.avatar_icon
             }
         except Profile.DoesNotExist:
-             return {
-                'style': 'circle',
-                'color': 'blue',
-                'icon': 'person'
-             }
+             return dict(DEFAULT_AVATAR)
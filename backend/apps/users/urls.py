@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ProfileViewSet, RegisterView
+from .views import ProfileViewSet, PushDeviceView, RegisterView, UserSearchView
 
 app_name = 'users'
 
@@ -9,5 +9,7 @@ router.register(r'profile', ProfileViewSet, basename='profile')
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
+    path('search/', UserSearchView.as_view(), name='search'),
+    path('devices/', PushDeviceView.as_view(), name='push-devices'),
     path('', include(router.urls)),
 ]
@@ -1,24 +1,34 @@
-import random
-from django.utils import timezone
-from django.contrib.auth import authenticate, get_user_model
-from django.db.models import Q
+import json
+import logging
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django.contrib.auth import get_user_model
 from rest_framework import viewsets, status, generics
 from rest_framework.views import APIView
 from rest_framework.decorators import action
+from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework_simplejwt.tokens import RefreshToken
 
-from .models import Profile
+from apps.trips import versions
+from middleware.throttling import AnonRateThrottle, ScopedRateThrottle
+from . import directory, login, otp
+from .models import Profile, PushDevice
 from .serializers import (
     ProfileSerializer, 
     OTPRequestSerializer, 
     UpdateProfileSerializer,
     RegisterSerializer,
-    LoginSerializer
+    LoginSerializer,
+    UserSerializer,
+    PushDeviceSerializer,
 )
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 
 class LoginAPIView(APIView):
     """
@@ -29,6 +39,7 @@ class LoginAPIView(APIView):
     """
     permission_classes = [AllowAny]
     serializer_class = LoginSerializer
+    throttle_scope = 'login'
 
     def post(self, request, *args, **kwargs):
         try:
@@ -47,68 +58,17 @@ class LoginAPIView(APIView):
             identifier = serializer.validated_data['identifier']
             password = serializer.validated_data['password']
 
-            # 2. FIND USER (Safe Lookup)
-            user_obj = User.objects.filter(
-                Q(username__iexact=identifier) | 
-                Q(email__iexact=identifier)
-            ).first()
-
-            if not user_obj:
-                # Security: Consistent timing/message could be improved, but requirement is 401 JSON
-                return Response(
-                    {'error': 'Invalid credentials.'}, 
-                    status=status.HTTP_401_UNAUTHORIZED
-                )
-            
-            # 3. AUTHENTICATE (Django Native)
-            # We explicitly pass the *username* of the found user to authenticate
-            # This ensures compatibility with ModelBackend which expects 'username'
-            user = authenticate(request=request, username=user_obj.username, password=password)
-
-            if not user:
-                return Response(
-                    {'error': 'Invalid credentials.'}, 
-                    status=status.HTTP_401_UNAUTHORIZED
-                )
-
-            if not user.is_active:
-                return Response(
-                    {'error': 'Account disabled.'}, 
-                    status=status.HTTP_403_FORBIDDEN
-                )
-
-            # 4. TOKEN GENERATION (SimpleJWT Manual)
-            refresh = RefreshToken.for_user(user)
-            
-            # 5. USER DATA PREPARATION
-            user_data = {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'first_name': user.first_name,
-                'last_name': user.last_name,
-            }
-
-            # Safe Profile Access
+            # 2. AUTHENTICATE (one lookup, one hash; apps/users/login.py)
             try:
-                profile, _ = Profile.objects.get_or_create(user=user)
-                user_data['avatar'] = {
-                    'style': profile.avatar_style,
-                    'color': profile.avatar_color,
-                    'icon': profile.avatar_icon
-                }
-            except Exception:
-                user_data['avatar'] = None
-
-            # 6. SUCCESS RESPONSE
-            return Response({
-                'access': str(refresh.access_token),
-                'refresh': str(refresh),
-                'user': user_data
-            }, status=status.HTTP_200_OK)
+                user = login.authenticate(request, identifier, password)
+            except login.LoginFailed as e:
+                return Response({'error': e.message}, status=e.status_code)
+
+            # 3. TOKENS AND USER DATA (last_login is written behind)
+            return Response(login.login_payload(user), status=status.HTTP_200_OK)
 
         except Exception as e:
-            # 7. CRITICAL ERROR SAFETY
+            # 4. CRITICAL ERROR SAFETY
             # Log the error with full traceback
             import traceback
             import logging
@@ -123,12 +83,74 @@ class LoginAPIView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncLoginView(View):
+    """
+    LoginAPIView for ASGI workers (settings.ASYNC_LOGIN): same contract and
+    throttles, but the password hash runs on login's bounded thread pool
+    and the database steps in sync_to_async, so a worker keeps serving
+    other requests while logins hash.
+    """
+    throttle_scope = 'login'
+    throttle_classes = (AnonRateThrottle, ScopedRateThrottle)
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            throttled = await sync_to_async(self.check_throttles, thread_sensitive=False)(request)
+            if throttled is not None:
+                return throttled
+
+            try:
+                data = json.loads(request.body or b'null')
+            except ValueError:
+                data = None
+            if not data:
+                return JsonResponse({'error': 'Empty request body.'}, status=status.HTTP_400_BAD_REQUEST)
+            serializer = LoginSerializer(data=data)
+            if not serializer.is_valid():
+                errors = [f"{field}: {msgs[0]}" for field, msgs in serializer.errors.items()]
+                return JsonResponse({'error': ' '.join(errors)}, status=status.HTTP_400_BAD_REQUEST)
+
+            try:
+                user = await login.aauthenticate(
+                    request, serializer.validated_data['identifier'], serializer.validated_data['password']
+                )
+            except login.LoginFailed as e:
+                return JsonResponse({'error': e.message}, status=e.status_code)
+            payload = await sync_to_async(login.login_payload)(user)
+            return JsonResponse(payload, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            logger.exception("LOGIN CRASH PREVENTED: %s", e)
+            return JsonResponse(
+                {'error': f'An unexpected error occurred: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+    def check_throttles(self, request):
+        drf_request = Request(request)
+        for throttle in (throttle_class() for throttle_class in self.throttle_classes):
+            if not throttle.allow_request(drf_request, self):
+                wait = throttle.wait()
+                response = JsonResponse(
+                    {'detail': 'Request was throttled.'}, status=status.HTTP_429_TOO_MANY_REQUESTS
+                )
+                if wait is not None:
+                    response['Retry-After'] = str(int(wait) + 1)
+                return response
+        return None
+
+
 class ProfileViewSet(viewsets.GenericViewSet):
     permission_classes = [IsAuthenticated]
     
     def get_object(self):
-        profile, created = Profile.objects.get_or_create(user=self.request.user)
-        return profile
+        # One query with the user ProfileSerializer renders; profiles are
+        # created with their user, so the create is only for old accounts
+        try:
+            return Profile.objects.select_related('user').get(user_id=self.request.user.id)
+        except Profile.DoesNotExist:
+            return Profile.objects.create(user=self.request.user)
     
     @action(detail=False, methods=['get'])
     def me(self, request):
@@ -138,12 +160,10 @@ class ProfileViewSet(viewsets.GenericViewSet):
     
     @action(detail=False, methods=['post'], url_path='generate-otp')
     def generate_otp(self, request):
-        profile = self.get_object()
-        otp = str(random.randint(100000, 999999))
-        profile.otp = otp
-        profile.otp_created_at = timezone.now()
-        profile.save()
-        print(f"OTP for {request.user.username}: {otp}")
+        # Only the code's cache entry is written (otp.py)
+        serializer = OTPRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        otp.request(request.user, serializer.validated_data['phone_number'])
         return Response({'message': 'OTP sent.'})
     
     @action(detail=False, methods=['put', 'patch'], url_path='update')
@@ -154,11 +174,11 @@ class ProfileViewSet(viewsets.GenericViewSet):
         
         new_phone = serializer.validated_data.get('phone_number')
         if new_phone and new_phone != profile.phone_number:
-            otp = serializer.validated_data.get('otp')
-            if not otp or otp != profile.otp:
-                 return Response({'otp': 'Invalid OTP.'}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                otp.verify(request.user, new_phone, serializer.validated_data.get('otp'))
+            except otp.OTPError as e:
+                return Response({'otp': e.message}, status=status.HTTP_400_BAD_REQUEST)
             profile.phone_number = new_phone
-            profile.otp = None
         
         user = request.user
         if 'first_name' in serializer.validated_data:
@@ -177,8 +197,62 @@ class ProfileViewSet(viewsets.GenericViewSet):
             profile.avatar_icon = av.get('icon', profile.avatar_icon)
             
         profile.save()
+        # Names and avatars are rendered in every trip the user belongs to
+        versions.touch_user(user)
         return Response(ProfileSerializer(profile).data)
 
+class UserSearchView(APIView):
+    """
+    Autocomplete for the invite dialog.
+    GET /api/users/search/?q=ali&limit=10
+
+    Active users whose username starts with q (any case) or whose email is
+    q, ordered by username; at most 20. q needs 2 characters.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return Response({'limit': 'Must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        users = directory.search(request.query_params.get('q', ''), limit=limit, exclude=request.user.pk)
+        return Response(UserSerializer(users, many=True).data)
+
+
+class PushDeviceView(APIView):
+    """
+    Push notification devices of the current user (apps/trips/push.py).
+    GET lists them; POST {"token": ..., "platform": "android"} registers one,
+    taking the token over from any other user; DELETE {"token": ...}
+    unregisters one, e.g. on logout.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        devices = PushDevice.objects.filter(user_id=request.user.id).order_by('-last_seen_at')
+        return Response(PushDeviceSerializer(devices, many=True).data)
+
+    def post(self, request):
+        serializer = PushDeviceSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        device, created = PushDevice.objects.update_or_create(
+            token=serializer.validated_data['token'],
+            defaults={'user_id': request.user.id, 'platform': serializer.validated_data['platform']},
+        )
+        return Response(
+            PushDeviceSerializer(device).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
+    def delete(self, request):
+        token = request.data.get('token')
+        if not token:
+            return Response({'token': 'This field is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        PushDevice.objects.filter(user_id=request.user.id, token=token).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     permission_classes = (AllowAny,)
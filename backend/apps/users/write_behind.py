@@ -0,0 +1,128 @@
+"""
+Write-behind buffer for the writes a login makes.
+
+last_login and the refresh token's OutstandingToken row are not needed to
+answer the login, so they are queued here and applied in batches by a
+flusher thread, started in each process on its first login: every
+settings.LOGIN_WRITE_INTERVAL seconds, as soon as LOGIN_WRITE_BATCH entries
+are pending, and at exit. Logins only queue and never wait for a flush.
+
+A worker killed without exiting (SIGKILL, gunicorn's timeout) loses what it
+queued in the last interval. Blacklisting a refresh token creates its
+OutstandingToken row if it is missing, so a lost row only drops the token
+from its user's list; a lost last_login is overwritten by the next login.
+
+With settings.LOGIN_WRITE_THREAD off (tests) the login that finds a batch
+due flushes it itself.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+class WriteBehindBuffer:
+    """
+    Collects login writes and applies them in batches: one UPDATE for the
+    last_login values, one INSERT for the outstanding tokens.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_logins = {}
+        self._tokens = []
+        self._flushed_at = time.monotonic()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._flusher = None
+
+    def last_login(self, user_id, when):
+        with self._lock:
+            self._last_logins[user_id] = when
+        self._maybe_flush()
+
+    def outstanding_token(self, user, token):
+        with self._lock:
+            self._tokens.append(OutstandingToken(
+                user_id=user.pk,
+                jti=token['jti'],
+                token=str(token),
+                created_at=token.current_time,
+                expires_at=datetime_from_epoch(token['exp']),
+            ))
+        self._maybe_flush()
+
+    def pending(self):
+        with self._lock:
+            return len(self._last_logins) + len(self._tokens)
+
+    def clear(self):
+        """Drop pending writes without applying them."""
+        with self._lock:
+            self._last_logins, self._tokens = {}, []
+            self._flushed_at = time.monotonic()
+
+    def _maybe_flush(self):
+        full = self.pending() >= settings.LOGIN_WRITE_BATCH
+        if settings.LOGIN_WRITE_THREAD:
+            self._start()
+            if full:
+                self._wake.set()
+        elif full or time.monotonic() - self._flushed_at >= settings.LOGIN_WRITE_INTERVAL:
+            self.flush()
+
+    def _start(self):
+        # A forked worker inherits the object but not the thread
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is None or not self._flusher.is_alive():
+                self._stopping.clear()
+                self._flusher = threading.Thread(target=self._run, name='login-write-behind', daemon=True)
+                self._flusher.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(settings.LOGIN_WRITE_INTERVAL)
+            self._wake.clear()
+            self.flush()
+            # The thread's own connection; reopened on the next flush
+            connection.close()
+
+    def stop(self):
+        """Flush what is pending and stop the flusher thread."""
+        flusher = self._flusher
+        if flusher is not None:
+            self._stopping.set()
+            self._wake.set()
+            flusher.join()
+            self._flusher = None
+
+    def flush(self):
+        with self._lock:
+            last_logins, self._last_logins = self._last_logins, {}
+            tokens, self._tokens = self._tokens, []
+            self._flushed_at = time.monotonic()
+        # Also runs inside the login that found a batch due: never fail it
+        try:
+            if last_logins:
+                users = [User(pk=pk, last_login=when) for pk, when in last_logins.items()]
+                User.objects.bulk_update(users, ['last_login'])
+            if tokens:
+                OutstandingToken.objects.bulk_create(tokens, ignore_conflicts=True)
+        except Exception:
+            logger.exception("Could not flush %d buffered login writes", len(last_logins) + len(tokens))
+
+
+writes = WriteBehindBuffer()
+atexit.register(writes.flush)
@@ -10,3 +10,6 @@ python manage.py collectstatic --no-input
 
 # Apply any outstanding database migrations
 python manage.py migrate
+
+# Repair directory entries for users written without User.save()
+python manage.py rebuild_directory
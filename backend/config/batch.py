@@ -0,0 +1,160 @@
+"""
+Request multiplexing endpoint.
+
+POST /api/batch/
+Body: {"requests": [{"id": "trips", "path": "/api/trips/"}, ...]}
+
+On app launch the client needs 6-10 independent GETs. This endpoint runs
+them in-process through the URL resolver in a single round trip:
+- JWT authentication happens once; sub-requests reuse the resolved user
+- Sub-requests share one request-scoped cache (see middleware.request_cache)
+- The middleware stack and request log run once for the whole batch
+
+Only GET sub-requests under /api/ are accepted. Each one fails on its own:
+an unhandled error in a view becomes that item's 500, not the envelope's.
+Async views (AsyncLoginView under settings.ASYNC_LOGIN) are run to
+completion with async_to_sync.
+"""
+import copy
+import json
+import logging
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.http import HttpResponse, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework import serializers, status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+
+from middleware.request_cache import get_request_cache
+
+logger = logging.getLogger(__name__)
+
+
+class BatchItemSerializer(serializers.Serializer):
+    id = serializers.CharField(max_length=64)
+    path = serializers.CharField(max_length=2000)
+
+    def validate_path(self, value):
+        if not value.startswith('/api/') or value.startswith('/api/batch/'):
+            raise serializers.ValidationError("Path must be a relative /api/ URL.")
+        return value
+
+
+class BatchRequestSerializer(serializers.Serializer):
+    MAX_REQUESTS = 20
+
+    requests = BatchItemSerializer(many=True)
+
+    def validate_requests(self, value):
+        if not value:
+            raise serializers.ValidationError("At least one request is required.")
+        if len(value) > self.MAX_REQUESTS:
+            raise serializers.ValidationError(f"At most {self.MAX_REQUESTS} requests per batch.")
+        ids = [item['id'] for item in value]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError("Duplicate request ids are not allowed.")
+        return value
+
+
+# Response headers worth forwarding to the client per sub-request
+FORWARDED_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control')
+
+# Request headers of the envelope a sub-request inherits. The rest (its
+# body, If-None-Match, Idempotency-Key) describe the POST, not the GETs.
+INHERITED_HEADERS = (
+    'HTTP_HOST', 'HTTP_ACCEPT', 'HTTP_ACCEPT_LANGUAGE', 'HTTP_USER_AGENT',
+    'HTTP_AUTHORIZATION', 'HTTP_X_FORWARDED_FOR', 'HTTP_X_FORWARDED_PROTO',
+)
+BODY_META = ('CONTENT_TYPE', 'CONTENT_LENGTH')
+
+SERVER_ERROR_BODY = json.dumps({
+    'error': True,
+    'message': 'An unexpected error occurred. Please try again later.',
+}).encode()
+
+
+class BatchView(APIView):
+    """
+    Run several GET requests in one round trip.
+
+    Responds with {"responses": [{"id", "status", "headers", "body"}, ...]}
+    in request order. Sub-response bodies are spliced in as already-rendered
+    JSON rather than decoded and re-encoded.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = BatchRequestSerializer
+
+    def post(self, request):
+        serializer = BatchRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        cache = get_request_cache(request)
+        parts = [
+            self._dispatch(request, item['id'], item['path'], cache)
+            for item in serializer.validated_data['requests']
+        ]
+
+        body = b'{"responses":[' + b','.join(parts) + b']}'
+        return HttpResponse(body, content_type='application/json', status=status.HTTP_200_OK)
+
+    def _dispatch(self, request, item_id, path, cache):
+        path, _, query = path.partition('?')
+        try:
+            match = resolve(path)
+        except Resolver404:
+            return self._encode(item_id, status.HTTP_404_NOT_FOUND, {}, b'{"detail":"Not found."}')
+
+        sub = self._build_subrequest(request, path, query, match, cache)
+        try:
+            response = self._call(match, sub)
+        except Exception as exc:
+            logger.error(
+                f"Unhandled exception in batch request {path}: {type(exc).__name__}: {exc}",
+                exc_info=True,
+            )
+            return self._encode(item_id, status.HTTP_500_INTERNAL_SERVER_ERROR, {}, SERVER_ERROR_BODY)
+
+        headers = {name: response[name] for name in FORWARDED_HEADERS if response.has_header(name)}
+        content = response.content
+        if not content or 'json' not in response.get('Content-Type', ''):
+            content = json.dumps(content.decode('utf-8', 'replace') if content else None).encode()
+        return self._encode(item_id, response.status_code, headers, content)
+
+    def _call(self, match, sub):
+        view = match.func
+        if iscoroutinefunction(view):
+            view = async_to_sync(view)
+        response = view(sub, *match.args, **match.kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response.render()
+        return response
+
+    def _build_subrequest(self, request, path, query, match, cache):
+        outer = request._request.META
+        sub = copy.copy(request._request)
+        # Rebuilt from META below on first use
+        sub.__dict__.pop('headers', None)
+        sub.method = 'GET'
+        sub.path = sub.path_info = path
+        sub.GET = QueryDict(query)
+        sub.META = {
+            key: value for key, value in outer.items()
+            if not key.startswith('HTTP_') and key not in BODY_META
+        }
+        sub.META.update({key: outer[key] for key in INHERITED_HEADERS if key in outer})
+        sub.META.update({
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+        })
+        sub.resolver_match = match
+        sub.request_cache = cache
+        # Reuse the already-authenticated principal (DRF ForcedAuthentication)
+        sub._force_auth_user = request.user
+        sub._force_auth_token = request.auth
+        return sub
+
+    def _encode(self, item_id, status_code, headers, content):
+        meta = json.dumps({'id': item_id, 'status': status_code, 'headers': headers}).encode()
+        return meta[:-1] + b',"body":' + content + b'}'
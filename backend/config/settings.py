@@ -3,6 +3,9 @@ Django settings for Smart Trip Planner project.
 Production-ready configuration using environment variables.
 """
 
+import os
+import sys
+import tempfile
 from pathlib import Path
 from datetime import timedelta
 from decouple import config
@@ -16,6 +19,10 @@ SECRET_KEY = config('SECRET_KEY', default='django-insecure-change-this-in-produc
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = config('DEBUG', default=False, cast=bool)
 
+# `manage.py test` defaults the shared stores below to per-process ones, so
+# every run starts empty
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+
 # Allow all hosts to prevent blocking
 ALLOWED_HOSTS = ['*']
 
@@ -154,7 +161,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.users.authentication.StatelessJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -168,14 +175,145 @@ REST_FRAMEWORK = {
     ],
     'EXCEPTION_HANDLER': 'middleware.exceptions.custom_exception_handler',
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle',
+        'middleware.throttling.AnonRateThrottle',
+        'middleware.throttling.UserRateThrottle',
+        'middleware.throttling.ScopedRateThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '20/minute',
         'user': '100/minute',
+        # Writes on views with a matching throttle_scope
+        'login': '10/minute',
+        'chat_send': '30/minute',
+        'vote': '20/minute',
+    },
+}
+
+# Throttle state (middleware/throttling.py): sqlite (shared by the workers
+# on a host; the default), redis (shared by all hosts; needs redis-py) or
+# memory (per process, for tests). THROTTLE_STORE_LOCATION is the SQLite
+# path or the redis:// URL.
+THROTTLE_STORE = config('THROTTLE_STORE', default='memory' if TESTING else 'sqlite')
+THROTTLE_STORE_LOCATION = config(
+    'THROTTLE_STORE_LOCATION',
+    default='redis://127.0.0.1:6379/0' if THROTTLE_STORE == 'redis'
+    else os.path.join(tempfile.gettempdir(), 'smart_trip_throttle.sqlite3'),
+)
+
+# Hot list endpoints (trips, chat, notification history) render from
+# .values() rows instead of ModelSerializer instances when enabled
+FAST_READ_SERIALIZERS = config('FAST_READ_SERIALIZERS', default=True, cast=bool)
+
+# Response cache for trip-scoped GETs (apps/trips/response_cache.py).
+#   locmem  per-process LRU (default)
+#   file    shared by all workers on the host (RESPONSE_CACHE_LOCATION is a directory)
+#   db      shared through the database; run `manage.py createcachetable` first
+#   redis   shared by all hosts (RESPONSE_CACHE_LOCATION is a redis:// URL; needs redis-py)
+#   off     disabled
+RESPONSE_CACHE_BACKEND = config('RESPONSE_CACHE_BACKEND', default='locmem')
+RESPONSE_CACHE_ENABLED = RESPONSE_CACHE_BACKEND != 'off'
+RESPONSE_CACHE_TIMEOUT = config('RESPONSE_CACHE_TIMEOUT', default=300, cast=int)
+# Identical concurrent misses wait this long for the first one before
+# rendering themselves. Set RESPONSE_CACHE_LOCK_DIR to coalesce across the
+# workers on a host too (pairs with a shared backend: file, db or redis).
+RESPONSE_CACHE_COALESCE_TIMEOUT = config('RESPONSE_CACHE_COALESCE_TIMEOUT', default=10.0, cast=float)
+RESPONSE_CACHE_LOCK_DIR = config('RESPONSE_CACHE_LOCK_DIR', default='')
+
+_RESPONSE_CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'responses'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / 'cache' / 'responses')),
+    'db': ('django.core.cache.backends.db.DatabaseCache', 'response_cache'),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1'),
+    'off': ('django.core.cache.backends.dummy.DummyCache', ''),
+}
+_backend, _location = _RESPONSE_CACHE_BACKENDS[RESPONSE_CACHE_BACKEND]
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': _backend,
+        'LOCATION': config('RESPONSE_CACHE_LOCATION', default=_location),
+        'TIMEOUT': RESPONSE_CACHE_TIMEOUT,
     },
 }
+if RESPONSE_CACHE_BACKEND in ('locmem', 'file', 'db'):
+    # Culled in LRU order (locmem) or oldest-first (file, db) past this size
+    CACHES['responses']['OPTIONS'] = {
+        'MAX_ENTRIES': config('RESPONSE_CACHE_MAX_ENTRIES', default=5000, cast=int),
+    }
+
+# Phone verification codes (apps/users/otp.py). Every worker that may
+# verify a code must see it, so the default is file (shared by the workers
+# on a host); use db or redis across hosts. locmem is for tests only.
+OTP_CACHE_BACKEND = config('OTP_CACHE_BACKEND', default='locmem' if TESTING else 'file')
+_OTP_CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'otp'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / 'cache' / 'otp')),
+    'db': ('django.core.cache.backends.db.DatabaseCache', 'otp_cache'),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/2'),
+}
+_backend, _location = _OTP_CACHE_BACKENDS[OTP_CACHE_BACKEND]
+CACHES['otp'] = {
+    'BACKEND': _backend,
+    'LOCATION': config('OTP_CACHE_LOCATION', default=_location),
+}
+OTP_TTL = config('OTP_TTL', default=300, cast=int)
+OTP_MAX_ATTEMPTS = config('OTP_MAX_ATTEMPTS', default=5, cast=int)
+# Delivers codes; apps.users.otp.LocmemSender records them for tests
+OTP_SENDER = config('OTP_SENDER', default='apps.users.otp.ConsoleSender')
+
+# User cards (apps/users/cards.py). A save drops the card where it is
+# cached, and every worker must miss it afterwards or it renders the old
+# one under the new ETag, so the default is file (shared by the workers on
+# a host); use db or redis across hosts. locmem is for tests only.
+USER_CARD_CACHE_BACKEND = config('USER_CARD_CACHE_BACKEND', default='locmem' if TESTING else 'file')
+_USER_CARD_CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'cards'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / 'cache' / 'cards')),
+    'db': ('django.core.cache.backends.db.DatabaseCache', 'card_cache'),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/3'),
+}
+_backend, _location = _USER_CARD_CACHE_BACKENDS[USER_CARD_CACHE_BACKEND]
+CACHES['cards'] = {
+    'BACKEND': _backend,
+    'LOCATION': config('USER_CARD_CACHE_LOCATION', default=_location),
+}
+
+# Email outbox (apps/trips/outbox.py), drained by `manage.py deliver_outbox`.
+# Failed messages are retried after OUTBOX_RETRY_DELAY seconds, doubling
+# each time, and marked dead after OUTBOX_MAX_ATTEMPTS attempts. Messages
+# not tried because the server was unreachable wait OUTBOX_RETRY_DELAY
+# seconds without spending an attempt.
+OUTBOX_BATCH_SIZE = config('OUTBOX_BATCH_SIZE', default=100, cast=int)
+OUTBOX_MAX_ATTEMPTS = config('OUTBOX_MAX_ATTEMPTS', default=6, cast=int)
+OUTBOX_RETRY_DELAY = config('OUTBOX_RETRY_DELAY', default=60, cast=int)
+# A claimed batch is left to other workers if not finished within this
+OUTBOX_CLAIM_TIMEOUT = config('OUTBOX_CLAIM_TIMEOUT', default=300, cast=int)
+
+# Notification digests (apps/trips/digest.py) leave notifications younger
+# than this many seconds for the next run
+DIGEST_DELAY = config('DIGEST_DELAY', default=60 * 60, cast=int)
+
+# Push notifications (apps/trips/push.py), sent by `manage.py dispatch_push`.
+# Provider class per device platform; FileProvider writes JSON lines to
+# PUSH_FILE in place of a push service.
+PUSH_PROVIDERS = {
+    'android': config('PUSH_PROVIDER_ANDROID', default='apps.trips.push.FileProvider'),
+    'ios': config('PUSH_PROVIDER_IOS', default='apps.trips.push.FileProvider'),
+    'web': config('PUSH_PROVIDER_WEB', default='apps.trips.push.FileProvider'),
+}
+PUSH_FILE = config('PUSH_FILE', default=str(BASE_DIR / 'logs' / 'push.jsonl'))
+# Notifications per dispatch pass, and provider calls in flight at once
+PUSH_BATCH_SIZE = config('PUSH_BATCH_SIZE', default=500, cast=int)
+PUSH_CONCURRENCY = config('PUSH_CONCURRENCY', default=4, cast=int)
+# Notifications younger than this many seconds wait for the next pass, so
+# transactions still holding lower ids can commit first
+PUSH_SETTLE_SECONDS = config('PUSH_SETTLE_SECONDS', default=5, cast=int)
+
+# How long a write's Idempotency-Key is remembered (apps/trips/idempotency.py)
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=24 * 60 * 60, cast=int)
 
 # JWT Configuration
 SIMPLE_JWT = {
@@ -183,7 +321,8 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': False,
-    'UPDATE_LAST_LOGIN': True,
+    # last_login is written behind instead (apps/users/write_behind.py)
+    'UPDATE_LAST_LOGIN': False,
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
     'AUTH_HEADER_TYPES': ('Bearer',),
@@ -192,8 +331,34 @@ SIMPLE_JWT = {
     'USER_ID_CLAIM': 'user_id',
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
+    'TOKEN_OBTAIN_SERIALIZER': 'apps.users.authentication.TokenObtainPairSerializer',
 }
 
+# Seconds a user card (apps/users/cards.py) is kept; saves drop it sooner
+USER_CARD_TIMEOUT = config('USER_CARD_TIMEOUT', default=300, cast=int)
+
+# Seconds a user's auth state is trusted before tokens are re-checked
+# against the database (apps/users/authentication.py)
+JWT_PRINCIPAL_CHECK_TTL = config('JWT_PRINCIPAL_CHECK_TTL', default=60, cast=int)
+
+# Login (apps/users/login.py). ASYNC_LOGIN routes /api/auth/login/ to the
+# async view; only worth it under an ASGI server. LOGIN_HASH_WORKERS bounds
+# the threads hashing passwords for it. last_login and outstanding-token
+# rows are flushed every LOGIN_WRITE_BATCH entries or LOGIN_WRITE_INTERVAL
+# seconds, by a thread per worker (LOGIN_WRITE_THREAD; off under tests,
+# where the login that finds a batch due flushes it).
+ASYNC_LOGIN = config('ASYNC_LOGIN', default=False, cast=bool)
+# Logins by username or email go through LoginBackend; the admin's username
+# logins through ModelBackend
+AUTHENTICATION_BACKENDS = [
+    'apps.users.login.LoginBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+LOGIN_HASH_WORKERS = config('LOGIN_HASH_WORKERS', default=4, cast=int)
+LOGIN_WRITE_BATCH = config('LOGIN_WRITE_BATCH', default=100, cast=int)
+LOGIN_WRITE_INTERVAL = config('LOGIN_WRITE_INTERVAL', default=5.0, cast=float)
+LOGIN_WRITE_THREAD = config('LOGIN_WRITE_THREAD', default=not TESTING, cast=bool)
+
 # DRF Spectacular (Swagger/OpenAPI) Configuration
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Smart Trip Planner API',
@@ -14,7 +14,9 @@ from rest_framework_simplejwt.views import (
     TokenVerifyView,
     TokenObtainPairView,
 )
-from apps.users.views import LoginAPIView
+from django.conf import settings
+from apps.users.views import AsyncLoginView, LoginAPIView
+from config.batch import BatchView
 
 urlpatterns = [
     # Admin
@@ -29,12 +31,15 @@ urlpatterns = [
     path('api/auth/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     
     # JWT Authentication - Custom Login (Alternative)
-    path('api/auth/login/', LoginAPIView.as_view(), name='auth_login'), 
+    path('api/auth/login/', (AsyncLoginView if settings.ASYNC_LOGIN else LoginAPIView).as_view(), name='auth_login'),
     
     # Standard SimpleJWT Views
     path('api/auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/auth/token/verify/', TokenVerifyView.as_view(), name='token_verify'),
     
+    # Request multiplexing (several GETs in one round trip)
+    path('api/batch/', BatchView.as_view(), name='batch'),
+    
     # Health Check (Root)
     path('', lambda request: JsonResponse({'status': 'healthy', 'message': 'Smart Trip Planner API is running'}), name='health_check'),
 
@@ -13,6 +13,9 @@ echo "PostgreSQL is ready!"
 echo "Running database migrations..."
 python manage.py migrate --noinput
 
+echo "Repairing the user directory..."
+python manage.py rebuild_directory
+
 echo "Collecting static files..."
 python manage.py collectstatic --noinput --clear || true
 
@@ -0,0 +1,21 @@
+"""
+Request-scoped cache.
+
+A plain dict attached to the underlying HttpRequest. Anything that wants to
+memoize per-request lookups (e.g. trip membership) stores them here. The
+batch endpoint hands the same dict to every sub-request, so lookups made
+while serving one sub-request are reused by the others.
+"""
+
+
+def get_request_cache(request):
+    """
+    Return the cache dict for this request, creating it on first use.
+    Accepts either a DRF Request or a Django HttpRequest.
+    """
+    raw = getattr(request, '_request', request)
+    cache = getattr(raw, 'request_cache', None)
+    if cache is None:
+        cache = {}
+        raw.request_cache = cache
+    return cache
@@ -0,0 +1,229 @@
+"""
+GCRA rate limiting with O(1) state per key.
+
+Drop-in replacements for DRF's AnonRateThrottle, UserRateThrottle and
+ScopedRateThrottle. They keep DRF's keys and rate settings
+('100/minute') but store one number per key instead of a list of request
+timestamps: the key's theoretical arrival time (TAT). A rate of n per
+period allows a burst of n, then one request every period / n.
+
+The store is chosen by settings.THROTTLE_STORE:
+
+    memory   per process (each worker enforces the full rate on its own;
+             the default under `manage.py test`)
+    sqlite   one SQLite file shared by every worker on the host
+             (THROTTLE_STORE_LOCATION is its path; the default)
+    redis    shared by every host (THROTTLE_STORE_LOCATION is a redis://
+             URL; needs redis-py)
+
+All three update a key atomically. Scoped rates (view.throttle_scope, e.g.
+'login', 'chat_send', 'vote') apply to writes only; reads are covered by
+the anon and user rates.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from rest_framework import permissions, throttling
+
+logger = logging.getLogger(__name__)
+
+
+def gcra(tat, now, interval, period):
+    """
+    One GCRA step. Returns (allowed, new_tat, wait); new_tat is None when
+    the request is refused and the stored value must not change.
+    """
+    tat = max(tat or now, now)
+    new_tat = tat + interval
+    if new_tat - now > period:
+        return False, None, new_tat - now - period
+    return True, new_tat, 0.0
+
+
+class MemoryStore:
+    # Keys whose TAT has passed hold no state; sweep them past this size
+    SWEEP_AT = 10000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tats = {}
+
+    def acquire(self, key, interval, period):
+        now = time.time()
+        with self._lock:
+            allowed, new_tat, wait = gcra(self._tats.get(key), now, interval, period)
+            if allowed:
+                self._tats[key] = new_tat
+                if len(self._tats) > self.SWEEP_AT:
+                    self._tats = {k: v for k, v in self._tats.items() if v > now}
+        return allowed, wait
+
+    def clear(self):
+        with self._lock:
+            self._tats.clear()
+
+
+class SQLiteStore:
+    # Delete expired keys on roughly one acquire in this many
+    SWEEP_EVERY = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._calls = 0
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS throttle (key TEXT PRIMARY KEY, tat REAL NOT NULL) WITHOUT ROWID'
+            )
+            self._local.connection = connection
+        return connection
+
+    def acquire(self, key, interval, period):
+        connection = self._connection()
+        now = time.time()
+        # IMMEDIATE takes the write lock up front: read-modify-write is atomic
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT tat FROM throttle WHERE key = ?', (key,)).fetchone()
+            allowed, new_tat, wait = gcra(row[0] if row else None, now, interval, period)
+            if allowed:
+                connection.execute(
+                    'INSERT INTO throttle (key, tat) VALUES (?, ?) '
+                    'ON CONFLICT (key) DO UPDATE SET tat = excluded.tat',
+                    (key, new_tat),
+                )
+            self._calls += 1
+            if self._calls % self.SWEEP_EVERY == 0:
+                connection.execute('DELETE FROM throttle WHERE tat < ?', (now,))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return allowed, wait
+
+    def clear(self):
+        self._connection().execute('DELETE FROM throttle')
+
+
+class RedisStore:
+    # Server time keeps hosts with skewed clocks consistent
+    SCRIPT = """
+    local time = redis.call('TIME')
+    local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+    local interval = tonumber(ARGV[1])
+    local period = tonumber(ARGV[2])
+    local tat = tonumber(redis.call('GET', KEYS[1]) or '0')
+    if tat < now then tat = now end
+    local new_tat = tat + interval
+    if new_tat - now > period then
+        return {0, tostring(new_tat - now - period)}
+    end
+    redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+    return {1, '0'}
+    """
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured("THROTTLE_STORE = 'redis' needs the redis package.")
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(self.SCRIPT)
+
+    def acquire(self, key, interval, period):
+        allowed, wait = self.script(keys=[f'throttle:{key}'], args=[interval, period])
+        return bool(allowed), float(wait)
+
+    def clear(self):
+        for key in self.client.scan_iter('throttle:*'):
+            self.client.delete(key)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = _build_store()
+    return _store
+
+
+def _build_store():
+    kind = settings.THROTTLE_STORE
+    if kind == 'memory':
+        return MemoryStore()
+    if kind == 'sqlite':
+        os.makedirs(os.path.dirname(settings.THROTTLE_STORE_LOCATION) or '.', exist_ok=True)
+        return SQLiteStore(settings.THROTTLE_STORE_LOCATION)
+    if kind == 'redis':
+        return RedisStore(settings.THROTTLE_STORE_LOCATION)
+    raise ImproperlyConfigured(f"Unknown THROTTLE_STORE {kind!r}.")
+
+
+def _reset_store(setting, **kwargs):
+    global _store
+    if setting in ('THROTTLE_STORE', 'THROTTLE_STORE_LOCATION'):
+        _store = None
+
+
+setting_changed.connect(_reset_store)
+
+
+class GCRAThrottleMixin:
+    """
+    allow_request()/wait() over the shared store; DRF supplies the key. An
+    unreachable store lets requests through rather than failing them.
+    """
+    _wait = None
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+        try:
+            allowed, self._wait = get_store().acquire(key, self.duration / self.num_requests, self.duration)
+        except Exception:
+            logger.exception("Throttle store unavailable; allowing request")
+            return True
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+class AnonRateThrottle(GCRAThrottleMixin, throttling.AnonRateThrottle):
+    pass
+
+
+class UserRateThrottle(GCRAThrottleMixin, throttling.UserRateThrottle):
+    pass
+
+
+class ScopedRateThrottle(GCRAThrottleMixin, throttling.ScopedRateThrottle):
+    def allow_request(self, request, view):
+        if request.method in permissions.SAFE_METHODS:
+            return True
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
@@ -0,0 +1,152 @@
+"""
+Batched loaders for serializer method fields.
+
+Method fields that need a per-object lookup (a user's avatar, a poll's
+results) read through a BatchLoader instead of querying directly. When a
+serializer using BatchLoadingMixin is rendered with many=True, its list
+serializer first walks every instance (and nested loader-aware serializers),
+collects the keys each loader will need, and resolves each loader with one
+IN (...) query. Rendering then reads from the memo.
+
+Usage:
+
+    class AvatarLoader(BatchLoader):
+        def fetch(self, keys):
+            return {...}
+
+    class UserSerializer(BatchLoadingMixin, serializers.ModelSerializer):
+        class Meta:
+            list_serializer_class = BatchLoadingListSerializer
+
+        def get_loader_keys(self, obj):
+            yield AvatarLoader, obj.id
+
+        def get_avatar(self, obj):
+            return self.loader(AvatarLoader).load(obj.id)
+"""
+from collections import defaultdict
+
+from django.db import models
+from django.db.models import prefetch_related_objects
+from rest_framework import serializers
+
+from middleware.request_cache import get_request_cache
+
+
+class BatchLoader:
+    """
+    Resolves keys of one kind with a single query per batch.
+
+    Subclasses implement fetch(keys) returning {key: value}; keys absent from
+    the result resolve to `default`. Results are memoized per request when
+    `request_scoped` is True, otherwise per root serializer (use that for
+    values a write in the same request may change, like vote counts).
+    """
+    default = None
+    request_scoped = True
+
+    def __init__(self, request, memo):
+        self.request = request
+        self.memo = memo
+
+    @classmethod
+    def for_context(cls, context):
+        request = context.get('request')
+        if cls.request_scoped and request is not None:
+            store = get_request_cache(request)
+        else:
+            store = context.setdefault('_loader_memo', {})
+        memo = store.setdefault(('loader', cls), {})
+        return cls(request, memo)
+
+    def fetch(self, keys):
+        raise NotImplementedError
+
+    def prime(self, keys):
+        missing = {key for key in keys if key not in self.memo}
+        if not missing:
+            return
+        found = self.fetch(missing)
+        for key in missing:
+            self.memo[key] = found.get(key, self.default)
+
+    def load(self, key):
+        if key not in self.memo:
+            self.prime([key])
+        return self.memo[key]
+
+
+class BatchLoadingMixin:
+    """
+    Serializer mixin for fields that read through loaders.
+
+    - get_loader_keys(instance) yields (LoaderClass, key) pairs
+    - batch_relations lists FK/M2M names loaded for the whole batch with
+      prefetch_related_objects (skipped when the view already loaded them)
+    - nested serializers that also use this mixin contribute their keys
+    """
+    batch_relations = ()
+
+    def loader(self, loader_cls):
+        return loader_cls.for_context(self.context)
+
+    def get_loader_keys(self, instance):
+        return ()
+
+    def collect_loader_keys(self, instance, keys):
+        for loader_cls, key in self.get_loader_keys(instance):
+            keys[loader_cls].add(key)
+
+        for field in self._readable_fields:
+            many = isinstance(field, serializers.ListSerializer)
+            child = field.child if many else field
+            if not isinstance(child, BatchLoadingMixin):
+                continue
+            try:
+                value = field.get_attribute(instance)
+            except (AttributeError, KeyError, models.ObjectDoesNotExist):
+                continue
+            if value is None:
+                continue
+            if many:
+                value = value.all() if isinstance(value, models.Manager) else value
+            else:
+                value = [value]
+            for nested in value:
+                child.collect_loader_keys(nested, keys)
+
+    def get_batch_relations(self):
+        """
+        The batch_relations some readable field renders. Relations shown only
+        as a primary key (or not at all) need no loading.
+        """
+        sources = {
+            field.source_attrs[0]
+            for field in self._readable_fields
+            if field.source_attrs and not isinstance(field, serializers.PrimaryKeyRelatedField)
+        }
+        return [name for name in self.batch_relations if name.split('__')[0] in sources]
+
+    def prime(self, instances):
+        """Load relations and resolve every loader for a batch of instances."""
+        if not instances:
+            return
+        relations = self.get_batch_relations()
+        if relations:
+            prefetch_related_objects(instances, *relations)
+
+        keys = defaultdict(set)
+        for instance in instances:
+            self.collect_loader_keys(instance, keys)
+        for loader_cls, loader_keys in keys.items():
+            self.loader(loader_cls).prime(loader_keys)
+
+
+class BatchLoadingListSerializer(serializers.ListSerializer):
+    """List serializer that primes the child's loaders before rendering."""
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        instances = list(iterable)
+        self.child.prime(instances)
+        return [self.child.to_representation(item) for item in instances]
@@ -138,7 +138,7 @@ class _ProfileEditScreenState extends State<ProfileEditScreen> {
   Future<void> _requestOtp() async {
     setState(() => _isSavingPhone = true);
     try {
-      await _apiService.requestUpdateOtp();
+      await _apiService.requestUpdateOtp(_phoneController.text.trim());
       setState(() {
         _otpSent = true;
         _isSavingPhone = false;
@@ -213,8 +213,8 @@ class ApiService {
     }
   }
 
-  Future<void> requestUpdateOtp() async {
-    await _dio.post('/users/profile/generate-otp/');
+  Future<void> requestUpdateOtp(String phoneNumber) async {
+    await _dio.post('/users/profile/generate-otp/', data: {'phone_number': phoneNumber});
   }
 
   // ========== TRIPS ==========